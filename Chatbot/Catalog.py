@@ -0,0 +1,424 @@
+# ---------------------------
+# Product catalog cache
+# ---------------------------
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections.abc import Mapping
+
+import httpx
+import numpy as np
+import requests
+
+from Observability.log import get_logger
+from Observability.metrics import CATALOG_FETCH_BYTES, CATALOG_FETCH_SECONDS
+from Outbound.singleflight import SingleFlight
+from Shared.store import Strings, find_key, pack_strings, shared_store, sorted_keys
+
+from .Search import ColumnIndex, JSONRows, ProductIndex, index_columns
+
+logger = get_logger(__name__)
+
+PRODUCT_API_URL = os.getenv("PRODUCT_API_URL", "http://10.10.7.77:3000/api/product/all")
+CATALOG_TTL_SECONDS = float(os.getenv("CATALOG_TTL_SECONDS", "300"))
+FETCH_LIMIT = 10000
+# A worker that is not the refresher checks at most this often whether it should take over
+LEAD_RETRY_SECONDS = 1.0
+
+
+def _updated_at(product):
+    return product.get("updated_at") or product.get("updatedAt")
+
+
+def catalog_version(products: dict) -> str:
+    """Content hash of the catalog, stable across processes and refreshes."""
+    digest = hashlib.blake2b(digest_size=8)
+    for pid in sorted(products):
+        digest.update(json.dumps(products[pid], sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class CatalogSnapshot:
+    """Immutable view of the catalog at one point in time, with its search index."""
+
+    def __init__(self, products: dict, etag=None, synced_at=None, deltas=False):
+        self.products = products
+        self.etag = etag
+        # The API has marked a response as a delta (or not): only then is updated_since sent
+        self.deltas = deltas
+        self.synced_at = synced_at if synced_at is not None else time.monotonic()
+        self.version = catalog_version(products)
+        self.index = ProductIndex(products.values())
+        stamps = [s for s in map(_updated_at, products.values()) if s]
+        self.updated_since = max(stamps) if stamps else None
+        self.file = None
+
+    @classmethod
+    def mapped(cls, file):
+        """Snapshot over a catalog file published to the shared store; nothing is copied in."""
+        meta = file.meta
+        snapshot = object.__new__(cls)
+        snapshot.index = ColumnIndex(file)
+        snapshot.products = MappedProducts(file, snapshot.index.products)
+        snapshot.etag = meta["etag"]
+        snapshot.version = meta["version"]
+        snapshot.updated_since = meta["updated_since"]
+        snapshot.deltas = meta.get("deltas", False)
+        # Published with wall-clock time; ages stay comparable across processes
+        snapshot.synced_at = time.monotonic() - max(0.0, time.time() - meta["synced_at"])
+        snapshot.file = file
+        return snapshot
+
+    def columns(self):
+        """(meta, columns) to publish this snapshot with SharedStore.publish()."""
+        meta, columns = index_columns(self.index)
+        ids = list(self.products)   # same order as the index rows
+        columns["id_keys"] = sorted_keys(ids)
+        columns["id_rows"] = np.array(sorted(range(len(ids)), key=lambda row: ids[row].encode()), dtype=np.uint32)
+        columns["id_offsets"], columns["id_blob"] = pack_strings(ids)
+        meta.update(
+            version=self.version, etag=self.etag, updated_since=self.updated_since, deltas=self.deltas,
+            synced_at=time.time() - (time.monotonic() - self.synced_at),
+        )
+        return meta, columns
+
+    def __len__(self):
+        return len(self.products)
+
+    def touched(self):
+        """Same data, fresh sync time (after a 304 or an empty delta)."""
+        snapshot = object.__new__(CatalogSnapshot)
+        snapshot.__dict__.update(self.__dict__)
+        snapshot.synced_at = time.monotonic()
+        return snapshot
+
+
+class MappedProducts(Mapping):
+    """Read-only {id: product} over a published catalog file; products are decoded on access."""
+
+    def __init__(self, file, rows: JSONRows):
+        self._keys = file["id_keys"]
+        self._key_rows = file["id_rows"]
+        self._ids = Strings(file["id_offsets"], file["id_blob"])
+        self._rows = rows
+
+    def _row(self, product_id):
+        i = find_key(self._keys, str(product_id))
+        return None if i is None else int(self._key_rows[i])
+
+    def __getitem__(self, product_id):
+        row = self._row(product_id)
+        if row is None:
+            raise KeyError(product_id)
+        return self._rows[row]
+
+    def __contains__(self, product_id):
+        return self._row(product_id) is not None
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+
+class CatalogCache:
+    """In-memory product catalog refreshed in the background.
+
+    Readers always get the current snapshot without waiting on the network; once it is
+    older than ``ttl`` a single background refresh is started and the stale snapshot keeps
+    being served until the new one is swapped in. Refreshes are conditional: the last ETag
+    is sent as If-None-Match and, once the API has shown it marks deltas (its responses
+    carry a ``delta`` flag or ``deleted`` ids), the newest product timestamp as
+    ``updated_since``. A 304 keeps the snapshot; a response flagged ``delta`` (or carrying
+    ``deleted`` ids) is merged by product id; anything else replaces the catalog. Concurrent first loads (blocking
+    ones with each other, async ones with each other) and concurrent refreshes are coalesced into one request each.
+
+    With a SharedStore, the workers on a host share one copy: only the store's leader
+    fetches, and it publishes each new snapshot as a column file that every worker maps
+    (its own requests read the mapping too). The other workers adopt whatever is current.
+    On their first load they wait for the leader instead of fetching. If the leader
+    exits, the next worker to find the catalog stale takes over.
+    """
+
+    def __init__(self, url: str = PRODUCT_API_URL, ttl: float = CATALOG_TTL_SECONDS, timeout: float = 15, session=None,
+                 store=None):
+        self.url = url
+        self.ttl = ttl
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._refreshing = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._listeners = []
+        self.store = store
+        self._file = None
+        self._adopting = threading.Lock()
+        self._next_lead = 0.0
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+    def get(self) -> CatalogSnapshot:
+        """Current snapshot; loads synchronously only on the very first call."""
+        self._adopt()
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self._flight.do("load", self._load)
+        if time.monotonic() - snapshot.synced_at > self.ttl:
+            self.refresh_in_background()
+        return snapshot
+
+    async def aget(self) -> CatalogSnapshot:
+        """Event-loop friendly get(): the first load goes through an async HTTP client."""
+        self._adopt()
+        snapshot = self._snapshot
+        if snapshot is None:
+            return await self._flight.ado("load", self._aload)
+        if time.monotonic() - snapshot.synced_at > self.ttl:
+            self.refresh_in_background()
+        return snapshot
+
+    def peek(self):
+        """Current snapshot, or None if the catalog has not been loaded yet; never fetches."""
+        self._adopt()
+        return self._snapshot
+
+    def on_change(self, callback):
+        """Register callback(old_snapshot, new_snapshot), called when the catalog version changes."""
+        self._listeners.append(callback)
+
+    def _notify(self, old, new):
+        if old is not None and new.version != old.version:
+            for callback in self._listeners:
+                try:
+                    callback(old, new)
+                except Exception as e:
+                    logger.error("catalog_listener_failed", extra={"error": str(e)})
+
+    # ---------------------------
+    # Shared store
+    # ---------------------------
+    def _adopt(self):
+        """Switch to a newer catalog another worker published (no-op without a store)."""
+        if self.store is None:
+            return
+        file = self.store.current()
+        if file is None or file is self._file or not self._adopting.acquire(blocking=False):
+            return
+        try:
+            if file is not self._file:
+                old = self._snapshot
+                self._snapshot, self._file = CatalogSnapshot.mapped(file), file
+                self._notify(old, self._snapshot)
+        except Exception as e:
+            logger.warning("catalog_adopt_failed", extra={"error": str(e)})
+        finally:
+            self._adopting.release()
+
+    def _lead(self, throttle=True) -> bool:
+        """Whether this worker fetches from the API: always without a store, else only its leader.
+
+        A worker that becomes the leader starts the periodic refresher, so the shared
+        catalog stays fresh even when the leader itself gets no traffic.
+        """
+        if self.store is None or self.store.leader:
+            return True
+        now = time.monotonic()
+        if throttle and now < self._next_lead:
+            return False
+        self._next_lead = now + LEAD_RETRY_SECONDS
+        if not self.store.lead():
+            return False
+        self.start()
+        return True
+
+    def _await_leader(self, deadline):
+        """One step of a first load with a store: True once a published catalog is adopted,
+        False if this worker must fetch (it became the leader, or the wait timed out), None
+        to keep waiting."""
+        self._adopt()
+        if self._snapshot is not None:
+            return True
+        if self._lead(throttle=False):
+            return False
+        if time.monotonic() >= deadline:
+            logger.warning("catalog_leader_timeout", extra={"store": self.store.name})
+            return False
+        return None
+
+    def _publish(self, snapshot) -> CatalogSnapshot:
+        """Leader: publish a freshly fetched snapshot and serve it from the mapping too."""
+        if self.store is None or not self.store.leader or snapshot.file is not None:
+            return snapshot
+        try:
+            meta, columns = snapshot.columns()
+            self._file = self.store.publish(meta, columns)
+        except OSError as e:
+            logger.warning("catalog_publish_failed", extra={"error": str(e)})
+            return snapshot
+        return CatalogSnapshot.mapped(self._file)
+
+    # ---------------------------
+    # Refresh
+    # ---------------------------
+    def refresh(self) -> CatalogSnapshot:
+        """Pull changes now and swap in the new snapshot (joins a refresh already running).
+
+        With a store, a worker that is not the leader picks up the published catalog instead.
+        """
+        if not self._lead():
+            self._adopt()
+            return self._snapshot or self.get()
+        return self._flight.do("refresh", self._refresh)
+
+    def _refresh(self) -> CatalogSnapshot:
+        old = self._snapshot
+        # The request runs without the lock: a slow API never holds up a first load
+        fetched = self._fetch(old)
+        with self._lock:
+            new = self._publish(old.touched() if fetched is None else self._apply(old, *fetched))
+            self._snapshot = new
+        self._notify(old, new)
+        return new
+
+    def refresh_in_background(self):
+        """Start a refresh thread unless one is already running (or another worker refreshes)."""
+        if self._refreshing.is_set() or not self._lead():
+            return
+        self._refreshing.set()
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("catalog_refresh_failed", extra={"error": str(e)})
+            finally:
+                self._refreshing.clear()
+
+        threading.Thread(target=run, name="catalog-refresh", daemon=True).start()
+
+    def start(self):
+        """Refresh every ttl seconds on a daemon thread until stop()."""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(self.ttl):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.warning("catalog_refresh_failed", extra={"error": str(e)})
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name="catalog-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout)
+            self._thread = None
+
+    def _load(self) -> CatalogSnapshot:
+        if self._snapshot is None and self.store is not None:
+            deadline = time.monotonic() + self.timeout
+            while self._await_leader(deadline) is None:
+                time.sleep(0.05)
+        if self._snapshot is None:
+            fetched = self._fetch(None)
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._publish(self._apply(None, *fetched))
+        return self._snapshot
+
+    async def _aload(self) -> CatalogSnapshot:
+        if self._snapshot is None and self.store is not None:
+            deadline = time.monotonic() + self.timeout
+            while self._await_leader(deadline) is None:
+                await asyncio.sleep(0.05)
+        if self._snapshot is not None:
+            return self._snapshot
+        start = time.perf_counter()
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                response = await client.get(self.url, params={"limit": FETCH_LIMIT}, headers={'Accept': 'application/json'})
+            response.raise_for_status()
+        except httpx.HTTPError:
+            self._record_fetch(start, "error")
+            raise
+        self._record_fetch(start, "full", len(response.content))
+        # Hashing and indexing are CPU work; keep them off the event loop too
+        snapshot = await asyncio.to_thread(
+            lambda: self._publish(self._apply(None, response.json(), response.headers.get("ETag")))
+        )
+        # No self._lock here: a blocking refresh may hold it, and this runs on the event loop
+        if self._snapshot is None:
+            self._snapshot = snapshot
+        return self._snapshot
+
+    def _fetch(self, current):
+        """(response data, ETag) from the API, or None if ``current`` is still up to date."""
+        headers = {'Accept': 'application/json'}
+        params = {"limit": FETCH_LIMIT}
+        if current is not None:
+            if current.etag:
+                headers["If-None-Match"] = current.etag
+            if current.updated_since and current.deltas:
+                params["updated_since"] = current.updated_since
+
+        start = time.perf_counter()
+        try:
+            response = self.session.get(self.url, params=params, headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and current is not None:
+                self._record_fetch(start, "not_modified")
+                return None
+            response.raise_for_status()
+        except requests.RequestException:
+            self._record_fetch(start, "error")
+            raise
+        data = response.json()
+        is_delta = current is not None and (data.get("delta") or "deleted" in data)
+        self._record_fetch(start, "delta" if is_delta else "full", len(response.content))
+        return data, response.headers.get("ETag")
+
+    @staticmethod
+    def _record_fetch(start, outcome, size=None):
+        seconds = time.perf_counter() - start
+        CATALOG_FETCH_SECONDS.labels(outcome=outcome).observe(seconds)
+        if size is not None:
+            CATALOG_FETCH_BYTES.labels(outcome=outcome).observe(size)
+        logger.debug("catalog_fetch", extra={"outcome": outcome, "seconds": round(seconds, 4), "bytes": size})
+
+    def _apply(self, current, data, etag) -> CatalogSnapshot:
+        rows = data.get("data") or []
+        is_delta = current is not None and (data.get("delta") or "deleted" in data)
+        # A "delta" key (even false) or "deleted" ids mean the API honours updated_since;
+        # without them a filtered response could not be told from the full catalog
+        deltas = "delta" in data or "deleted" in data
+
+        if not is_delta:
+            return CatalogSnapshot({p["id"]: p for p in rows if p.get("id")}, etag=etag, deltas=deltas)
+        if not rows and not data.get("deleted"):
+            snapshot = current.touched()
+            snapshot.etag = etag or current.etag
+            snapshot.deltas = True
+            return snapshot
+
+        products = dict(current.products)
+        for pid in data.get("deleted") or []:
+            products.pop(pid, None)
+        for p in rows:
+            if p.get("id"):
+                products[p["id"]] = p
+        return CatalogSnapshot(products, etag=etag or current.etag, deltas=True)
+
+
+# Shared by the workers on this host; the name keeps catalogs of different product APIs apart
+catalog = CatalogCache(store=shared_store("catalog-v1-" + hashlib.blake2b(PRODUCT_API_URL.encode(), digest_size=6).hexdigest()))
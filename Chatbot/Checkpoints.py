@@ -0,0 +1,363 @@
+# ---------------------------
+# Checkpoint retention and compaction (Postgres)
+# ---------------------------
+import asyncio
+import functools
+import os
+import time
+import zlib
+
+from langgraph.checkpoint.serde.base import SerializerProtocol
+
+from Observability.log import get_logger
+from Observability.metrics import CHECKPOINT_MAINTENANCE
+
+# Checkpoints kept per thread and namespace; the newest one is all a conversation needs
+CHECKPOINT_KEEP = int(os.getenv("CHECKPOINT_KEEP", "5"))
+# Threads with no new checkpoint for this long are deleted; off (0) unless set, since it
+# deletes conversations for good
+CHECKPOINT_IDLE_TTL_SECONDS = float(os.getenv("CHECKPOINT_IDLE_TTL_SECONDS", "0"))
+CHECKPOINT_COMPRESS = os.getenv("CHECKPOINT_COMPRESS", "1") != "0"
+CHECKPOINT_MAINTENANCE_INTERVAL = float(os.getenv("CHECKPOINT_MAINTENANCE_INTERVAL", "600"))
+CHECKPOINT_MAINTENANCE_BATCH = int(os.getenv("CHECKPOINT_MAINTENANCE_BATCH", "100"))
+# Threads written more recently than this are left alone, so a running turn never races
+# the cleanup (a turn saves its blobs before the checkpoint row that references them)
+CHECKPOINT_GRACE_SECONDS = float(os.getenv("CHECKPOINT_GRACE_SECONDS", "120"))
+COMPRESS_MIN_BYTES = 512
+COMPRESSED_SUFFIX = "+zlib"
+
+# pg_try_advisory_lock key: only one worker process runs maintenance at a time
+MAINTENANCE_LOCK_ID = 0x616D646B61
+
+logger = get_logger(__name__)
+
+# Per-thread activity, upserted after every checkpoint write (see track_activity) so retention
+# never scans the checkpoints table: one row per thread and namespace with its checkpoint
+# count and last write. ``dirty`` marks rows written since maintenance last looked at them;
+# the partial index holds only those.
+ACTIVITY_SETUP_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS checkpoint_activity (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoints INTEGER NOT NULL DEFAULT 0,
+        last_activity TIMESTAMPTZ NOT NULL DEFAULT now(),
+        dirty BOOLEAN NOT NULL DEFAULT true,
+        PRIMARY KEY (thread_id, checkpoint_ns)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS checkpoint_activity_last_idx ON checkpoint_activity (last_activity)",
+    "CREATE INDEX IF NOT EXISTS checkpoint_activity_dirty_idx ON checkpoint_activity (last_activity) WHERE dirty",
+    # Earlier versions kept the table up to date with a trigger on the saver's own table
+    """
+    DO $$ BEGIN
+        IF to_regclass('checkpoints') IS NOT NULL THEN
+            DROP TRIGGER IF EXISTS checkpoint_activity_touch ON checkpoints;
+        END IF;
+    END $$
+    """,
+    "DROP FUNCTION IF EXISTS checkpoint_activity_touch()",
+)
+
+TOUCH_ACTIVITY_SQL = """
+INSERT INTO checkpoint_activity AS a (thread_id, checkpoint_ns, checkpoints)
+VALUES (%s, %s, 1)
+ON CONFLICT (thread_id, checkpoint_ns) DO UPDATE
+SET checkpoints = a.checkpoints + 1, last_activity = now(), dirty = true
+"""
+
+# Once, when the table is first created: threads written before activity was tracked
+ACTIVITY_BACKFILL_SQL = """
+INSERT INTO checkpoint_activity (thread_id, checkpoint_ns, checkpoints, last_activity)
+SELECT thread_id, checkpoint_ns, count(*), coalesce(max((checkpoint ->> 'ts')::timestamptz), now())
+FROM checkpoints GROUP BY thread_id, checkpoint_ns
+ON CONFLICT (thread_id, checkpoint_ns) DO NOTHING
+"""
+
+# Oldest-first range scan of the last-activity index; a thread is idle only if every namespace is
+IDLE_THREADS_SQL = """
+SELECT DISTINCT thread_id FROM (
+    SELECT thread_id FROM checkpoint_activity a
+    WHERE last_activity < now() - make_interval(secs => %(ttl)s)
+      AND NOT EXISTS (
+          SELECT 1 FROM checkpoint_activity b
+          WHERE b.thread_id = a.thread_id AND b.last_activity >= now() - make_interval(secs => %(ttl)s)
+      )
+    ORDER BY last_activity
+    LIMIT %(limit)s
+) idle
+"""
+
+# Rows written since the last look and quiet for at least the grace period (partial index).
+# Those still within the limit are marked clean on the way; the rest name threads to trim.
+LONG_THREADS_SQL = """
+WITH quiet AS (
+    SELECT thread_id, checkpoint_ns, checkpoints FROM checkpoint_activity
+    WHERE dirty AND last_activity < now() - make_interval(secs => %(grace)s)
+    ORDER BY last_activity
+    LIMIT %(limit)s
+), settled AS (
+    UPDATE checkpoint_activity a SET dirty = false FROM quiet q
+    WHERE a.thread_id = q.thread_id AND a.checkpoint_ns = q.checkpoint_ns AND a.checkpoints <= %(keep)s
+)
+SELECT thread_id, bool_or(checkpoints > %(keep)s) AS long FROM quiet GROUP BY thread_id
+"""
+
+DELETE_THREADS_SQL = (
+    "DELETE FROM checkpoint_writes WHERE thread_id = ANY(%s)",
+    "DELETE FROM checkpoint_blobs WHERE thread_id = ANY(%s)",
+    "DELETE FROM checkpoints WHERE thread_id = ANY(%s)",
+    "DELETE FROM checkpoint_activity WHERE thread_id = ANY(%s)",
+)
+
+OLD_CHECKPOINTS_SQL = """
+SELECT checkpoint_ns, checkpoint_id FROM (
+    SELECT checkpoint_ns, checkpoint_id,
+           row_number() OVER (PARTITION BY checkpoint_ns ORDER BY checkpoint_id DESC) AS age
+    FROM checkpoints WHERE thread_id = %s
+) ranked
+WHERE age > %s
+"""
+
+DELETE_WRITES_SQL = """
+DELETE FROM checkpoint_writes WHERE thread_id = %s AND checkpoint_ns = %s AND checkpoint_id = ANY(%s)
+"""
+
+DELETE_CHECKPOINTS_SQL = """
+DELETE FROM checkpoints WHERE thread_id = %s AND checkpoint_ns = %s AND checkpoint_id = ANY(%s)
+"""
+
+# The oldest kept checkpoint's parent is gone now
+DETACH_PARENTS_SQL = """
+UPDATE checkpoints SET parent_checkpoint_id = NULL
+WHERE thread_id = %s AND checkpoint_ns = %s AND parent_checkpoint_id = ANY(%s)
+"""
+
+RECOUNT_ACTIVITY_SQL = """
+UPDATE checkpoint_activity a SET dirty = false,
+    checkpoints = (SELECT count(*) FROM checkpoints c WHERE c.thread_id = a.thread_id AND c.checkpoint_ns = a.checkpoint_ns)
+WHERE a.thread_id = %s
+"""
+
+# Channel values are shared between checkpoints by version; drop those nothing uses anymore
+DELETE_ORPHAN_BLOBS_SQL = """
+DELETE FROM checkpoint_blobs b
+WHERE b.thread_id = %s AND NOT EXISTS (
+    SELECT 1 FROM checkpoints c
+    WHERE c.thread_id = b.thread_id AND c.checkpoint_ns = b.checkpoint_ns
+      AND c.checkpoint -> 'channel_versions' ->> b.channel = b.version
+)
+"""
+
+HEAD_VERSIONS_SQL = """
+SELECT DISTINCT ON (checkpoint_ns) checkpoint_ns, checkpoint -> 'channel_versions' AS versions
+FROM checkpoints WHERE thread_id = %s
+ORDER BY checkpoint_ns, checkpoint_id DESC
+"""
+
+UNCOMPRESSED_BLOBS_SQL = f"""
+SELECT checkpoint_ns, channel, version, type, blob FROM checkpoint_blobs
+WHERE thread_id = %s AND blob IS NOT NULL AND octet_length(blob) >= %s
+  AND type NOT LIKE '%%{COMPRESSED_SUFFIX}'
+"""
+
+COMPRESS_BLOB_SQL = """
+UPDATE checkpoint_blobs SET type = %s, blob = %s
+WHERE thread_id = %s AND checkpoint_ns = %s AND channel = %s AND version = %s
+"""
+
+
+class CompressedSerializer(SerializerProtocol):
+    """Reads blobs that maintenance compressed (type tagged ``+zlib``); writes are unchanged.
+
+    New checkpoints are stored as the wrapped serializer produces them, so the hot path
+    pays nothing. Only values that no thread head references any more get compressed, in
+    the background.
+    """
+
+    def __init__(self, serde):
+        self.serde = serde
+
+    def dumps_typed(self, obj):
+        return self.serde.dumps_typed(obj)
+
+    def loads_typed(self, data):
+        typ, blob = data
+        if typ.endswith(COMPRESSED_SUFFIX):
+            return self.serde.loads_typed((typ[:-len(COMPRESSED_SUFFIX)], zlib.decompress(blob)))
+        return self.serde.loads_typed(data)
+
+    def __getattr__(self, name):
+        # dumps/loads and anything else the saver expects from its serializer
+        return getattr(self.serde, name)
+
+
+def track_activity(checkpointer, pool):
+    """Record every checkpoint the saver writes in checkpoint_activity (wraps aput in place).
+
+    The saver upserts checkpoints itself, so a trigger on its table would miss updates;
+    counting here sees each write. A failed upsert is logged and the write still succeeds.
+    """
+    aput = checkpointer.aput
+
+    @functools.wraps(aput)
+    async def wrapper(config, checkpoint, metadata, new_versions):
+        saved = await aput(config, checkpoint, metadata, new_versions)
+        configurable = config["configurable"]
+        try:
+            async with pool.connection() as conn:
+                await conn.execute(TOUCH_ACTIVITY_SQL, (configurable["thread_id"], configurable.get("checkpoint_ns", "")))
+        except Exception as e:
+            logger.warning("checkpoint_activity_failed", extra={"error": str(e)})
+        return saved
+
+    checkpointer.aput = wrapper
+    return checkpointer
+
+
+class CheckpointMaintenance:
+    """Background retention for the Postgres checkpointer.
+
+    Every ``interval`` seconds:
+    - with an ``idle_ttl``, deletes threads idle for longer than that;
+    - trims every thread to its latest ``keep`` checkpoints per namespace, with their
+      pending writes and any blobs left unreferenced;
+    - with ``compress``, zlib-compresses the blobs that only the older kept checkpoints
+      still use.
+
+    Each pass handles at most ``batch_size`` threads per step, one short transaction per
+    trimmed thread. A full batch means there is a backlog, so the next pass follows a
+    second later. An advisory lock keeps concurrent workers from doing the same work twice.
+
+    Threads are found through ``checkpoint_activity`` (created by setup()), which
+    track_activity() keeps up to date: the passes read its indexes and never group the
+    checkpoints table, whatever its size. That costs one small upsert per checkpoint.
+    """
+
+    def __init__(self, pool, keep=CHECKPOINT_KEEP, idle_ttl=CHECKPOINT_IDLE_TTL_SECONDS, compress=CHECKPOINT_COMPRESS,
+                 interval=CHECKPOINT_MAINTENANCE_INTERVAL, batch_size=CHECKPOINT_MAINTENANCE_BATCH,
+                 grace=CHECKPOINT_GRACE_SECONDS):
+        self.pool = pool
+        self.keep = max(1, keep)
+        self.idle_ttl = idle_ttl
+        self.compress = compress
+        self.interval = interval
+        self.batch_size = batch_size
+        self.grace = grace
+        self._ready = False
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(), name="checkpoint-maintenance")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                stats = await self.run_once()
+            except Exception as e:
+                logger.warning("checkpoint_maintenance_failed", extra={"error": str(e)})
+                stats = {}
+            backlog = stats.get("expired_threads") == self.batch_size or stats.get("checked_rows") == self.batch_size
+            await asyncio.sleep(1 if backlog else self.interval)
+
+    async def run_once(self) -> dict:
+        """One bounded pass; returns what it did, or {} if another worker holds the lock."""
+        start = time.perf_counter()
+        async with self.pool.connection() as conn:
+            if not (await (await conn.execute("SELECT pg_try_advisory_lock(%s) AS locked", (MAINTENANCE_LOCK_ID,))).fetchone())["locked"]:
+                return {}
+            try:
+                if not self._ready:
+                    await self._setup(conn)
+                stats = {"expired_threads": 0, "checked_rows": 0, "trimmed_threads": 0, "checkpoints": 0, "blobs": 0,
+                         "compressed": 0}
+                if self.idle_ttl > 0:
+                    stats["expired_threads"] = await self._expire(conn)
+                cur = await conn.execute(LONG_THREADS_SQL, {"keep": self.keep, "grace": self.grace, "limit": self.batch_size})
+                rows = await cur.fetchall()
+                stats["checked_rows"] = len(rows)
+                for row in rows:
+                    if not row["long"]:
+                        continue
+                    deleted, blobs, compressed = await self._trim(conn, row["thread_id"])
+                    stats["trimmed_threads"] += 1
+                    stats["checkpoints"] += deleted
+                    stats["blobs"] += blobs
+                    stats["compressed"] += compressed
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock(%s)", (MAINTENANCE_LOCK_ID,))
+        for kind in ("expired_threads", "checkpoints", "blobs", "compressed"):
+            CHECKPOINT_MAINTENANCE.labels(kind=kind).inc(stats[kind])
+        logger.info("checkpoint_maintenance", extra={**stats, "seconds": round(time.perf_counter() - start, 3)})
+        return stats
+
+    async def setup(self):
+        """Create checkpoint_activity before the first checkpoint write needs it."""
+        if not self._ready:
+            async with self.pool.connection() as conn:
+                await self._setup(conn)
+
+    async def _setup(self, conn):
+        """Create checkpoint_activity if needed, backfilling it the first time."""
+        async with conn.transaction():
+            created = (await (await conn.execute("SELECT to_regclass('checkpoint_activity') IS NULL AS missing")).fetchone())["missing"]
+            for sql in ACTIVITY_SETUP_SQL:
+                await conn.execute(sql)
+            if created and (await (await conn.execute("SELECT to_regclass('checkpoints') IS NOT NULL AS saved")).fetchone())["saved"]:
+                await conn.execute(ACTIVITY_BACKFILL_SQL)
+        self._ready = True
+
+    async def _expire(self, conn) -> int:
+        cur = await conn.execute(IDLE_THREADS_SQL, {"ttl": self.idle_ttl, "limit": self.batch_size})
+        thread_ids = [row["thread_id"] for row in await cur.fetchall()]
+        if thread_ids:
+            async with conn.transaction():
+                for sql in DELETE_THREADS_SQL:
+                    await conn.execute(sql, (thread_ids,))
+        return len(thread_ids)
+
+    async def _trim(self, conn, thread_id):
+        """(checkpoints deleted, blobs deleted, blobs compressed) for one thread."""
+        async with conn.transaction():
+            old = {}
+            for row in await (await conn.execute(OLD_CHECKPOINTS_SQL, (thread_id, self.keep))).fetchall():
+                old.setdefault(row["checkpoint_ns"], []).append(row["checkpoint_id"])
+            deleted = 0
+            for ns, ids in old.items():
+                await conn.execute(DELETE_WRITES_SQL, (thread_id, ns, ids))
+                deleted += (await conn.execute(DELETE_CHECKPOINTS_SQL, (thread_id, ns, ids))).rowcount
+                await conn.execute(DETACH_PARENTS_SQL, (thread_id, ns, ids))
+            blobs = (await conn.execute(DELETE_ORPHAN_BLOBS_SQL, (thread_id,))).rowcount
+            await conn.execute(RECOUNT_ACTIVITY_SQL, (thread_id,))
+            compressed = await self._compress(conn, thread_id) if self.compress else 0
+        return deleted, blobs, compressed
+
+    async def _compress(self, conn, thread_id) -> int:
+        """Compress the blobs no head checkpoint references (so loads never decompress them)."""
+        heads = {
+            row["checkpoint_ns"]: row["versions"] or {}
+            for row in await (await conn.execute(HEAD_VERSIONS_SQL, (thread_id,))).fetchall()
+        }
+        rows = await (await conn.execute(UNCOMPRESSED_BLOBS_SQL, (thread_id, COMPRESS_MIN_BYTES))).fetchall()
+        updates = []
+        for row in rows:
+            if heads.get(row["checkpoint_ns"], {}).get(row["channel"]) == row["version"]:
+                continue
+            blob = zlib.compress(row["blob"], 6)
+            if len(blob) < len(row["blob"]):
+                updates.append((row["type"] + COMPRESSED_SUFFIX, blob, thread_id,
+                                row["checkpoint_ns"], row["channel"], row["version"]))
+        if updates:
+            async with conn.cursor() as cur:
+                await cur.executemany(COMPRESS_BLOB_SQL, updates)
+        return len(updates)
@@ -0,0 +1,79 @@
+# ---------------------------
+# Compact product serialization for the model
+# ---------------------------
+import os
+import re
+
+from .Tokens import count_tokens
+
+DESCRIPTION_CHARS = int(os.getenv("PRODUCT_DESCRIPTION_CHARS", "120"))
+COLUMNS = "id|name|price|colors|sizes|description"
+ROW_ID_RE = re.compile(r"^([^|\s]+)\|", re.MULTILINE)
+
+
+def truncate(text, limit: int = DESCRIPTION_CHARS) -> str:
+    """Cut text at a word boundary; rows are pipe-separated so pipes and newlines are flattened."""
+    text = " ".join(str(text or "").replace("|", "/").split())
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0].rstrip(",.;:") + "…"
+
+
+def _number(value) -> str:
+    try:
+        return f"{float(value):g}"
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def price_text(product) -> str:
+    """Offer price, followed by /list price when discounted ("19.99/24.99")."""
+    price, offer = product.get("price"), product.get("offer_price")
+    if offer not in (None, "") and price not in (None, "") and _number(offer) != _number(price):
+        return f"{_number(offer)}/{_number(price)}"
+    current = offer if offer not in (None, "") else price
+    return _number(current) if current not in (None, "") else "?"
+
+
+def build_vocabulary(values, prefix: str) -> dict:
+    """Short codes for vocabulary entries that cost more than one token to repeat."""
+    vocab = {}
+    for value in dict.fromkeys(values):
+        if count_tokens(value) > 1:
+            vocab[value] = f"{prefix}{len(vocab)}"
+    return vocab
+
+
+def compact_products(products, header: str = "") -> str:
+    """Serialize products as one pipe-separated row each, with a shared legend.
+
+    Carries the same fields tool_output_node used to show (id, name, offer/list price,
+    colors, sizes, description), minus JSON keys and whitespace. Multi-token colors and
+    sizes are written once in the legend and referenced by code in the rows.
+    """
+    colors = build_vocabulary((str(c) for p in products for c in p.get("colors") or []), "c")
+    sizes = build_vocabulary((str(s) for p in products for s in p.get("sizes") or []), "s")
+
+    lines = [header] if header else []
+    lines.append(f"columns: {COLUMNS} (price = offer/list when discounted)")
+    if colors:
+        lines.append("colors: " + " ".join(f"{code}={name}" for name, code in colors.items()))
+    if sizes:
+        lines.append("sizes: " + " ".join(f"{code}={name}" for name, code in sizes.items()))
+
+    for p in products:
+        row = [
+            str(p.get("id")),
+            truncate(p.get("product_name") or "Unknown Product", 80),
+            price_text(p),
+            ",".join(colors.get(str(c), str(c)) for c in p.get("colors") or []),
+            ",".join(sizes.get(str(s), str(s)) for s in p.get("sizes") or []),
+            truncate(p.get("description")),
+        ]
+        lines.append("|".join(row))
+    return "\n".join(lines)
+
+
+def product_ids(text: str) -> list:
+    """Product ids listed in a compact_products() table."""
+    return ROW_ID_RE.findall(text or "")
@@ -0,0 +1,159 @@
+# ---------------------------
+# Conversation history compaction
+# ---------------------------
+import json
+import os
+import re
+
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, ToolMessage
+
+from Observability.log import get_logger
+
+from .Compact import product_ids
+from .config import AIState
+from .Tokens import count_tokens
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "600"))
+
+ID_RE = re.compile(r'"id":\s*"([^"]+)"')
+QUERY_RE = re.compile(r'^Search "(.*?)":')
+REFERENCE_PREFIX = "[product_search"
+# The AIMessage the old tool_output_node appended after each search, in threads written before it
+# rewrote the ToolMessage in place; any other AIMessage after a ToolMessage is the agent's reply
+LEGACY_DUMP_RE = re.compile(
+    r"^(?:Found \d+ products\. Here are the available products:\n"
+    r"|Product search error: "
+    r"|No products found matching your criteria\. The product database returned no results\.$)"
+)
+
+logger = get_logger(__name__)
+
+
+def message_tokens(messages) -> int:
+    """Approximate prompt tokens for messages, including tool-call arguments."""
+    total = 0
+    for m in messages:
+        total += 4 + count_tokens(m.content if isinstance(m.content, str) else json.dumps(m.content))
+        for call in getattr(m, "tool_calls", None) or []:
+            total += count_tokens(json.dumps(call.get("args", {})))
+    return total
+
+
+def split_turns(messages) -> list:
+    """Group messages into turns that each start at a HumanMessage.
+
+    Tool calls and their results always land in the same turn, so dropping whole
+    turns never leaves an orphaned tool message behind.
+    """
+    turns = []
+    for m in messages:
+        if isinstance(m, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(m)
+    return turns
+
+
+def is_tool_dump(message, previous) -> bool:
+    """Raw product_search results, or the old tool_output re-dump that follows them."""
+    if isinstance(message.content, str) and message.content.startswith(REFERENCE_PREFIX):
+        return False
+    if isinstance(message, ToolMessage):
+        return True
+    return (
+        isinstance(message, AIMessage)
+        and not message.tool_calls
+        and isinstance(previous, ToolMessage)
+        and isinstance(message.content, str)
+        and LEGACY_DUMP_RE.match(message.content) is not None
+    )
+
+
+def compact_reference(message) -> str:
+    """One-line stand-in for a tool dump: the query and the product ids it returned."""
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+    match = QUERY_RE.match(content)
+    query = match.group(1) if match else None
+    if query is None:
+        try:
+            query = json.loads(content).get("query")
+        except (ValueError, AttributeError):
+            pass
+    # Compact tables from tool_output_node, or raw JSON in threads written before it
+    ids = list(dict.fromkeys(product_ids(content) or ID_RE.findall(content)))
+    label = f"{REFERENCE_PREFIX} '{query}'" if query else REFERENCE_PREFIX
+    shown = ", ".join(ids[:10]) + (", ..." if len(ids) > 10 else "")
+    return f"{label}: {len(ids)} products returned, ids: {shown or 'none'}]"
+
+
+def summarize_turn(turn) -> str:
+    """Extractive summary line: what the user asked and what was recommended."""
+    asked = next((m.content for m in turn if isinstance(m, HumanMessage)), "")
+    answer, products = "", []
+    for m in reversed(turn):
+        if isinstance(m, AIMessage) and not m.tool_calls and isinstance(m.content, str):
+            try:
+                reply = json.loads(m.content)
+                answer, products = reply.get("message") or "", reply.get("products") or []
+            except (ValueError, AttributeError):
+                answer = m.content
+            break
+    line = f"- User: {str(asked)[:160]}"
+    if answer:
+        line += f" | Assistant: {answer[:160]}"
+    if products:
+        line += f" | Recommended: {', '.join(products)}"
+    return line
+
+
+def trim_summary(lines) -> str:
+    """Drop the oldest summary lines until the summary fits its own budget."""
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > SUMMARY_TOKEN_BUDGET:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+# ---------------------------
+# History Node
+# ---------------------------
+def history_node(state: AIState):
+    """Compact the thread before the agent sees it.
+
+    Tool dumps from earlier turns are replaced in place with compact references, and
+    while the history is over HISTORY_TOKEN_BUDGET the oldest turns are folded into a
+    running summary and removed from the thread. The current turn is never touched.
+    """
+    messages = list(state["messages"])
+    summary = state.get("summary") or ""
+    before = message_tokens(messages) + count_tokens(summary)
+
+    turns = split_turns(messages)
+    replaced = {}
+    for turn in turns[:-1]:
+        for i, m in enumerate(turn):
+            if is_tool_dump(m, turn[i - 1] if i else None):
+                turn[i] = m.model_copy(update={"content": compact_reference(m)})
+                replaced[m.id] = turn[i]
+
+    removed = []
+    summary_lines = summary.splitlines() if summary else []
+    while len(turns) > 1 and message_tokens([m for t in turns for m in t]) > HISTORY_TOKEN_BUDGET:
+        oldest = turns.pop(0)
+        summary_lines.append(summarize_turn(oldest))
+        removed.extend(m.id for m in oldest)
+    if removed:
+        summary = trim_summary(summary_lines)
+
+    after = message_tokens([m for t in turns for m in t]) + count_tokens(summary)
+    history_stats["turns"] += 1
+    history_stats["tokens_before"] += before
+    history_stats["tokens_after"] += after
+    if before > after:
+        logger.debug("history_compacted", extra={"tokens_before": before, "tokens_after": after})
+
+    updates = [m for mid, m in replaced.items() if mid not in removed]
+    updates += [RemoveMessage(id=mid) for mid in removed]
+    return {"messages": updates, "summary": summary}
+
+
+history_stats = {"turns": 0, "tokens_before": 0, "tokens_after": 0}
@@ -0,0 +1,88 @@
+# ---------------------------
+# Graph, model and checkpoint instrumentation
+# ---------------------------
+import functools
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from Observability.log import get_logger
+from Observability.metrics import CHAT_MODEL_SECONDS, CHAT_MODEL_TOKENS, CHAT_NODE_SECONDS, CHECKPOINT_SECONDS, timed
+
+logger = get_logger(__name__)
+
+# Checkpointer coroutine methods and the op label they are timed under
+CHECKPOINT_OPS = {"aget_tuple": "read", "aput": "write", "aput_writes": "write_pending"}
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Times graph nodes and chat model calls, and records tokens per model call.
+
+    Pass it in the run config's ``callbacks``. One instance serves every concurrent run;
+    start times are keyed by run id.
+    """
+
+    run_inline = True   # record timings on the event loop, not in an executor
+
+    def __init__(self):
+        self._nodes = {}
+        self._models = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # Only the node's own run, not the runnables nested inside it
+        if node and kwargs.get("name") == node:
+            self._nodes[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        entry = self._nodes.pop(run_id, None)
+        if entry is not None:
+            CHAT_NODE_SECONDS.labels(node=entry[0]).observe(time.perf_counter() - entry[1])
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self.on_chain_end(None, run_id=run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._models[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._models.pop(run_id, None)
+        model, usage = (response.llm_output or {}).get("model_name"), None
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or usage
+                # Streamed runs carry the model name on the message, not in llm_output
+                model = model or getattr(message, "response_metadata", {}).get("model_name")
+        model = model or "unknown"
+        if start is not None:
+            CHAT_MODEL_SECONDS.labels(model=model).observe(time.perf_counter() - start)
+        if usage:
+            CHAT_MODEL_TOKENS.labels(model=model, kind="prompt").observe(usage.get("input_tokens", 0))
+            CHAT_MODEL_TOKENS.labels(model=model, kind="completion").observe(usage.get("output_tokens", 0))
+            logger.debug("model_call", extra={
+                "model": model, "input_tokens": usage.get("input_tokens"), "output_tokens": usage.get("output_tokens"),
+            })
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._models.pop(run_id, None)
+
+
+metrics_callback = MetricsCallbackHandler()
+
+
+def _timed_checkpoint_method(method, op):
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        with timed(CHECKPOINT_SECONDS, op=op):
+            return await method(*args, **kwargs)
+    return wrapper
+
+
+def instrument_checkpointer(checkpointer):
+    """Time the checkpointer's async reads and writes (wraps the instance's methods in place)."""
+    if not getattr(checkpointer, "_instrumented", False):
+        for name, op in CHECKPOINT_OPS.items():
+            setattr(checkpointer, name, _timed_checkpoint_method(getattr(checkpointer, name), op))
+        checkpointer._instrumented = True
+    return checkpointer
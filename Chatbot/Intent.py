@@ -0,0 +1,240 @@
+# ---------------------------
+# Local intent fast path
+# ---------------------------
+import json
+import math
+import os
+import re
+import time
+from collections import Counter, defaultdict
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from Observability.metrics import CHAT_ROUTE_SAVED_SECONDS, CHAT_ROUTE_TURNS
+
+from .Catalog import catalog
+from .config import AIState
+from .Search import TOKEN_RE, tokenize
+
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "1") != "0"
+INTENT_CONFIDENCE = float(os.getenv("INTENT_CONFIDENCE", "0.85"))
+OFF_TOPIC_CONFIDENCE = float(os.getenv("OFF_TOPIC_CONFIDENCE", "0.95"))
+FAST_PATH_MAX_WORDS = 25
+SHOPPING = "shopping"
+
+REPLIES = {
+    "greeting": "Hello! I'm here to help you find the perfect products. What are you looking for today?",
+    "thanks": "You're welcome! Let me know if there's anything else I can help you find.",
+    "goodbye": "Thanks for stopping by! Come back any time you need help finding products.",
+    "off_topic": "Sorry, I can only help with shopping and product questions. What can I help you find today?",
+}
+
+# Whole-message patterns; anything longer or mixed goes to the classifier
+RULES = [
+    ("greeting", re.compile(r"^(hi+|hello+|hey+|hiya|yo|howdy|good (morning|afternoon|evening)|greetings)( there)?( bot)?[\s!.,]*$")),
+    ("thanks", re.compile(r"^(thanks?( you)?( so much| a lot)?|thank u|thx|ty|cheers|much appreciated)[\s!.,]*$")),
+    ("goodbye", re.compile(r"^(bye+|goodbye|good bye|see (you|ya)( later)?|cya|that'?s all( for now)?)[\s!.,]*$")),
+]
+
+# Words that always mean the agent (and possibly a catalog search) is needed
+SHOPPING_RE = re.compile(
+    r"\b(buy|order|price|prices|cost|costs|how much|quality|material|brand|cheap\w*|expensive|"
+    r"discount|offer|sale|deal|size|sizes|colou?rs?|stock|available|recommend\w*|suggest\w*|"
+    r"show|find|looking|search|want|need|"
+    r"product\w*|item\w*|wear|outfit|gift|delivery|return|these|those|this one|that one|"
+    r"first|second|third|last one|more|other|similar|instead|compare)\b"
+)
+
+TRAINING = {
+    "greeting": [
+        "hi", "hello", "hey there", "good morning", "hello how are you", "hi there how are you doing",
+        "hey whats up", "good evening", "hiya", "hello assistant", "hey bot", "hi again",
+        "howdy", "hello nice to meet you", "yo whats up", "hey how is it going",
+        "what can you do", "who are you", "can you help me", "how can you help",
+    ],
+    "thanks": [
+        "thanks", "thank you", "thanks a lot", "thank you so much", "great thanks", "perfect thank you",
+        "awesome thanks", "ok thanks", "thx", "cool thank you", "that is helpful thanks",
+        "thanks for the help", "appreciate it", "much appreciated", "nice thanks", "great job thank you",
+    ],
+    "goodbye": [
+        "bye", "goodbye", "see you", "see you later", "bye bye", "thats all bye", "ok bye",
+        "catch you later", "have a nice day bye", "talk to you later", "i am done bye", "good night",
+    ],
+    "off_topic": [
+        "what is the capital of france", "tell me a joke", "who won the football match yesterday",
+        "what is the weather today", "write me a poem", "solve this math problem 2x + 3 = 7",
+        "who is the president of the united states", "explain quantum physics", "translate hello to spanish",
+        "what time is it", "how do i cook pasta", "write python code to sort a list",
+        "what is the meaning of life", "tell me about the history of rome", "how far is the moon",
+        "who are you voting for", "can you do my homework", "what is bitcoin price prediction",
+        "recommend a good movie to watch", "how do i fix my car engine", "what is 15 times 23",
+        "write an essay about climate change", "tell me a story", "who invented the telephone",
+    ],
+    SHOPPING: [
+        "show me red shirts", "i want a black watch", "do you have shoes in size 42", "looking for a summer dress",
+        "cheap jeans under 50", "any blue jackets", "i need a gift for my wife", "which phone is best",
+        "do you have this in medium", "show me more", "something cheaper", "the second one",
+        "yes please", "no something else", "tell me more about it", "is it available in black",
+        "what about pants", "compare the first two", "does it come in xl", "hoodies for winter",
+        "i like the red one", "what sizes does it have", "any discounts on sneakers", "smart watch",
+        "cotton t shirt", "formal shoes for office", "bag for travel", "is it waterproof",
+        "what material is it made of", "sports wear for men", "kids clothes", "leather belt",
+        "recommend a good laptop bag", "i am looking for a jacket", "show me similar products", "ok",
+    ],
+}
+
+
+class NaiveBayes:
+    """Multinomial naive Bayes over word unigrams and bigrams; trains in milliseconds on CPU."""
+
+    def __init__(self, alpha: float = 0.5):
+        self.alpha = alpha
+        self.priors = {}
+        self.counts = {}
+        self.totals = {}
+        self.vocabulary = set()
+
+    @staticmethod
+    def features(text) -> list:
+        words = TOKEN_RE.findall(str(text).lower())
+        return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+    def fit(self, examples: dict):
+        total = sum(len(texts) for texts in examples.values())
+        for label, texts in examples.items():
+            counts = Counter(f for text in texts for f in self.features(text))
+            self.priors[label] = math.log(len(texts) / total)
+            self.counts[label] = counts
+            self.totals[label] = sum(counts.values())
+            self.vocabulary.update(counts)
+        return self
+
+    def predict(self, text):
+        """(label, probability) of the most likely label."""
+        features = [f for f in self.features(text) if f in self.vocabulary]
+        size = len(self.vocabulary)
+        scores = {}
+        for label, prior in self.priors.items():
+            counts, denominator = self.counts[label], self.totals[label] + self.alpha * size
+            scores[label] = prior + sum(math.log((counts[f] + self.alpha) / denominator) for f in features)
+        best = max(scores, key=scores.get)
+        # Softmax over log scores gives a calibrated-enough confidence for thresholding
+        norm = sum(math.exp(s - scores[best]) for s in scores.values())
+        return best, 1 / norm
+
+
+classifier = NaiveBayes().fit(TRAINING)
+
+
+def mentions_catalog(text) -> bool:
+    """True if the text names a product term or color from the loaded catalog."""
+    snapshot = catalog.peek()
+    if snapshot is None:
+        # Load it for the next turns; this one relies on keywords and the model alone
+        catalog.refresh_in_background()
+        return False
+    index = snapshot.index
+    return any(term in index.postings or term in index.by_color for term in tokenize(text))
+
+
+def classify(text):
+    """(intent, confidence, source) for one user message."""
+    normalized = " ".join(str(text).lower().split())
+    for intent, pattern in RULES:
+        if pattern.match(normalized):
+            return intent, 1.0, "rule"
+    if SHOPPING_RE.search(normalized) or mentions_catalog(normalized):
+        return SHOPPING, 1.0, "keyword"
+    intent, confidence = classifier.predict(normalized)
+    return intent, confidence, "model"
+
+
+def is_fast_path(intent, confidence, text) -> bool:
+    if intent == SHOPPING or len(str(text).split()) > FAST_PATH_MAX_WORDS:
+        return False
+    # Refusing a real shopping question costs more than answering a trivial one
+    threshold = OFF_TOPIC_CONFIDENCE if intent == "off_topic" else INTENT_CONFIDENCE
+    return confidence >= threshold
+
+
+# ---------------------------
+# Router Node
+# ---------------------------
+def router_node(state: AIState):
+    """Answer greetings, thanks, goodbyes and off-topic questions without calling the model.
+
+    The templated reply is appended to the thread like any agent answer, so the
+    checkpoint and history look the same; everything else continues to the agent.
+    """
+    message = state["messages"][-1]
+    if not INTENT_ROUTER_ENABLED or not isinstance(message, HumanMessage) or not isinstance(message.content, str):
+        return {}
+
+    start = time.perf_counter()
+    intent, confidence, source = classify(message.content)
+    router_stats["classify_seconds"] += time.perf_counter() - start
+    if not is_fast_path(intent, confidence, message.content):
+        return {}
+
+    reply = json.dumps({"message": REPLIES[intent], "products": None})
+    return {"messages": [AIMessage(content=reply, response_metadata={"intent": intent, "intent_source": source})]}
+
+
+def route_after_router(state: AIState):
+    return "fast_path" if isinstance(state["messages"][-1], AIMessage) else "history"
+
+
+def fast_path_intent(result):
+    """Intent of a turn the router answered itself, or None if it went to the agent."""
+    message = (result or {}).get("messages", [None])[-1]
+    if isinstance(message, AIMessage):
+        return message.response_metadata.get("intent")
+    return None
+
+
+def record_turn(intent, seconds):
+    """Count a finished turn and its wall time under the path it took.
+
+    Also exported: a turn counter per route, and for each fast-path turn the time it
+    saved against the average agent turn so far (once there is one to compare with).
+    """
+    router_stats["turns"] += 1
+    CHAT_ROUTE_TURNS.labels(route=intent or "agent").inc()
+    if intent:
+        router_stats["fast_path"] += 1
+        router_stats["fast_seconds"] += seconds
+        router_stats["by_intent"][intent] += 1
+        agent_turns = router_stats["turns"] - router_stats["fast_path"]
+        if agent_turns:
+            CHAT_ROUTE_SAVED_SECONDS.observe(max(router_stats["agent_seconds"] / agent_turns - seconds, 0.0))
+    else:
+        router_stats["agent_seconds"] += seconds
+
+
+def router_report() -> dict:
+    """Fast-path share and the model latency it avoided, estimated from agent-turn averages."""
+    turns, fast = router_stats["turns"], router_stats["fast_path"]
+    agent_turns = turns - fast
+    agent_avg = router_stats["agent_seconds"] / agent_turns if agent_turns else 0.0
+    fast_avg = router_stats["fast_seconds"] / fast if fast else 0.0
+    return {
+        "turns": turns,
+        "fast_path": fast,
+        "fast_path_fraction": fast / turns if turns else 0.0,
+        "by_intent": dict(router_stats["by_intent"]),
+        "avg_fast_ms": fast_avg * 1000,
+        "avg_agent_ms": agent_avg * 1000,
+        "saved_seconds": fast * max(agent_avg - fast_avg, 0.0) if agent_turns else 0.0,
+        "classify_ms_per_turn": router_stats["classify_seconds"] * 1000 / turns if turns else 0.0,
+    }
+
+
+router_stats = {
+    "turns": 0,
+    "fast_path": 0,
+    "fast_seconds": 0.0,
+    "agent_seconds": 0.0,
+    "classify_seconds": 0.0,
+    "by_intent": defaultdict(int),
+}
@@ -1,22 +1,31 @@
-from langchain_core.messages import  HumanMessage
-from langchain_openai import ChatOpenAI
-from langgraph.graph.message import add_messages
+from langchain_core.messages import  AIMessage, HumanMessage
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
-from langgraph.checkpoint.postgres import PostgresSaver
 from .config import AIState, tools
-from .Nodes import agent_node, tool_output_node
+from .Nodes import REPAIR_TAG, agent_node, tool_output_node
+from .Reply import FALLBACK_MESSAGE, MessageStream, parse_reply
+from .History import history_node
+from .Intent import fast_path_intent, record_turn, route_after_router, router_node
+from .ResponseCache import first_turn_messages, response_cache
+from .Instrumentation import instrument_checkpointer, metrics_callback
+from .Checkpoints import CheckpointMaintenance, CompressedSerializer, track_activity
+from Observability.log import current_trace_id, get_logger
+import asyncio
 import os
+import time
+from uuid import uuid4
 from dotenv import load_dotenv
-import re
 load_dotenv()
 
+logger = get_logger(__name__)
 
 # ---------------------------
 # Build Graph
 # ---------------------------
 graph = StateGraph(AIState)
 
+graph.add_node("router", router_node)
+graph.add_node("history", history_node)
 graph.add_node("agent", agent_node)
 graph.add_node("tools", ToolNode(tools))
 
@@ -29,66 +38,209 @@ graph.add_conditional_edges(
     {"tools": "tools", END: END}
 )
 
+graph.add_conditional_edges(
+    "router",
+    route_after_router,
+    {"fast_path": END, "history": "history"}
+)
+
 graph.add_edge("tools", "tool_output")
 graph.add_edge("tool_output", "agent")
+graph.add_edge("history", "agent")
 
-graph.set_entry_point("agent")
-
-
-
-
-
-
+graph.set_entry_point("router")
 
 
-def main(thread_id: str, user_input: str):
-    
 
-    with PostgresSaver.from_conn_string(os.getenv("POSTGRES_URI")) as checkpointer:
-        # checkpointer.setup()
-
-    
-        # Compile app with the checkpointer
-        app = graph.compile(checkpointer=checkpointer)
-  
-        
-        with open("thread_id.txt", "w") as f:
-            f.write(thread_id)
-        config = {"configurable": {"thread_id":thread_id}}
-            
-        print(f"🧠 Testing with Memory (Session: {thread_id[:8]})")
-        print("="*60)
-
-                # First message
-        messages = [HumanMessage(content=user_input)]
-            
-        print("\n" + "="*50 + "\n")
-
-        result = app.invoke({"messages":messages}, config=config)
-
-        print("🤖 Bot Response (JSON):")
-        # Get the final AI response (last message that's not a tool call response)
-        for msg in reversed(result["messages"]):
-            if (hasattr(msg, 'content') and 
-                type(msg).__name__ == 'AIMessage' and 
-                not msg.content.startswith('{"success"') and
-                not msg.content.startswith('Found')):
-                try:
-                            # Try to parse and pretty print JSON
-                    import json
-
-                    if(msg.content.strip().startswith("```json")):
-                        # Extract JSON from code block
-                        match = re.search(r"```json(.*?)```", msg.content, re.DOTALL)
-                        if match:
-                            msg.content = match.group(1).strip()
-                    response_json = json.loads(msg.content)
-                    print(json.dumps(response_json, indent=2))
-                    return json.dumps(response_json, indent=2)
-                except:
-                    # If it's not valid JSON, print as is
-                    print(msg.content)
-                break
-
-     
-           
+# ---------------------------
+# Long-lived chatbot application
+# ---------------------------
+POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10"))
+POOL_TIMEOUT = float(os.getenv("POSTGRES_POOL_TIMEOUT", "30"))
+
+# Progress events sent to streaming clients when a graph node starts
+PROGRESS = {
+    "agent": "thinking",
+    "tools": "searching products",
+    "tool_output": "reviewing products",
+}
+
+
+def parse_response(result) -> dict:
+    """The turn's {message, products} reply: the content of its last AIMessage without tool calls.
+
+    agent_node already stored it in canonical form; parse_reply() still covers fast-path
+    answers and replies checkpointed before that, and anything unreadable becomes the
+    fallback message rather than an error.
+    """
+    for msg in reversed(result["messages"]):
+        if isinstance(msg, AIMessage) and not msg.tool_calls:
+            reply = parse_reply(msg.content)
+            if reply is not None:
+                return reply.model_dump()
+            logger.warning("invalid_model_reply", extra={"content": str(msg.content)[:500]})
+            break
+    return {"message": FALLBACK_MESSAGE, "products": None}
+
+
+class ChatbotApp:
+    """Graph compiled once, with checkpointer connections drawn from a bounded pool.
+
+    Create it at server startup and call start()/stop() around the process lifetime;
+    each request then only pays for ainvoke() with its thread config. Passing a
+    ready-made checkpointer (e.g. InMemorySaver) skips the Postgres pool entirely; with
+    Postgres, checkpoint retention runs in the background (see Checkpoints.py).
+    """
+
+    def __init__(self, conninfo=None, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE, checkpointer=None):
+        self.conninfo = conninfo or os.getenv("POSTGRES_URI")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkpointer = checkpointer
+        self.pool = None
+        self.maintenance = None
+        self.app = None
+        self._start_lock = asyncio.Lock()
+
+    async def start(self):
+        async with self._start_lock:
+            if self.app is None:
+                await self._start()
+
+    async def _start(self):
+        if self.checkpointer is None:
+            # Only needed with Postgres; imported here so an in-memory setup never pays for them
+            from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+            from psycopg.rows import dict_row
+            from psycopg_pool import AsyncConnectionPool
+
+            self.pool = AsyncConnectionPool(
+                self.conninfo,
+                min_size=self.min_size,
+                max_size=self.max_size,
+                timeout=POOL_TIMEOUT,
+                open=False,
+                # Connections are validated on checkout, so a dropped Postgres
+                # connection is replaced instead of failing the request
+                check=AsyncConnectionPool.check_connection,
+                kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+            )
+            await self.pool.open(wait=True)
+            self.checkpointer = AsyncPostgresSaver(self.pool)
+            # Older checkpoints may have been compressed by maintenance
+            self.checkpointer.serde = CompressedSerializer(self.checkpointer.serde)
+            self.maintenance = CheckpointMaintenance(self.pool)
+            await self.maintenance.setup()
+            track_activity(self.checkpointer, self.pool)
+            self.maintenance.start()
+        self.app = graph.compile(checkpointer=instrument_checkpointer(self.checkpointer))
+
+    async def stop(self):
+        if self.maintenance is not None:
+            await self.maintenance.stop()
+            self.maintenance = None
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+            self.checkpointer = None
+        self.app = None
+
+    async def chat(self, thread_id: str, user_input: str):
+        if self.app is None:
+            await self.start()
+        config = self._config(thread_id)
+        start = time.perf_counter()
+        key = response_cache.key(user_input)
+        result = await self._replay_cached(config, user_input, key)
+        cached = result is not None
+        if not cached:
+            result = await self.app.ainvoke({"messages":[HumanMessage(content=user_input)]}, config=config)
+        record_turn(fast_path_intent(result), time.perf_counter() - start)
+
+        response = parse_response(result)
+        logger.debug("chat_turn", extra={"thread_id": thread_id, "seconds": round(time.perf_counter() - start, 4), "cached": cached})
+        if not cached:
+            self._remember(key, result)
+        return response
+
+    async def stream(self, thread_id: str, user_input: str):
+        """Yield (event, data) pairs while the turn runs: progress, token, then final.
+
+        ``token`` carries the reply's message text as the agent model streams it, decoded
+        from the JSON reply (product ids only come with ``final``). ``final`` carries the
+        same parsed {message, products} payload that chat() returns, and is what counts:
+        a reply that needed repair or fell back differs from the streamed text.
+        """
+        if self.app is None:
+            await self.start()
+        config = self._config(thread_id)
+        inputs = {"messages":[HumanMessage(content=user_input)]}
+
+        start = time.perf_counter()
+        key = response_cache.key(user_input)
+        result = await self._replay_cached(config, user_input, key)
+        if result is not None:
+            record_turn(fast_path_intent(result), time.perf_counter() - start)
+            yield "final", parse_response(result)
+            return
+
+        replies = {}   # agent model run id -> MessageStream
+        async for event in self.app.astream_events(inputs, config=config, version="v2"):
+            kind = event["event"]
+            node = event.get("metadata", {}).get("langgraph_node")
+            if kind == "on_chain_start" and event["name"] == node and node in PROGRESS:
+                yield "progress", {"node": node, "status": PROGRESS[node]}
+            elif kind == "on_chat_model_stream" and node == "agent" and REPAIR_TAG not in event.get("tags", ()):
+                content = event["data"]["chunk"].content
+                if content and isinstance(content, str):
+                    text = replies.setdefault(event["run_id"], MessageStream()).feed(content)
+                    if text:
+                        yield "token", {"content": text}
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                result = event["data"].get("output")
+        record_turn(fast_path_intent(result), time.perf_counter() - start)
+
+        if result is None:
+            yield "error", {"detail": "The assistant did not return a valid response."}
+        else:
+            self._remember(key, result)
+            yield "final", parse_response(result)
+
+    @staticmethod
+    def _config(thread_id):
+        """Run config: the thread, the metrics callback and the request's trace id."""
+        return {
+            "configurable": {"thread_id": thread_id},
+            "callbacks": [metrics_callback],
+            "metadata": {"trace_id": current_trace_id.get()},
+        }
+
+    async def _replay_cached(self, config, user_input, key):
+        """Write a cached first-turn answer into an empty thread; None on a miss or a later turn."""
+        messages = response_cache.get(key) if key is not None else None
+        if messages is None:
+            return None
+        # Only the thread's first message may reuse an answer; later ones depend on history
+        state = await self.app.aget_state(config)
+        if state.values.get("messages"):
+            return None
+        messages = [HumanMessage(content=user_input, id=str(uuid4())), *messages]
+        # Recorded as the agent's output, so the thread ends the turn exactly as after a real run
+        await self.app.aupdate_state(config, {"messages": messages}, as_node="agent")
+        return {"messages": messages}
+
+    def _remember(self, key, result):
+        """Cache a finished first turn that went through the agent."""
+        if key is None or fast_path_intent(result):
+            return
+        messages = first_turn_messages(result)
+        if messages:
+            response_cache.put(key, messages)
+
+
+chatbot = ChatbotApp()
+
+
+async def main(thread_id: str, user_input: str):
+    return await chatbot.chat(thread_id, user_input)
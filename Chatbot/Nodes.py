@@ -1,134 +1,187 @@
-from langchain_core.messages import  AIMessage, SystemMessage
-from .config import AIState, model
+from typing import Optional
+from langchain_core.messages import  AIMessage, HumanMessage, SystemMessage, ToolMessage
+from .config import AIState, get_model, get_repair_model
+from .Catalog import catalog
+from .Compact import compact_products
+from .History import message_tokens
+from .Reply import FALLBACK_MESSAGE, AgentReply, parse_reply, reply_content, validate_products
+from Observability.log import get_logger
+from Observability.metrics import CHAT_REPLIES, CHAT_REPLY_PRODUCTS_DROPPED
+from Outbound.scheduler import openai_scheduler
+import json
+import openai
+import os
 
+# Reserved for the reply when estimating a call's tokens for the rate limiter
+COMPLETION_TOKEN_ESTIMATE = 400
 
 
-
-# ---------------------------
-# Agent Node
-# ---------------------------
-def agent_node(state: AIState):
-    system_prompt = SystemMessage(content="""
+# The reply format is enforced by the schema bound in config.get_model(), not by the prompt
+SYSTEM_PROMPT = """
     You are an intelligent shopping assistant with advanced product analysis capabilities and conversation memory. And Do NOT answer any questions irrelevant to shopping or products.
-    
-    CRITICAL: You MUST ALWAYS respond in the following JSON format ONLY. No exceptions!
-    
-    REQUIRED RESPONSE FORMAT:
-    {
-        "message": "your response message here",
-        "products": ["product_id_1", "product_id_2"] or null
-    }
-    
-    STRICT JSON RULES:
-    - Your response MUST be valid JSON that starts with { and ends with }
-    - If recommending products, put their exact IDs from the database in the "products" array
-    - If no products to recommend, set "products": null
-    - The "message" field contains your helpful response with product details
-    - DO NOT include product IDs in the message text - only in the "products" array
-    - NEVER respond with plain text - ALWAYS respond with this exact JSON structure
-    - Test your JSON before responding to ensure it's valid
-    
+
+    REPLY:
+    - Put your answer in "message" and the exact ids of the products you recommend in "products" (null when recommending none).
+    - In the message, name the products with a short, engaging description in paragraph form. No ids, prices, sizes or availability, and no numbered lists.
+
     MEMORY & CONTEXT:
     - You can remember previous conversations and user preferences from earlier messages.
     - Reference past interactions when relevant (e.g., "Based on your earlier interest in red products...")
-    - Build on previous searches and recommendations to provide better assistance.
-    - If a user mentions something they liked or disliked before, remember and use that information.
-    
+    - Build on previous searches and recommendations; remember what the user liked or disliked before.
+
     PRODUCT SEARCH INSTRUCTIONS:
-    - Use the product_search tool to get ALL available products from the database.
-    - YOU must intelligently analyze the full product list and select the most relevant products based on the user's specific requirements.
-    - Pay close attention to user criteria like colors, sizes, product types, and descriptions.
-    - When user asks for "red products in size M", find products that have BOTH "red" (or "Red") in their colors array AND "M" in their sizes array.
-    - Analyze all product attributes: product_name, description, colors, sizes, price, offer_price.
-    - Present only the top 2-3 most relevant products that exactly match the user's criteria.
-    - If no products match the exact criteria, suggest the closest alternatives.
+    - Use the product_search tool to search the product database. It returns the top matching candidates ranked by relevance, not the whole catalog.
+    - Put the product type and keywords in "query", and pass the user's colors, sizes and price limits as the colors, sizes, min_price and max_price arguments.
+    - YOU must still analyze the returned candidates and select the most relevant products based on the user's specific requirements.
+    - When user asks for "red products in size M", call product_search with colors ["red"] and sizes ["M"]; check that the picks have BOTH "red" (or "Red") in their colors array AND "M" in their sizes array.
+    - If the search result says "relaxed", no product matched every filter - present the results as the closest alternatives.
+    - Search results arrive as a table with one product per row: id|name|price|colors|sizes|description. Price is the offer price, followed by /list price when discounted. Codes such as c0 or s1 are defined in the colors/sizes legend above the rows.
+    - Present only the top 2-3 most relevant products that exactly match the user's criteria; if none match exactly, suggest the closest alternatives.
     - Only call the product_search tool when you need fresh product data or when the user asks for a new/different search.
-    
-    EXAMPLE RESPONSES:
-    
-    Example 1 - Product Recommendation:
-    {
-        "message": "I found some great products for you: **Premium Red Shirt** - A stylish red shirt perfect for casual outings. **Casual Red Shoes** - Comfortable and trendy shoes for everyday wear.",
-        "products": ["cmfrt227w0002vhfsh8ez0sic", "cmfrt227x0007vhfst7knoqqn"]
-    }
-    
-    Example 2 - General Conversation:
-    {
-        "message": "Hello! I'm here to help you find the perfect products. What are you looking for today?",
-        "products": null
-    }
-    
-    STRICT FORMATTING RULES:
-    - ALWAYS respond in ONLY the EXACT JSON format specified above. No deviations.
-    - NEVER include any text outside the JSON format.
-    - NEVER include pricing, sizes, or availability information in the message.
-    - Focus only on product names and brief descriptions in the message.
-
-   MESSAGE FORMATTING FOR PRODUCTS:
-    - Format products with name and a short description only
-    - Present in paragraph format, not numbered lists
-    - DO NOT include product IDs, prices, sizes, or availability in the message
-    - Keep descriptions brief and engaging
-    
+
     CONVERSATION FLOW:
-    - Be conversational and remember what the user has asked about before.
-    - If they're asking follow-up questions, provide helpful additional information without unnecessary tool calls.
-    - Personalize responses based on conversation history.
+    - For follow-up questions, answer from what you already found without unnecessary tool calls.
     - Be precise and thorough in your analysis - the user is counting on your intelligence to find the right products.
-    - Always include product IDs in the "products" array when recommending specific products.
-    
-    FINAL REMINDER: Every single response must be valid JSON with "message" and "products" fields. No exceptions!
-    """)
+    """
 
-    messages = [system_prompt] + list(state["messages"])
-    response = model.invoke(messages)
-    return {"messages": [response]}
+# Model calls allowed to turn a malformed final reply into the schema before falling back
+REPLY_REPAIR_ATTEMPTS = int(os.getenv("REPLY_REPAIR_ATTEMPTS", "1"))
+REPAIR_PROMPT = (
+    "Rewrite the assistant reply below in the required format. Keep the wording of the message, "
+    "move any product ids into products, and use null when there are none."
+)
+REPAIR_TAG = "reply_repair"
+
+# Raised by the SDK when strict decoding stops before the reply object is complete
+CUT_SHORT = (openai.LengthFinishReasonError, openai.ContentFilterFinishReasonError)
+
+logger = get_logger(__name__)
 
 
 # ---------------------------
-# Tool Output Formatter (Product API)
+# Agent Node
 # ---------------------------
-def tool_output_node(state: AIState):
-    """Convert product API response into a structured format for the AI to process."""
-    last_message = state["messages"][-1]
+async def agent_node(state: AIState):
+    system_prompt = SystemMessage(content=SYSTEM_PROMPT)
 
-    if not hasattr(last_message, "content"):
-        return {}
+    messages = [system_prompt]
+    if state.get("summary"):
+        messages.append(SystemMessage(content="Summary of earlier conversation:\n" + state["summary"]))
+    messages += list(state["messages"])
+    try:
+        response = await call_model(get_model(), messages)
+    except CUT_SHORT as e:
+        response = AIMessage(content=cut_short_content(e))
+    if not response.tool_calls:
+        response = await finalize_reply(response)
+    return {"messages": [response]}
 
+
+async def call_model(model, messages, config=None):
+    """Wait for rate-limit capacity (or raise Overloaded), call the model, then true up with the real usage."""
+    ticket = await openai_scheduler.aacquire(message_tokens(messages) + COMPLETION_TOKEN_ESTIMATE)
+    # The estimate stands unless the reply reports usage or the request never reached the API
+    used = None
     try:
-        import json
-        data = json.loads(last_message.content) if isinstance(last_message.content, str) else last_message.content
+        response = await model.ainvoke(messages, config=config)
+        used = (response.usage_metadata or {}).get("total_tokens")
+        return response
+    except openai.APIConnectionError:
+        used = 0
+        raise
+    except CUT_SHORT as e:
+        used = getattr(e.completion.usage, "total_tokens", None)
+        logger.warning("model_reply_cut_short", extra={"finish_reason": e.completion.choices[0].finish_reason})
+        raise
+    finally:
+        ticket.settle(used)
+
+
+def cut_short_content(error) -> str:
+    """What a reply stopped early still has to repair: the partial text of a length cut-off,
+    nothing of a filtered one."""
+    if isinstance(error, openai.LengthFinishReasonError):
+        return error.completion.choices[0].message.content or ""
+    return ""
+
+
+async def repair_reply(content) -> Optional[AgentReply]:
+    """Ask the repair model to reformat a broken reply; only the reply text is sent, not the thread."""
+    messages = [SystemMessage(content=REPAIR_PROMPT), HumanMessage(content=str(content))]
+    for _ in range(REPLY_REPAIR_ATTEMPTS):
+        # Tagged so the stream does not forward its tokens as the agent's
+        try:
+            response = await call_model(get_repair_model(), messages, config={"tags": [REPAIR_TAG]})
+        except CUT_SHORT:
+            continue
+        reply = parse_reply(response.content)
+        if reply is not None:
+            return reply
+    return None
+
+
+async def finalize_reply(response):
+    """The final AIMessage with its content rewritten as canonical {message, products} JSON.
+
+    Malformed replies get at most REPLY_REPAIR_ATTEMPTS cheap reformatting calls instead of
+    another agent loop (none when there is no text to repair), and product ids the catalog
+    does not know are dropped.
+    """
+    outcome = "valid"
+    reply = parse_reply(response.content)
+    if reply is None and response.content:
+        outcome = "repaired"
+        reply = await repair_reply(response.content)
+    if reply is None:
+        outcome = "fallback"
+        reply = AgentReply(message=FALLBACK_MESSAGE, products=None)
+        logger.warning("invalid_model_reply", extra={"content": str(response.content)[:500]})
+    products, unknown = validate_products(reply.products, catalog.peek())
+    if unknown:
+        logger.warning("unknown_products_dropped", extra={"products": unknown[:20]})
+        CHAT_REPLY_PRODUCTS_DROPPED.inc(len(unknown))
+    CHAT_REPLIES.labels(outcome=outcome).inc()
+    # Same id, so the checkpoint holds the canonical reply
+    return response.model_copy(update={"content": reply_content(reply.model_copy(update={"products": products}))})
+
+
+# ---------------------------
+# Tool Output Formatter (Product API)
+# ---------------------------
+def format_tool_result(content) -> str:
+    """Turn one product_search JSON result into the compact table the AI reads."""
+    try:
+        data = json.loads(content) if isinstance(content, str) else content
 
         # Handle error cases
         if not data.get("success", True):
             error_msg = data.get("error", "Unknown error occurred")
-            summary = f"Product search error: {error_msg}. Please try again or ask for help with something else."
-        elif not data.get("data") or len(data.get("data", [])) == 0:
-            summary = "No products found matching your criteria. The product database returned no results."
-        else:
-            products = data["data"]
-            # Format product information for AI processing
-            product_info = []
-            
-            for p in products:
-                price_info = f"${p.get('offer_price', p.get('price', 'N/A'))}"
-                if p.get("offer_price") and p.get("price") and p["offer_price"] != p["price"]:
-                    price_info = f"${p['offer_price']} (was ${p['price']})"
-                
-                product_info.append({
-                    "id": p.get('id'),
-                    "name": p.get('product_name', 'Unknown Product'),
-                    "price": price_info,
-                    "colors": p.get('colors', []),
-                    "sizes": p.get('sizes', []),
-                    "description": p.get('description', 'No description available')
-                })
-
-            summary = f"Found {len(products)} products. Here are the available products:\n" + json.dumps(product_info, indent=2)
+            return f"Product search error: {error_msg}. Please try again or ask for help with something else."
+        if not data.get("data") or len(data.get("data", [])) == 0:
+            return "No products found matching your criteria. The product database returned no results."
+
+        products = data["data"]
+        header = data.get("message") or f"Found {len(products)} products."
+        if data.get("query"):
+            header = f"Search \"{data['query']}\": {header}"
+        return compact_products(products, header)
 
     except json.JSONDecodeError as e:
-        summary = f"Error parsing product data: The server returned invalid data. Please try again later."
+        return f"Error parsing product data: The server returned invalid data. Please try again later."
     except Exception as e:
-        summary = f"Error processing product data: {str(e)}"
+        return f"Error processing product data: {str(e)}"
+
+
+def tool_output_node(state: AIState):
+    """Rewrite this step's product_search ToolMessages in place as compact product tables.
+
+    The rewritten messages keep their ids, so add_messages replaces the raw JSON instead
+    of appending a second copy of the catalog to the thread.
+    """
+    updates = []
+    for message in reversed(state["messages"]):
+        if not isinstance(message, ToolMessage):
+            break
+        updates.append(message.model_copy(update={"content": format_tool_result(message.content)}))
 
-    return {"messages": [AIMessage(content=summary)]}
+    return {"messages": updates[::-1]}
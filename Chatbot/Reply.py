@@ -0,0 +1,115 @@
+# ---------------------------
+# Final reply: schema, parsing and product validation
+# ---------------------------
+import json
+import re
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+FENCE_RE = re.compile(r"^```[a-zA-Z]*\s*(.*?)\s*```$", re.DOTALL)
+MESSAGE_START_RE = re.compile(r'"message"\s*:\s*"')
+
+# Shown when a reply could be neither parsed nor repaired
+FALLBACK_MESSAGE = "Sorry, I couldn't put my answer together. Could you ask that again?"
+
+
+class AgentReply(BaseModel):
+    """What the agent's last message of a turn must contain."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    message: str = Field(description="Reply to the user: product names and short descriptions, no ids, prices or sizes.")
+    products: Optional[List[str]] = Field(description="Exact ids of the recommended products from the search results, or null.")
+
+
+# Bound as response_format to the agent model: with strict decoding the final answer is
+# always this object, so the prompt no longer has to spell the format out
+REPLY_FORMAT = {"name": "shopping_reply", "strict": True, "schema": AgentReply.model_json_schema()}
+
+
+def parse_reply(content) -> Optional[AgentReply]:
+    """The reply in a model message, or None if it needs repairing.
+
+    Besides the plain JSON object, accepts what models produce when they drift: a
+    ```json fenced block, an object with prose around it, and prose alone (taken as
+    the message, with no products).
+    """
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    text = str(content or "").strip()
+    match = FENCE_RE.match(text)
+    if match:
+        text = match.group(1)
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0:
+        return AgentReply(message=text, products=None) if text else None
+    try:
+        return AgentReply.model_validate_json(text[start:end + 1])
+    except ValidationError:
+        return None
+
+
+def validate_products(ids, snapshot):
+    """(known ids in order without duplicates, or None; ids missing from the catalog).
+
+    Without a loaded snapshot there is nothing to check against and the ids are kept.
+    """
+    known, unknown = [], []
+    for pid in dict.fromkeys(str(pid) for pid in ids or []):
+        if snapshot is None or pid in snapshot.products:
+            known.append(pid)
+        else:
+            unknown.append(pid)
+    return known or None, unknown
+
+
+class MessageStream:
+    """Decodes the "message" string of a reply as its JSON streams in, for token events.
+
+    feed() takes each raw content delta and returns the message text it completed, which
+    is empty until the value starts and after it ends. Escapes are decoded only once whole
+    (a surrogate pair counts as one), so the pieces always join up to the message.
+    """
+
+    def __init__(self):
+        self._raw = ""
+        self._start = None   # index in _raw where the message value begins
+        self._pos = 0        # end of what has been decoded, relative to _start
+        self._done = False
+
+    def feed(self, delta: str) -> str:
+        if self._done:
+            return ""
+        self._raw += delta
+        if self._start is None:
+            match = MESSAGE_START_RE.search(self._raw)
+            if match is None:
+                return ""
+            self._start = match.end()
+        raw = self._raw[self._start:]
+        begin = end = self._pos
+        while end < len(raw):
+            c = raw[end]
+            if c == '"':
+                self._done = True
+                break
+            if c != "\\":
+                end += 1
+                continue
+            if raw[end + 1:end + 2] != "u":
+                size = 2
+            elif 0xD800 <= int(raw[end + 2:end + 6] or "0", 16) <= 0xDBFF:
+                size = 12   # a high surrogate decodes only with its low half
+            else:
+                size = 6
+            if end + size > len(raw):
+                break
+            end += size
+        self._pos = end
+        return json.loads(f'"{raw[begin:end]}"') if end > begin else ""
+
+
+def reply_content(reply: AgentReply) -> str:
+    """Canonical JSON stored as the final message's content."""
+    return json.dumps({"message": reply.message, "products": reply.products})
@@ -0,0 +1,106 @@
+# ---------------------------
+# First-turn response cache
+# ---------------------------
+import os
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from langchain_core.messages import HumanMessage
+
+from .Catalog import catalog
+from .Search import TOKEN_RE
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "600"))
+
+
+def normalize_query(text) -> str:
+    """Case, punctuation and whitespace-insensitive form of a user message."""
+    return " ".join(TOKEN_RE.findall(str(text).lower()))
+
+
+def first_turn_messages(result):
+    """Messages a first turn added after the user's message, or None for a later turn.
+
+    A turn is a first turn when its thread holds exactly one user message and no summary.
+    """
+    result = result or {}
+    messages = list(result.get("messages") or [])
+    if result.get("summary") or sum(isinstance(m, HumanMessage) for m in messages) != 1:
+        return None
+    if not isinstance(messages[0], HumanMessage) or len(messages) < 2:
+        return None
+    return messages[1:]
+
+
+class ResponseCache:
+    """LRU + TTL cache of first-turn answers keyed by normalized query and catalog version.
+
+    An entry holds every message the turn appended (tool call, compacted search results
+    and final answer), so a hit can be written to the new thread's checkpoint and
+    follow-up questions see the same context as after a real run. Entries are dropped
+    as soon as the catalog version changes.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # (version, query) -> (messages, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, user_input):
+        """Cache key for a message, or None while no catalog snapshot is loaded."""
+        snapshot = catalog.peek()
+        query = normalize_query(user_input)
+        if snapshot is None or not query:
+            return None
+        return snapshot.version, query
+
+    def get(self, key):
+        """Copies of the cached turn's messages with fresh ids, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            messages = entry[0]
+        return [m.model_copy(update={"id": str(uuid4())}) for m in messages]
+
+    def put(self, key, messages):
+        with self._lock:
+            self._entries[key] = (list(messages), time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self.evictions += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache()
+catalog.on_change(lambda old, new: response_cache.clear())
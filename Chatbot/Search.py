@@ -0,0 +1,331 @@
+# ---------------------------
+# Product retrieval index
+# ---------------------------
+import json
+import math
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from Shared.store import Strings, find_key, pack_strings, sorted_keys
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "any", "are", "for", "find", "get", "have", "i", "in", "is", "it",
+    "looking", "me", "need", "of", "on", "or", "please", "product", "products", "show",
+    "some", "something", "that", "the", "to", "want", "with", "you", "your", "size", "sizes",
+    "color", "colors", "colour", "colours", "price", "under", "below", "over", "above",
+    "between", "less", "more", "than", "cheap", "cheaper", "do", "can", "what",
+}
+
+SIZE_ALIASES = {
+    "extra small": "XS",
+    "extra large": "XL",
+    "double xl": "XXL",
+    "small": "S",
+    "medium": "M",
+    "large": "L",
+}
+
+PRICE_MAX_RE = re.compile(r"\b(?:under|below|less than|cheaper than|up to|max(?:imum)?)\s*\$?\s*(\d+(?:\.\d+)?)")
+PRICE_MIN_RE = re.compile(r"\b(?:over|above|more than|at least|min(?:imum)?)\s*\$?\s*(\d+(?:\.\d+)?)")
+PRICE_RANGE_RE = re.compile(r"\bbetween\s*\$?\s*(\d+(?:\.\d+)?)\s*(?:and|-|to)\s*\$?\s*(\d+(?:\.\d+)?)")
+SIZE_RE = re.compile(r"\bsize\s+([a-z0-9]+)\b")
+
+
+def tokenize(text) -> list:
+    """Lowercase word tokens with stopwords removed."""
+    if not text:
+        return []
+    return [t for t in TOKEN_RE.findall(str(text).lower()) if t not in STOPWORDS]
+
+
+def effective_price(product):
+    """Price the customer actually pays: offer_price when set, otherwise price."""
+    for key in ("offer_price", "price"):
+        try:
+            value = product.get(key)
+            if value not in (None, ""):
+                return float(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class ProductIndex:
+    """In-memory BM25 index over product_name/description with color, size and price filters."""
+
+    def __init__(self, products, k1: float = 1.5, b: float = 0.75, name_weight: int = 2):
+        self.products = list(products)
+        self.k1 = k1
+        self.b = b
+
+        self.postings = defaultdict(list)   # term -> [(doc, tf)]
+        self.doc_len = []
+        self.by_color = defaultdict(set)
+        self.by_size = defaultdict(set)
+        self.prices = []
+
+        for doc, p in enumerate(self.products):
+            terms = tokenize(p.get("product_name")) * name_weight + tokenize(p.get("description"))
+            self.doc_len.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self.postings[term].append((doc, tf))
+            for color in p.get("colors") or []:
+                self.by_color[str(color).lower().strip()].add(doc)
+            for size in p.get("sizes") or []:
+                self.by_size[str(size).upper().strip()].add(doc)
+            self.prices.append(effective_price(p))
+
+        n = len(self.products)
+        self.avgdl = (sum(self.doc_len) / n) if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def __len__(self):
+        return len(self.products)
+
+    # ---------------------------
+    # Query understanding
+    # ---------------------------
+    def parse_query(self, query: str) -> dict:
+        """Pull color, size and price constraints out of a free-text query."""
+        text = (query or "").lower()
+        filters = {}
+
+        colors = [c for c in self.by_color if c and re.search(rf"\b{re.escape(c)}\b", text)]
+        if colors:
+            filters["colors"] = colors
+
+        sizes = set()
+        for alias, size in SIZE_ALIASES.items():
+            if re.search(rf"\b{alias}\b", text):
+                sizes.add(size)
+                text = text.replace(alias, " ")
+        sizes.update(m.upper() for m in SIZE_RE.findall(text))
+        for size in self.by_size:
+            # Multi-letter sizes (XL, 32, 10.5) are unambiguous on their own; single letters need "size M"
+            if len(size) > 1 and re.search(rf"\b{re.escape(size.lower())}\b", text):
+                sizes.add(size)
+        sizes = [s for s in sizes if s in self.by_size]
+        if sizes:
+            filters["sizes"] = sizes
+
+        match = PRICE_RANGE_RE.search(text)
+        if match:
+            filters["min_price"], filters["max_price"] = sorted(float(v) for v in match.groups())
+        else:
+            match = PRICE_MAX_RE.search(text)
+            if match:
+                filters["max_price"] = float(match.group(1))
+            match = PRICE_MIN_RE.search(text)
+            if match:
+                filters["min_price"] = float(match.group(1))
+
+        return filters
+
+    # ---------------------------
+    # Filtering and ranking
+    # ---------------------------
+    def filter(self, colors=None, sizes=None, min_price=None, max_price=None):
+        """Return the set of matching doc ids, or None when no filter is active."""
+        allowed = None
+
+        if colors:
+            docs = set().union(*(self.by_color.get(str(c).lower().strip(), set()) for c in colors))
+            allowed = docs
+        if sizes:
+            docs = set().union(*(self.by_size.get(str(s).upper().strip(), set()) for s in sizes))
+            allowed = docs if allowed is None else allowed & docs
+        if min_price is not None or max_price is not None:
+            lo = float("-inf") if min_price is None else float(min_price)
+            hi = float("inf") if max_price is None else float(max_price)
+            docs = {d for d, price in enumerate(self.prices) if price is not None and lo <= price <= hi}
+            allowed = docs if allowed is None else allowed & docs
+
+        return allowed
+
+    def score(self, terms, allowed=None) -> dict:
+        """BM25 score per doc for the given query terms, restricted to allowed docs."""
+        scores = defaultdict(float)
+        for term in set(terms):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc, tf in self.postings[term]:
+                if allowed is not None and doc not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc] / (self.avgdl or 1))
+                scores[doc] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, top_k: int = 10, **filters) -> dict:
+        """Rank products for query; explicit filters override the ones parsed from the text.
+
+        If the strict filters leave nothing, they are dropped and the closest text matches
+        are returned with ``relaxed`` set so the assistant can present them as alternatives.
+        Without filters, products no query term matches are never returned.
+        """
+        parsed = self.parse_query(query)
+        parsed.update({k: v for k, v in filters.items() if v not in (None, [], "")})
+
+        terms = tokenize(query)
+        allowed = self.filter(**parsed)
+        relaxed = False
+        if allowed is not None and not allowed:
+            allowed, relaxed = None, True
+
+        scores = self.score(terms, allowed)
+        candidates = allowed if allowed is not None else range(len(self.products))
+        # Docs with no text match still qualify on filters alone; they sort after scored ones
+        ranked = sorted(candidates, key=lambda d: (-scores.get(d, 0.0), d))
+        if terms and allowed is None:
+            # Without filters to qualify on, only text matches count; none means no results
+            ranked = [d for d in ranked if scores.get(d, 0.0) > 0]
+
+        return {
+            "filters": parsed,
+            "relaxed": relaxed,
+            "total_matches": len(ranked),
+            "data": [self.products[d] for d in ranked[:top_k]],
+        }
+
+
+# ---------------------------
+# Column form, for the shared store
+# ---------------------------
+def index_columns(index: ProductIndex):
+    """(meta, columns) for a ProductIndex: postings, doc lengths, prices and filters as arrays.
+
+    Products are stored as their JSON in row (doc) order; ColumnIndex searches the
+    columns directly and decodes only the products it returns.
+    """
+    terms = sorted(index.postings)
+    post_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum([len(index.postings[t]) for t in terms], out=post_offsets[1:])
+    postings = [entry for t in terms for entry in index.postings[t]]
+    columns = {
+        "terms": sorted_keys(terms),
+        "idf": np.array([index.idf[t] for t in terms], dtype=np.float64),
+        "post_offsets": post_offsets,
+        "post_docs": np.array([doc for doc, _ in postings], dtype=np.uint32),
+        "post_tf": np.array([tf for _, tf in postings], dtype=np.float64),
+        "doc_len": np.array(index.doc_len, dtype=np.float64),
+        "prices": np.array([np.nan if p is None else p for p in index.prices], dtype=np.float64),
+    }
+    meta = {"k1": index.k1, "b": index.b, "avgdl": index.avgdl}
+    for field, docs in (("color", index.by_color), ("size", index.by_size)):
+        names = list(docs)
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum([len(docs[n]) for n in names], out=offsets[1:])
+        columns[f"{field}_offsets"] = offsets
+        columns[f"{field}_docs"] = np.array([d for n in names for d in sorted(docs[n])], dtype=np.uint32)
+        meta[f"{field}s"] = names
+    columns["product_offsets"], columns["product_blob"] = pack_strings(
+        json.dumps(p, separators=(",", ":"), default=str) for p in index.products
+    )
+    return meta, columns
+
+
+class JSONRows(Strings):
+    def __getitem__(self, i):
+        return json.loads(super().__getitem__(i))
+
+
+class SortedTerms:
+    """Membership test over the terms column (what ProductIndex.postings is used for outside search)."""
+
+    def __init__(self, keys):
+        self.keys = keys
+
+    def __contains__(self, term):
+        return find_key(self.keys, term) is not None
+
+
+class ColumnIndex(ProductIndex):
+    """ProductIndex over the columns of a mapped file: same queries and ranking, no per-process copy."""
+
+    def __init__(self, file):
+        meta = file.meta
+        self.products = JSONRows(file["product_offsets"], file["product_blob"])
+        self.k1, self.b, self.avgdl = meta["k1"], meta["b"], meta["avgdl"]
+        self.terms = file["terms"]
+        self.postings = SortedTerms(self.terms)
+        self.idf_values = file["idf"]
+        self.post_offsets, self.post_docs, self.post_tf = file["post_offsets"], file["post_docs"], file["post_tf"]
+        self.doc_len = file["doc_len"]
+        self.prices = file["prices"]
+        # Name -> position in the *_offsets column; parse_query() only reads the keys
+        self.by_color = {name: i for i, name in enumerate(meta["colors"])}
+        self.by_size = {name: i for i, name in enumerate(meta["sizes"])}
+        self._filters = {
+            "color": (file["color_offsets"], file["color_docs"]),
+            "size": (file["size_offsets"], file["size_docs"]),
+        }
+
+    def _docs(self, field, names, keys):
+        offsets, docs = self._filters[field]
+        mask = np.zeros(len(self), dtype=bool)
+        for key in keys:
+            i = names.get(key)
+            if i is not None:
+                mask[docs[offsets[i]:offsets[i + 1]]] = True
+        return mask
+
+    def filter(self, colors=None, sizes=None, min_price=None, max_price=None):
+        """Boolean mask of matching docs, or None when no filter is active."""
+        allowed = None
+        if colors:
+            allowed = self._docs("color", self.by_color, (str(c).lower().strip() for c in colors))
+        if sizes:
+            docs = self._docs("size", self.by_size, (str(s).upper().strip() for s in sizes))
+            allowed = docs if allowed is None else allowed & docs
+        if min_price is not None or max_price is not None:
+            lo = -np.inf if min_price is None else float(min_price)
+            hi = np.inf if max_price is None else float(max_price)
+            with np.errstate(invalid="ignore"):
+                docs = (self.prices >= lo) & (self.prices <= hi)
+            allowed = docs if allowed is None else allowed & docs
+        return allowed
+
+    def score(self, terms, allowed=None) -> np.ndarray:
+        scores = np.zeros(len(self))
+        for term in set(terms):
+            i = find_key(self.terms, term)
+            if i is None:
+                continue
+            start, end = self.post_offsets[i], self.post_offsets[i + 1]
+            docs, tf = self.post_docs[start:end], self.post_tf[start:end]
+            if allowed is not None:
+                keep = allowed[docs]
+                docs, tf = docs[keep], tf[keep]
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / (self.avgdl or 1))
+            scores[docs] += self.idf_values[i] * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, top_k: int = 10, **filters) -> dict:
+        parsed = self.parse_query(query)
+        parsed.update({k: v for k, v in filters.items() if v not in (None, [], "")})
+
+        terms = tokenize(query)
+        allowed = self.filter(**parsed)
+        relaxed = False
+        if allowed is not None and not allowed.any():
+            allowed, relaxed = None, True
+
+        scores = self.score(terms, allowed)
+        candidates = np.flatnonzero(allowed) if allowed is not None else np.arange(len(self))
+        ranked = candidates[np.lexsort((candidates, -scores[candidates]))]
+        if terms and allowed is None:
+            ranked = ranked[scores[ranked] > 0]
+
+        return {
+            "filters": parsed,
+            "relaxed": relaxed,
+            "total_matches": len(ranked),
+            "data": [self.products[int(d)] for d in ranked[:top_k]],
+        }
@@ -0,0 +1,33 @@
+# ---------------------------
+# Prompt token counting
+# ---------------------------
+# Counts are exact with tiktoken's gpt-4o vocabulary (o200k_base). tiktoken downloads it on
+# first use, or reads it from TIKTOKEN_CACHE_DIR; where neither works (offline hosts) every
+# count, and so HISTORY_TOKEN_BUDGET and the benchmarks' token figures, is a ~4 chars/token
+# estimate. The fallback is logged once.
+from functools import lru_cache
+
+from Observability.log import get_logger
+
+logger = get_logger(__name__)
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """Load the gpt-4o tokenizer if tiktoken and its vocabulary are available locally."""
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model("gpt-4o")
+    except Exception as e:
+        logger.warning("tokenizer_unavailable", extra={"fallback": "chars/4 estimate", "error": str(e)})
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count prompt tokens for text, falling back to a ~4 chars/token estimate."""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return max(1, len(text) // 4)
@@ -1,57 +1,71 @@
 # ---------------------------
 # Product search tool
 # ---------------------------
+from typing import List, Optional
 from langchain_core.tools import tool
-import requests
+import httpx
 import json
+from Observability.log import get_logger
+from .Catalog import catalog
+
+logger = get_logger(__name__)
+
+TOP_K = 8
 
 
 @tool
-def product_search(query: str) -> str:
-    """Search for products in the database. Returns all available products for the AI to analyze and select from."""
-    print(f"User query: '{query}'")
-    
-    # API endpoint - fetch all products and let GPT decide which are relevant
-    api_url = "http://10.10.7.77:3000/api/product/all"
-    search_params = {"limit": 100}
+async def product_search(
+    query: str,
+    colors: Optional[List[str]] = None,
+    sizes: Optional[List[str]] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+) -> str:
+    """Search the product catalog and return the best matching products, ranked by relevance.
+
+    Args:
+        query: What the user is looking for, e.g. "red cotton shirt in size M under $40".
+        colors: Optional colors the product must come in.
+        sizes: Optional sizes the product must be available in.
+        min_price: Optional minimum price (offer price when discounted).
+        max_price: Optional maximum price (offer price when discounted).
+    """
+    logger.debug("product_search", extra={"query": query, "colors": colors, "sizes": sizes})
     
     try:
-        print(f"Fetching all products from API...")
-        
-        response = requests.get(
-            api_url,
-            params=search_params,
-            timeout=15,
-            headers={'Accept': 'application/json', 'Content-Type': 'application/json'}
-        )
-        
-        print(f"Response status: {response.status_code}")
-        response.raise_for_status()
-        data = response.json()
-        
-        products = data.get('data', [])
-        print(f"API returned {len(products)} total products for GPT to analyze")
+        snapshot = await catalog.aget()
         
-        if not data or not products:
+        if not len(snapshot):
             return json.dumps({
                 "success": False, 
                 "error": "No products found in the database.", 
                 "data": []
             })
 
-        # Return all products - let GPT decide which are most relevant
+        # Rank locally and only hand the top candidates to the model
+        result = snapshot.index.search(
+            query, top_k=TOP_K, colors=colors, sizes=sizes, min_price=min_price, max_price=max_price
+        )
+        message = f"Found {result['total_matches']} matching products, showing the top {len(result['data'])}."
+        if not result["total_matches"]:
+            message = "No products match this search."
+        if result["relaxed"]:
+            message = "No exact matches for the requested filters. " + message.replace("matching", "related")
+
         return json.dumps({
             "success": True, 
-            "message": f"Found {len(products)} products. GPT will select the most relevant ones based on your query.",
+            "message": message,
             "query": query,
-            "data": products
+            "filters": result["filters"],
+            "relaxed": result["relaxed"],
+            "data": result["data"]
         })
 
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         return json.dumps({"success": False, "error": "Request timed out. Please try again.", "data": []})
-    except requests.exceptions.RequestException as e:
-        print(f"Request error: {e}")
+    except httpx.HTTPError as e:
+        logger.warning("product_search_request_failed", extra={"error": str(e)})
         return json.dumps({"success": False, "error": f"Failed to fetch products. Details: {str(e)}", "data": []})
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        logger.exception("product_search_failed")
         return json.dumps({"success": False, "error": f"An unexpected error occurred: {str(e)}", "data": []})
\ No newline at end of file
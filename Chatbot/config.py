@@ -1,19 +1,51 @@
 from typing import Annotated, Sequence, TypedDict
 from langchain_core.messages import BaseMessage
-from langchain_openai import ChatOpenAI
 from langgraph.graph.message import add_messages
 from .Tools import product_search
+from .Reply import REPLY_FORMAT
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
-api_key = os.getenv("OPENAI_API_KEY")
-if api_key is None:
-    raise ValueError("OPENAI_API_KEY environment variable not set")
-
 class AIState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
+    summary: str
 
 tools = [product_search]
-model = ChatOpenAI(model="gpt-4o", api_key=api_key).bind_tools(tools)
\ No newline at end of file
+
+# Cheaper model used only to reformat a final reply that came back malformed
+REPLY_REPAIR_MODEL = os.getenv("REPLY_REPAIR_MODEL", "gpt-4o-mini")
+
+_model = None
+_repair_model = None
+
+
+def _chat_model(name):
+    from langchain_openai import ChatOpenAI
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if api_key is None:
+        raise ValueError("OPENAI_API_KEY environment variable not set")
+    # stream_usage: token counts for streamed turns too (read by the metrics callback)
+    return ChatOpenAI(model=name, api_key=api_key, stream_usage=True)
+
+
+def get_model():
+    """The chat model with the tools and the reply schema bound, created on first use.
+
+    langchain_openai takes over a second to import, and a missing key should fail the
+    first chat turn (or warm-up), not every import of the chatbot package.
+    """
+    global _model
+    if _model is None:
+        _model = _chat_model("gpt-4o").bind_tools(tools, response_format=REPLY_FORMAT)
+    return _model
+
+
+def get_repair_model():
+    """Tool-less model bound to the reply schema, for Nodes.repair_reply()."""
+    global _repair_model
+    if _repair_model is None:
+        _repair_model = _chat_model(REPLY_REPAIR_MODEL).bind(response_format={"type": "json_schema", "json_schema": REPLY_FORMAT})
+    return _repair_model
@@ -0,0 +1,84 @@
+import asyncio
+import os
+
+import anyio
+
+from Observability.metrics import IMAGE_STAGE_SECONDS, timed
+from Outbound.scheduler import BATCH, priority
+
+from .image import analyze_images_with_gpt_vision, analyze_with_vocabulary, begin_analysis, finish_analysis, vocabulary
+from .preprocess import prepare_image_async
+
+
+VISION_CONCURRENCY = int(os.getenv("VISION_CONCURRENCY", "4"))
+VISION_PACK_SIZE = int(os.getenv("VISION_PACK_SIZE", "1"))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "20"))
+
+
+def _analyze_pack(pack, vocab):
+    """Cache/local-color checks, then one multi-image vision call for whatever is left.
+
+    Falls back to one call per image when the packed reply doesn't line up with the images.
+    """
+    results, pending = {}, []
+    for i, path, prepared in pack:
+        image_hash, cached, local_color = begin_analysis(path, prepared, vocab)
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.append((i, path, prepared, image_hash, local_color))
+
+    responses = None
+    if len(pending) > 1:
+        responses = analyze_images_with_gpt_vision([p[2] for p in pending], vocab.categories, vocab.colors)
+    if responses is None:
+        for i, path, prepared, _, _ in pending:
+            results[i] = analyze_with_vocabulary(path, prepared, vocab)
+    else:
+        for (i, _, _, image_hash, local_color), response in zip(pending, responses):
+            results[i] = finish_analysis(image_hash, response, local_color, vocab)
+    return results
+
+
+# Function to analyze several uploaded images with one vocabulary fetch
+async def analyze_batch(image_paths, concurrency=None, pack_size=None):
+    """Analyze images concurrently; returns one result per path, in order.
+
+    The vocabulary is fetched once for the whole batch and the images are preprocessed in
+    parallel in the process pool. Vision calls then run in worker threads, at most
+    ``concurrency`` (VISION_CONCURRENCY) at a time, each carrying up to ``pack_size``
+    (VISION_PACK_SIZE) images, queued behind interactive calls for rate-limit capacity.
+    Each result is {"category", "color"}, or {"error": ...} for a file that could not be
+    decoded.
+    """
+    with timed(IMAGE_STAGE_SECONDS, stage="vocabulary"):
+        vocab = await anyio.to_thread.run_sync(vocabulary.get)
+    with timed(IMAGE_STAGE_SECONDS, stage="preprocess_batch"):
+        prepared = await asyncio.gather(*(prepare_image_async(p) for p in image_paths), return_exceptions=True)
+
+    results = [None] * len(image_paths)
+    items = []
+    for i, (path, image) in enumerate(zip(image_paths, prepared)):
+        if isinstance(image, (OSError, ValueError)):
+            results[i] = {"error": "Uploaded file is not a readable image"}
+        elif isinstance(image, BaseException):
+            raise image
+        else:
+            items.append((i, path, image))
+
+    pack_size = max(1, pack_size or VISION_PACK_SIZE)
+    semaphore = asyncio.Semaphore(max(1, concurrency or VISION_CONCURRENCY))
+
+    # anyio's thread limiter (40), not asyncio.to_thread, whose default executor is only
+    # cpu_count + 4 threads and would silently cap the semaphore on small machines
+    async def run(pack):
+        async with semaphore:
+            return await anyio.to_thread.run_sync(_analyze_pack, pack, vocab)
+
+    packs = [items[start:start + pack_size] for start in range(0, len(items), pack_size)]
+    with priority(BATCH):   # copied into the gathered tasks and their worker threads
+        tasks = [asyncio.ensure_future(run(pack)) for pack in packs]
+    for pack_results in await asyncio.gather(*tasks):
+        for i, result in pack_results.items():
+            results[i] = result
+    return results
@@ -0,0 +1,309 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import suppress
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from Observability.log import get_logger
+from Shared.store import Strings, pack_strings, shared_store
+
+
+IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", "1024"))
+IMAGE_CACHE_TTL_SECONDS = float(os.getenv("IMAGE_CACHE_TTL_SECONDS", "86400"))
+IMAGE_CACHE_MAX_DISTANCE = int(os.getenv("IMAGE_CACHE_MAX_DISTANCE", "4"))
+# Shared table: entries kept host-wide, and how often the leader merges the workers' journals into it
+IMAGE_CACHE_SHARED_SIZE = int(os.getenv("IMAGE_CACHE_SHARED_SIZE", "65536"))
+IMAGE_CACHE_COMPACT_SECONDS = float(os.getenv("IMAGE_CACHE_COMPACT_SECONDS", "5"))
+IMAGE_CACHE_JOURNAL_BYTES = int(os.getenv("IMAGE_CACHE_JOURNAL_BYTES", str(1 << 20)))
+
+logger = get_logger(__name__)
+
+
+# Function to compute a perceptual difference hash (dHash) of an image
+def dhash(image, hash_size=8):
+    """64-bit dHash of the decoded pixels: survives re-encoding, resizing and small edits.
+
+    Accepts a path or a PIL image. Returns None if the file cannot be decoded.
+    """
+    try:
+        if not isinstance(image, Image.Image):
+            with Image.open(image) as img:
+                return dhash(ImageOps.exif_transpose(img), hash_size)
+        gray = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+        pixels = list(gray.getdata())
+    except (OSError, ValueError) as e:
+        logger.warning("image_hash_failed", extra={"error": str(e)})
+        return None
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def _popcount(values):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8)).reshape(len(values), 64).sum(axis=1)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# Function to fingerprint the category/color lists the results were matched against
+def vocabulary_version(categories, colors):
+    payload = json.dumps([sorted(categories or []), sorted(colors or [])])
+    return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+
+class ImageResultCache:
+    """LRU + TTL cache of {category, color} results keyed by image hash and vocabulary version.
+
+    Lookups first try the exact hash, then any entry of the same vocabulary version within
+    ``max_distance`` bits (Hamming), so a re-upload of the same photo that was re-encoded or
+    resized still hits. Entries from an older vocabulary never match.
+
+    With a SharedStore the workers on a host share their results. Each worker appends its
+    puts to its own journal file. The store's leader merges all journals every
+    IMAGE_CACHE_COMPACT_SECONDS into a new version of a column table (hash, vocabulary,
+    expiry, result) that every worker maps and searches after its local entries. Local
+    entries are dropped once a table that includes them is published, so each worker only
+    holds what it added since the last merge.
+    """
+
+    def __init__(self, max_entries=IMAGE_CACHE_SIZE, ttl=IMAGE_CACHE_TTL_SECONDS, max_distance=IMAGE_CACHE_MAX_DISTANCE,
+                 store=None, shared_entries=IMAGE_CACHE_SHARED_SIZE):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._entries = OrderedDict()   # (version, hash) -> (result, expires_at, added wall time)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.store = store
+        self.shared_entries = shared_entries
+        self._table = None
+        self._cleared_at = 0.0
+        self._journal = None
+        self._journal_pid = None
+        self._compactor_pid = None
+
+    def get(self, image_hash, version):
+        if image_hash is None:
+            return None
+        now = time.monotonic()
+        self._start_compactor()
+        with self._lock:
+            self._adopt()
+            key = self._find(image_hash, version, now)
+            distance, result = None, None
+            if key is not None:
+                self._entries.move_to_end(key)
+                distance, result = (key[1] ^ image_hash).bit_count(), dict(self._entries[key][0])
+        if distance != 0:
+            shared = self._find_shared(image_hash, version)
+            if shared is not None and (distance is None or shared[0] < distance):
+                distance, result = shared
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            elif distance == 0:
+                self.hits += 1
+            else:
+                self.near_hits += 1
+        return result
+
+    def put(self, image_hash, version, result):
+        if image_hash is None:
+            return
+        self._start_compactor()
+        with self._lock:
+            key = (version, image_hash)
+            self._entries[key] = (dict(result), time.monotonic() + self.ttl, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            if self.store is not None:
+                self._append({"h": image_hash, "v": version, "e": time.time() + self.ttl, "r": result})
+
+    def _find(self, image_hash, version, now):
+        key = (version, image_hash)
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > now:
+            return key
+
+        best, best_distance = None, self.max_distance + 1
+        for (entry_version, entry_hash), (_, expires_at, _) in list(self._entries.items()):
+            if expires_at <= now:
+                del self._entries[(entry_version, entry_hash)]
+                self.evictions += 1
+                continue
+            if entry_version != version:
+                continue
+            distance = (entry_hash ^ image_hash).bit_count()
+            if distance < best_distance:
+                best, best_distance = (entry_version, entry_hash), distance
+        return best
+
+    def clear(self):
+        """Forget every result cached so far, including the shared ones (for this process)."""
+        with self._lock:
+            self._entries.clear()
+            self._cleared_at = time.time()
+
+    # ---------------------------
+    # Shared table
+    # ---------------------------
+    def _adopt(self):
+        """Map a newer shared table and drop the local entries it already holds (lock held)."""
+        table = self.store.current() if self.store is not None else None
+        if table is None or table is self._table:
+            return
+        self._table = table
+        merged = table.meta["compacted_at"]
+        for key in [key for key, entry in self._entries.items() if entry[2] < merged]:
+            del self._entries[key]
+
+    def _find_shared(self, image_hash, version):
+        """(distance, result) of the nearest live entry in the shared table, or None."""
+        table = self._table
+        if table is None or not len(table["hash"]):
+            return None
+        expires = table["expires"]
+        live = (table["vocab"] == str(version).encode()) & (expires > max(time.time(), self._cleared_at + self.ttl))
+        if not live.any():
+            return None
+        distance = np.where(live, _popcount(table["hash"] ^ np.uint64(image_hash)), 64 + 1)
+        i = int(np.argmin(distance))
+        if distance[i] > self.max_distance:
+            return None
+        return int(distance[i]), json.loads(Strings(table["result_offsets"], table["result_blob"])[i])
+
+    def _append(self, record):
+        """Add one put to this process's journal (lock held); a full journal is rotated."""
+        try:
+            if self._journal is None or self._journal_pid != os.getpid() or self._journal.tell() > IMAGE_CACHE_JOURNAL_BYTES:
+                if self._journal is not None and self._journal_pid == os.getpid():
+                    self._journal.close()
+                name = f"{self.store.name}.{os.getpid()}-{time.time_ns()}.journal"
+                self._journal = open(self.store.path(name), "a", encoding="utf-8")
+                self._journal_pid = os.getpid()
+            # One write per line; O_APPEND keeps lines whole even if the leader reads meanwhile
+            self._journal.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self._journal.flush()
+        except OSError as e:
+            logger.warning("image_cache_journal_failed", extra={"error": str(e)})
+
+    def _start_compactor(self):
+        """Every process runs a compactor thread; only the one holding the store's lock merges."""
+        if self.store is None or self._compactor_pid == os.getpid():
+            return
+        self._compactor_pid = os.getpid()
+
+        def loop():
+            while True:
+                time.sleep(IMAGE_CACHE_COMPACT_SECONDS)
+                try:
+                    if self.store.lead():
+                        self.compact()
+                except Exception as e:
+                    logger.warning("image_cache_compact_failed", extra={"error": str(e)})
+
+        threading.Thread(target=loop, name="image-cache-compactor", daemon=True).start()
+
+    def compact(self) -> dict:
+        """Leader: merge the table and every journal into a new table version.
+
+        Expired entries are dropped and the newest ``shared_entries`` kept. Journal read
+        offsets are stored in the table, so a new leader continues where the last one
+        stopped. Fully read journals of exited workers, and rotated ones, are deleted.
+        """
+        started = time.time()
+        table = self.store.current()
+        offsets = dict(table.meta["journals"]) if table is not None else {}
+        entries = {}   # (version, hash) -> (expires, result JSON)
+        if table is not None:
+            results = Strings(table["result_offsets"], table["result_blob"])
+            rows = zip(table["vocab"].tolist(), table["hash"].tolist(), table["expires"].tolist())
+            for i, (version, image_hash, expires) in enumerate(rows):
+                if expires > started:
+                    entries[(version.decode(), image_hash)] = (expires, results[i])
+
+        prefix = self.store.name + "."
+        journals = sorted(f for f in os.listdir(self.store.root) if f.startswith(prefix) and f.endswith(".journal"))
+        read = 0
+        for name in journals:
+            with open(self.store.path(name), "rb") as f:
+                f.seek(offsets.get(name, 0))
+                data = f.read()
+            # A line still being written waits for the next pass
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                with suppress(ValueError, KeyError, TypeError):
+                    record = json.loads(line)
+                    if record["e"] > started:
+                        entries[(record["v"], record["h"])] = (record["e"], json.dumps(record["r"], separators=(",", ":")))
+                    read += 1
+            offsets[name] = offsets.get(name, 0) + end
+
+        offsets = {name: offsets[name] for name in journals}
+        if read or table is None or len(entries) != len(table["hash"]):
+            newest = sorted(entries.items(), key=lambda item: item[1][0], reverse=True)[:self.shared_entries]
+            result_offsets, result_blob = pack_strings(result for _, (_, result) in newest)
+            columns = {
+                "hash": np.array([image_hash for (_, image_hash), _ in newest], dtype=np.uint64),
+                "vocab": np.array([version.encode() for (version, _), _ in newest], dtype="S32"),
+                "expires": np.array([expires for _, (expires, _) in newest], dtype=np.float64),
+                "result_offsets": result_offsets,
+                "result_blob": result_blob,
+            }
+            table = self.store.publish({"compacted_at": started, "journals": offsets}, columns)
+        self._remove_journals(journals, offsets)
+        return {"entries": len(table["hash"]), "read": read, "journals": len(journals)}
+
+    def _remove_journals(self, journals, offsets):
+        newest = {}
+        for name in journals:
+            pid = int(name[len(self.store.name) + 1:].split("-")[0])
+            newest[pid] = max(newest.get(pid, name), name)
+        for name in journals:
+            pid = int(name[len(self.store.name) + 1:].split("-")[0])
+            path = self.store.path(name)
+            with suppress(OSError):
+                if offsets[name] >= os.path.getsize(path) and (name != newest[pid] or not _pid_alive(pid)):
+                    os.unlink(path)
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        table = self._table
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "size": size,
+            "shared_size": len(table["hash"]) if table is not None else 0,
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+        }
+
+
+result_cache = ImageResultCache(store=shared_store("image-results-v1"))
@@ -0,0 +1,153 @@
+import os
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from Observability.log import get_logger
+
+
+COLOR_CONFIDENCE_THRESHOLD = float(os.getenv("COLOR_CONFIDENCE_THRESHOLD", "0.45"))
+SAMPLE_EDGE = 96
+CLUSTERS = 4
+CHROMATIC = 15.0
+
+# Reference sRGB values for color names a catalog is likely to use
+COLOR_RGB = {
+    "black": (20, 20, 20), "white": (245, 245, 245), "grey": (128, 128, 128), "gray": (128, 128, 128),
+    "silver": (192, 192, 192), "charcoal": (54, 69, 79), "red": (200, 30, 30), "maroon": (128, 0, 0),
+    "burgundy": (128, 0, 32), "pink": (240, 140, 170), "orange": (245, 130, 30), "yellow": (245, 215, 40),
+    "gold": (212, 175, 55), "beige": (220, 200, 160), "cream": (250, 240, 210), "khaki": (195, 176, 145),
+    "brown": (120, 75, 40), "tan": (210, 180, 140), "green": (40, 150, 60), "olive": (110, 120, 40),
+    "teal": (0, 128, 128), "blue": (30, 90, 200), "navy": (20, 30, 80), "navyblue": (20, 30, 80),
+    "skyblue": (135, 206, 235), "lightblue": (170, 210, 240), "purple": (120, 50, 160),
+    "violet": (150, 90, 200), "lavender": (200, 180, 230),
+}
+
+logger = get_logger(__name__)
+
+
+# ---------------------------
+# Color space conversion
+# ---------------------------
+def rgb_to_lab(rgb):
+    """sRGB (..., 3) in 0-255 to CIELAB (D65), vectorized."""
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    c = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+    m = np.array([[0.4124, 0.3576, 0.1805], [0.2126, 0.7152, 0.0722], [0.0193, 0.1192, 0.9505]])
+    xyz = c @ m.T / np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16 / 116)
+    return np.stack([116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+def _normalize(name):
+    return "".join(ch for ch in str(name).lower() if ch.isalpha())
+
+
+def _load_pixels(image):
+    """Small RGB array from a path, raw bytes or PIL image."""
+    if isinstance(image, (bytes, bytearray)):
+        image = BytesIO(image)
+    if not isinstance(image, Image.Image):
+        with Image.open(image) as img:
+            return _load_pixels(ImageOps.exif_transpose(img))
+    img = image.convert("RGB")
+    img.thumbnail((SAMPLE_EDGE, SAMPLE_EDGE))
+    return np.asarray(img, dtype=np.float64)
+
+
+# ---------------------------
+# Segmentation and clustering
+# ---------------------------
+def foreground_mask(lab, threshold=12.0):
+    """Pixels that differ from the border (background) color by more than threshold Delta E."""
+    border = np.concatenate([lab[0], lab[-1], lab[:, 0], lab[:, -1]])
+    background = np.median(border, axis=0)
+    mask = np.linalg.norm(lab - background, axis=-1) > threshold
+    # Product filling the frame, or background matching the product: fall back to the center
+    if mask.mean() < 0.05:
+        h, w = mask.shape
+        mask = np.zeros_like(mask)
+        mask[h // 4: 3 * h // 4, w // 4: 3 * w // 4] = True
+    return mask
+
+
+def kmeans(points, k=CLUSTERS, iterations=12, seed=0):
+    """Plain Lloyd's k-means with k-means++ seeding; returns (centroids, labels)."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(points))
+    centroids = [points[rng.integers(len(points))]]
+    for _ in range(1, k):
+        d = np.min(((points[:, None, :] - np.array(centroids)[None]) ** 2).sum(-1), axis=1)
+        if d.sum() == 0:
+            break
+        centroids.append(points[rng.choice(len(points), p=d / d.sum())])
+    centroids = np.array(centroids)
+
+    for _ in range(iterations):
+        labels = ((points[:, None, :] - centroids[None]) ** 2).sum(-1).argmin(1)
+        updated = np.array([points[labels == i].mean(0) if np.any(labels == i) else centroids[i] for i in range(len(centroids))])
+        if np.allclose(updated, centroids):
+            break
+        centroids = updated
+    return centroids, labels
+
+
+def color_distances(lab, references):
+    """Naming distance from one Lab color to each reference.
+
+    Achromatic colors use plain Delta E. For chromatic ones hue dominates (a light blue
+    shirt is still "blue", not "white" or "navy"), with lightness and chroma as tie-breakers,
+    and achromatic references are ruled out.
+    """
+    ref_chroma = np.hypot(references[:, 1], references[:, 2])
+    chroma = np.hypot(lab[1], lab[2])
+    if chroma <= CHROMATIC or not np.any(ref_chroma > CHROMATIC):
+        return np.linalg.norm(references - lab, axis=1)
+
+    hue = np.degrees(np.arctan2(lab[2], lab[1]))
+    ref_hue = np.degrees(np.arctan2(references[:, 2], references[:, 1]))
+    hue_diff = np.abs((ref_hue - hue + 180) % 360 - 180)
+    distances = hue_diff + 0.3 * np.abs(references[:, 0] - lab[0]) + 0.2 * np.abs(ref_chroma - chroma)
+    return np.where(ref_chroma > CHROMATIC, distances, np.inf)
+
+
+# Function to detect the dominant product color locally
+def dominant_color(image, vocabulary):
+    """Map the largest foreground cluster to the nearest vocabulary color.
+
+    Returns {"color", "confidence", "rgb"}; color is None when no vocabulary entry has a
+    known reference value. Confidence (0-1) combines the cluster's share of the
+    foreground, how close it is to the chosen color and how clearly it beats the runner-up.
+    """
+    known = [(name, COLOR_RGB[_normalize(name)]) for name in vocabulary or [] if _normalize(name) in COLOR_RGB]
+    try:
+        pixels = _load_pixels(image)
+    except (OSError, ValueError) as e:
+        logger.warning("color_detection_failed", extra={"error": str(e)})
+        return {"color": None, "confidence": 0.0, "rgb": None}
+    if not known:
+        return {"color": None, "confidence": 0.0, "rgb": None}
+
+    lab = rgb_to_lab(pixels)
+    mask = foreground_mask(lab)
+    points, rgb_points = lab[mask], pixels[mask]
+    centroids, labels = kmeans(points)
+    counts = np.bincount(labels, minlength=len(centroids))
+    top = counts.argmax()
+    share = counts[top] / counts.sum()
+
+    references = rgb_to_lab(np.array([rgb for _, rgb in known]))
+    distances = color_distances(centroids[top], references)
+    order = distances.argsort()
+    best = distances[order[0]]
+    runner_up = distances[order[1]] if len(order) > 1 and np.isfinite(distances[order[1]]) else best + 50
+    closeness = float(np.exp(-best / 30))
+    separation = float(1 - best / runner_up) if runner_up > 0 else 1.0
+    confidence = float(np.sqrt(share)) * closeness * (0.5 + 0.5 * separation)
+
+    return {
+        "color": known[order[0]][0],
+        "confidence": round(confidence, 3),
+        "rgb": [int(v) for v in rgb_points[labels == top].mean(0)],
+    }
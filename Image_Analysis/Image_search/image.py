@@ -1,17 +1,35 @@
 import requests
 import json
-from PIL import Image
 import base64
-from io import BytesIO
 import re
-from fuzzywuzzy import fuzz
+import mimetypes
 import os
 from dotenv import load_dotenv
+from Observability.log import get_logger
+from Observability.metrics import IMAGE_STAGE_SECONDS, timed
+from Outbound.scheduler import openai_scheduler
+from .cache import dhash, result_cache
+from .color import COLOR_CONFIDENCE_THRESHOLD, dominant_color
+from .vocabulary import VOCAB_TIMEOUT, VocabularyService, closest_match, normalized_lookup
 
 
 
 load_dotenv()
 
+logger = get_logger(__name__)
+
+PRODUCT_API_BASE = os.getenv("PRODUCT_API_BASE", "http://10.10.7.77:3000")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+# Input tokens billed for one image at the preprocessed size (1024px, high detail)
+VISION_IMAGE_TOKENS = 765
+# Seconds to wait for a vision reply before giving up on the request
+VISION_TIMEOUT = float(os.getenv("VISION_TIMEOUT", "60"))
+
+
+# Function to guess the MIME type of an image file from its extension
+def image_mime_type(image_path):
+    mime, _ = mimetypes.guess_type(image_path)
+    return mime if mime and mime.startswith("image/") else "image/jpeg"
 
 # Function to encode image to base64
 def encode_image(image_path):
@@ -19,184 +37,216 @@ def encode_image(image_path):
         with open(image_path, "rb") as image_file:
             return base64.b64encode(image_file.read()).decode('utf-8')
     except FileNotFoundError:
-        print(f"Error: Image file {image_path} not found")
+        logger.warning("image_not_found", extra={"path": image_path})
         return None
 
 # Function to fetch categories from API
-def fetch_categories():
-    url = "http://10.10.7.77:3000/api/category/ai"
+def fetch_categories(session=requests, timeout=VOCAB_TIMEOUT):
+    url = f"{PRODUCT_API_BASE}/api/category/ai"
     try:
-        response = requests.get(url)
+        response = session.get(url, timeout=timeout)
         response.raise_for_status()
         data = response.json()
         if data["success"]:
             return [item["category_name"] for item in data["data"]]
         return []
     except requests.RequestException as e:
-        print(f"Error fetching categories: {e}")
+        logger.warning("category_fetch_failed", extra={"error": str(e)})
         return []
 
 # Function to fetch colors from API
-def fetch_colors():
-    url = "http://10.10.7.77:3000/api/product/ai-colors"
+def fetch_colors(session=requests, timeout=VOCAB_TIMEOUT):
+    url = f"{PRODUCT_API_BASE}/api/product/ai-colors"
     try:
-        response = requests.get(url)
+        response = session.get(url, timeout=timeout)
         response.raise_for_status()
         data = response.json()
         if data["success"]:
             return data["data"]
         return []
     except requests.RequestException as e:
-        print(f"Error fetching colors: {e}")
+        logger.warning("color_fetch_failed", extra={"error": str(e)})
         return []
 
-# Function to call OpenAI GPT Vision API
-def analyze_image_with_gpt_vision(image_path, categories, colors):
+# Function to post a vision prompt with one or more images and parse the JSON reply
+def call_gpt_vision(prompt, image_urls, max_tokens=300):
     api_key = os.getenv("OPENAI_API_KEY")
     
     if not api_key:
-        print("Error: OPENAI_API_KEY environment variable not set")
-        return {"category": None, "color": None}
-
-    base64_image = encode_image(image_path)
-    if not base64_image:
-        return {"category": None, "color": None}
+        logger.error("openai_api_key_missing")
+        return None
 
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}"
     }
 
-    # Include category and color lists in the prompt
-    prompt = (
-        f"Analyze the image and identify the product category and color. "
-        f"Choose the category from this list: {json.dumps(categories)}. "
-        f"Choose the color from this list: {json.dumps(colors)}. "
-        f"Return the result in JSON format as follows: {{\"category\": \"<category>\", \"color\": \"<color>\"}}. "
-        f"Ensure the response is valid JSON and contains only the category and color fields. "
-        f"If you cannot determine the category or color from the provided lists, use null for that field."
-    )
-
+    content = [{"type": "text", "text": prompt}]
+    content += [{"type": "image_url", "image_url": {"url": url}} for url in image_urls]
     payload = {
         "model": "gpt-4o",
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}
-                    }
-                ]
-            }
-        ],
-        "max_tokens": 300,
+        "messages": [{"role": "user", "content": content}],
+        "max_tokens": max_tokens,
         "response_format": {"type": "json_object"}
     }
 
+    # Waits for rate-limit capacity at the request's priority; raises Overloaded if there is none soon
+    ticket = openai_scheduler.acquire(len(prompt) // 4 + VISION_IMAGE_TOKENS * len(image_urls) + max_tokens)
+    # The estimate stands unless the reply reports usage or the request never reached the API
+    used = None
     try:
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
+        with timed(IMAGE_STAGE_SECONDS, stage="vision"):
+            response = requests.post(f"{OPENAI_BASE_URL}/chat/completions", headers=headers, json=payload,
+                                     timeout=VISION_TIMEOUT)
         response.raise_for_status()
         result = response.json()
+        used = (result.get("usage") or {}).get("total_tokens")
         
         # print("OpenAI API Response:", json.dumps(result, indent=2))
         
         content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
         if not content:
-            print("Error: Empty content in OpenAI response")
-            return {"category": None, "color": None}
+            logger.warning("vision_empty_content")
+            return None
 
         content = re.sub(r'^```json\n|\n```$', '', content).strip()
         
         try:
-            parsed_content = json.loads(content)
-            if not isinstance(parsed_content, dict) or "category" not in parsed_content or "color" not in parsed_content:
-                print("Error: Invalid JSON structure in content:", content)
-                return {"category": None, "color": None}
-            return parsed_content
+            return json.loads(content)
         except json.JSONDecodeError as e:
-            print(f"Error parsing OpenAI response content: {e}")
-            print("Raw content:", content)
-            return {"category": None, "color": None}
+            logger.warning("vision_invalid_json", extra={"error": str(e), "content": content[:500]})
+            return None
 
     except requests.RequestException as e:
-        print(f"Error calling OpenAI API: {e}")
+        if isinstance(e, requests.ConnectionError):
+            used = 0
+        logger.warning("vision_request_failed", extra={"error": str(e)})
+        return None
+    finally:
+        ticket.settle(used)
+
+# Function to call OpenAI GPT Vision API
+def analyze_image_with_gpt_vision(image_path, categories, colors, prepared=None):
+    if prepared is not None:
+        image_url = prepared.data_url
+    else:
+        base64_image = encode_image(image_path)
+        if not base64_image:
+            return {"category": None, "color": None}
+        image_url = f"data:{image_mime_type(image_path)};base64,{base64_image}"
+
+    # Include category and color lists in the prompt
+    if colors is None:
+        # Color was already detected locally; only ask for the category
+        prompt = (
+            f"Analyze the image and identify the product category. "
+            f"Choose the category from this list: {json.dumps(categories)}. "
+            f"Return the result in JSON format as follows: {{\"category\": \"<category>\"}}. "
+            f"Ensure the response is valid JSON and contains only the category field. "
+            f"If you cannot determine the category from the provided list, use null."
+        )
+    else:
+        prompt = (
+            f"Analyze the image and identify the product category and color. "
+            f"Choose the category from this list: {json.dumps(categories)}. "
+            f"Choose the color from this list: {json.dumps(colors)}. "
+            f"Return the result in JSON format as follows: {{\"category\": \"<category>\", \"color\": \"<color>\"}}. "
+            f"Ensure the response is valid JSON and contains only the category and color fields. "
+            f"If you cannot determine the category or color from the provided lists, use null for that field."
+        )
+
+    parsed_content = call_gpt_vision(prompt, [image_url])
+    if parsed_content is None:
+        return {"category": None, "color": None}
+    if colors is None and isinstance(parsed_content, dict):
+        parsed_content.setdefault("color", None)
+    if not isinstance(parsed_content, dict) or "category" not in parsed_content or "color" not in parsed_content:
+        logger.warning("vision_invalid_structure", extra={"content": parsed_content})
         return {"category": None, "color": None}
+    return parsed_content
+
+# Function to analyze several prepared images in one multi-image vision request
+def analyze_images_with_gpt_vision(prepared_images, categories, colors):
+    """Returns one {"category", "color"} dict per image, or None if the reply can't be used."""
+    count = len(prepared_images)
+    prompt = (
+        f"You are given {count} product images, in order. For each image identify the product category and color. "
+        f"Choose the category from this list: {json.dumps(categories)}. "
+        f"Choose the color from this list: {json.dumps(colors)}. "
+        f"Return the result in JSON format as follows: "
+        f"{{\"results\": [{{\"category\": \"<category>\", \"color\": \"<color>\"}}, ...]}} "
+        f"with exactly {count} entries, one per image in the order given. "
+        f"If you cannot determine the category or color of an image from the provided lists, use null for that field."
+    )
+
+    parsed_content = call_gpt_vision(prompt, [p.data_url for p in prepared_images], max_tokens=60 * count + 100)
+    results = parsed_content.get("results") if isinstance(parsed_content, dict) else None
+    if not isinstance(results, list) or len(results) != count or not all(isinstance(r, dict) for r in results):
+        logger.warning("vision_invalid_batch_reply", extra={"content": parsed_content, "images": count})
+        return None
+    return [{"category": r.get("category"), "color": r.get("color")} for r in results]
 
 # Function to find closest color match (fallback)
 def find_closest_color(target_color, color_list):
-    if not target_color or not color_list:
-        return None
-    
-    target_color = target_color.lower().strip()
-    
-    # Direct match
-    for color in color_list:
-        if color.lower() == target_color:
-            return color
-    
-    # Fuzzy matching for colors
-    best_match = None
-    best_score = 0
-    similarity_threshold = 80
-    
-    for color in color_list:
-        score = fuzz.partial_ratio(target_color, color.lower())
-        if score > best_score and score >= similarity_threshold:
-            best_score = score
-            best_match = color
-    
-    return best_match
+    return closest_match(target_color, normalized_lookup(color_list))
 
 # Function to find closest category match (fallback)
 def find_closest_category(target_category, category_list):
-    if not target_category or not category_list:
-        return None
-    
-    target_category = target_category.lower().strip()
-    
-    # Direct match
-    for category in category_list:
-        if category.lower() == target_category:
-            return category
-    
-    # Fuzzy matching for categories
-    best_match = None
-    best_score = 0
-    similarity_threshold = 80
-    
-    for category in category_list:
-        score = fuzz.partial_ratio(target_category, category.lower())
-        if score > best_score and score >= similarity_threshold:
-            best_score = score
-            best_match = category
-    
-    return best_match
+    return closest_match(target_category, normalized_lookup(category_list))
+
+vocabulary = VocabularyService(fetch_categories, fetch_colors)
+
+# Function to check the result cache and detect the color locally before the vision call
+def begin_analysis(image_path, prepared, vocab):
+    """Returns (image_hash, cached_result, local_color); local_color is None unless confident."""
+    with timed(IMAGE_STAGE_SECONDS, stage="cache_lookup"):
+        image_hash = prepared.image_hash if prepared is not None else dhash(image_path)
+        cached = result_cache.get(image_hash, vocab.version)
+    if cached is not None:
+        return image_hash, cached, None
+
+    with timed(IMAGE_STAGE_SECONDS, stage="color"):
+        local = dominant_color(prepared.data if prepared is not None else image_path, vocab.colors)
+    color_is_local = local["color"] is not None and local["confidence"] >= COLOR_CONFIDENCE_THRESHOLD
+    return image_hash, None, local["color"] if color_is_local else None
+
+# Function to map a vision response onto the vocabulary and cache it
+def finish_analysis(image_hash, gpt_response, local_color, vocab):
+    # Find closest matches (fallback in case model doesn't use provided lists)
+    with timed(IMAGE_STAGE_SECONDS, stage="match"):
+        result = {
+            "category": vocab.match_category(gpt_response.get("category")),
+            "color": local_color or vocab.match_color(gpt_response.get("color"))
+        }
+
+    # Failed vision calls come back as all-null; don't pin those in the cache
+    if result["category"] or result["color"]:
+        result_cache.put(image_hash, vocab.version, result)
+    return result
+
+# Function to analyze one image against an already-fetched vocabulary
+def analyze_with_vocabulary(image_path, prepared, vocab):
+    # Reuse the result of an identical or near-identical earlier upload, and detect the
+    # color locally; only ask GPT for it when we're not confident
+    image_hash, cached, local_color = begin_analysis(image_path, prepared, vocab)
+    if cached is not None:
+        return cached
+
+    # Analyze image using OpenAI GPT Vision with category (and color) lists
+    colors = None if local_color else vocab.colors
+    gpt_response = analyze_image_with_gpt_vision(image_path, vocab.categories, colors, prepared)
+    return finish_analysis(image_hash, gpt_response, local_color, vocab)
 
 # Main function to process image and return JSON
-def process_image_search(image_path):
-    # Step 1: Fetch dynamic category and color lists
-    categories = fetch_categories()
-    colors = fetch_colors()
-    
-    # Step 2: Analyze image using OpenAI GPT Vision with category and color lists
-    gpt_response = analyze_image_with_gpt_vision(image_path, categories, colors)
-    
-    # Step 3: Find closest matches (fallback in case model doesn't use provided lists)
-    matched_category = find_closest_category(gpt_response.get("category"), categories)
-    matched_color = find_closest_color(gpt_response.get("color"), colors)
-    
-    # Step 4: Return JSON response
-    result = {
-        "category": matched_category,
-        "color": matched_color
-    }
-    
+def process_image_search(image_path, prepared=None):
+    # Get the category and color lists (cached, refreshed in the background)
+    with timed(IMAGE_STAGE_SECONDS, stage="vocabulary"):
+        vocab = vocabulary.get()
+    result = analyze_with_vocabulary(image_path, prepared, vocab)
     return json.dumps(result, indent=2)
 
 # Example usage
-def image_analysis(image_path):
-    result = process_image_search(image_path)
-    print(result)
+def image_analysis(image_path, prepared=None):
+    result = process_image_search(image_path, prepared)
+    logger.debug("image_analysis", extra={"path": image_path, "result": result})
     return result
\ No newline at end of file
@@ -0,0 +1,96 @@
+import asyncio
+import base64
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import NamedTuple
+
+from PIL import Image, ImageOps
+
+from .cache import dhash
+
+
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1024"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+class PreparedImage(NamedTuple):
+    """Downscaled, re-encoded image ready for the vision API."""
+    data: bytes
+    mime: str
+    width: int
+    height: int
+    original_bytes: int
+    image_hash: int
+
+    @property
+    def base64(self):
+        return base64.b64encode(self.data).decode('utf-8')
+
+    @property
+    def data_url(self):
+        return f"data:{self.mime};base64,{self.base64}"
+
+
+# Function to decode, downscale and re-encode an image (runs in a worker process)
+def prepare_image(image_path, max_edge=IMAGE_MAX_EDGE, image_format=IMAGE_FORMAT, quality=IMAGE_QUALITY):
+    with Image.open(image_path) as img:
+        source_format = img.format
+        upright = img.getexif().get(0x0112, 1) == 1
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            # Flatten transparency onto white; JPEG has no alpha channel
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        original_size = img.size
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+        resized = img.size != original_size
+        buffer = BytesIO()
+        img.save(buffer, format=image_format, quality=quality, optimize=True)
+        data, mime = buffer.getvalue(), MIME_TYPES.get(image_format, f"image/{image_format.lower()}")
+
+        # Small, already-compressed uploads can come out larger; keep the original bytes then
+        original_bytes = os.path.getsize(image_path)
+        if not resized and upright and source_format in MIME_TYPES and original_bytes <= len(data):
+            with open(image_path, "rb") as f:
+                data, mime = f.read(), MIME_TYPES[source_format]
+
+        return PreparedImage(
+            data=data,
+            mime=mime,
+            width=img.width,
+            height=img.height,
+            original_bytes=original_bytes,
+            image_hash=dhash(img),
+        )
+
+
+_pool = None
+
+
+def process_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# Function to run prepare_image in the process pool from async code
+async def prepare_image_async(image_path):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(process_pool(), prepare_image, image_path)
@@ -0,0 +1,416 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager, suppress
+from typing import NamedTuple
+from uuid import uuid4
+
+import anyio
+
+from Observability.log import get_logger
+
+try:
+    import fcntl
+except ImportError:   # no flock (Windows): only safe with a single worker per upload directory
+    fcntl = None
+
+logger = get_logger(__name__)
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(1024 ** 3)))
+UPLOAD_MAX_FILES = int(os.getenv("UPLOAD_MAX_FILES", "10000"))
+# Remove each upload as soon as no analysis is using it, instead of keeping it for reuse
+UPLOAD_DELETE_AFTER_ANALYSIS = os.getenv("UPLOAD_DELETE_AFTER_ANALYSIS", "0") == "1"
+# Uploads up to this size are hashed in memory, so a duplicate never touches the disk
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(8 * 1024 * 1024)))
+# How often a worker re-reads the directory to see the files other workers stored or removed
+UPLOAD_RESCAN_SECONDS = float(os.getenv("UPLOAD_RESCAN_SECONDS", "60"))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+TEMP_DIR = ".incoming"
+REFS_DIR = ".refs"
+LOCK_FILE = ".lock"
+
+
+class StoredUpload(NamedTuple):
+    digest: str
+    path: str
+    size: int
+    duplicate: bool
+
+
+class _Entry:
+    __slots__ = ("path", "size", "refs", "discarded")
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.refs = 0
+        self.discarded = False
+
+
+def _alive(pid) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _owner(name, temp=False):
+    """Pid in a ``<sha256>.<pid>`` marker or a ``<pid>.<uuid>`` temp file name, or None."""
+    part = name.split(".", 1)[0] if temp else name.rsplit(".", 1)[-1]
+    return int(part) if part.isdigit() else None
+
+
+class UploadStore:
+    """Content-addressed upload storage: one file per distinct SHA-256, LRU-bounded.
+
+    Uploads are hashed while they stream in and stored at ``<root>/ab/<sha256><ext>``.
+    The fan-out keeps directories small and caps them at 256. A byte-identical upload reuses the stored
+    file; if it fit in the spool it is never written at all. Files in use by an analysis
+    are reference-counted. Unused ones are evicted least-recently-used once the store
+    exceeds ``max_bytes`` or ``max_files``. With ``delete_after_analysis`` they are
+    removed as soon as their last user releases them. start() (run by the server warm-up,
+    or by the first put()) builds the index from disk, so the bounds hold across restarts.
+
+    Several worker processes can share one directory. Each keeps its own index and
+    reference counts, and coordinates through the filesystem under an flock on
+    ``<root>/.lock``: a worker holding a file leaves a ``.refs/<sha256>.<pid>`` marker, and
+    no worker deletes a file while a live process has a marker for it. A digest missing
+    from the index is looked up on disk before anything is written, so dedup spans
+    workers, and every ``rescan_interval`` seconds the index is re-read from disk so
+    the bounds count every worker's files. Uuid-named files from before the store
+    (directly in ``<root>``) are moved into it by start().
+    """
+
+    def __init__(self, root=UPLOAD_DIR, max_bytes=UPLOAD_MAX_BYTES, max_files=UPLOAD_MAX_FILES,
+                 delete_after_analysis=UPLOAD_DELETE_AFTER_ANALYSIS, spool_bytes=UPLOAD_SPOOL_BYTES,
+                 rescan_interval=UPLOAD_RESCAN_SECONDS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.delete_after_analysis = delete_after_analysis
+        self.spool_bytes = spool_bytes
+        self.rescan_interval = rescan_interval
+        self._entries = OrderedDict()   # digest -> _Entry, least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._next_scan = 0.0
+        self._started = False
+        self.hits = self.misses = self.evictions = self.bytes_written = 0
+        os.makedirs(os.path.join(root, TEMP_DIR), exist_ok=True)
+        os.makedirs(os.path.join(root, REFS_DIR), exist_ok=True)
+        self._lock_fd = os.open(os.path.join(root, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644) if fcntl else None
+
+    async def start(self):
+        """Migrate legacy uploads and index the directory, in a worker thread; once per store."""
+        if not self._started:
+            await anyio.to_thread.run_sync(self._start)
+
+    def _start(self):
+        self._migrate_legacy()
+        self._scan()
+        self._started = True
+
+    @contextmanager
+    def _disk_lock(self):
+        """Exclusive across worker processes; taken while holding self._lock."""
+        if self._lock_fd is None:
+            yield
+            return
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _walk(self):
+        """(mtime, digest, path, size) for every stored file; clears leftovers of dead workers."""
+        found = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            name = os.path.basename(dirpath)
+            if name in (TEMP_DIR, REFS_DIR):
+                # Partial uploads and references of workers that are gone
+                for filename in filenames:
+                    pid = _owner(filename, temp=name == TEMP_DIR)
+                    if pid is None or not _alive(pid):
+                        with suppress(FileNotFoundError):
+                            os.remove(os.path.join(dirpath, filename))
+                continue
+            if dirpath == self.root:
+                continue
+            for filename in filenames:
+                digest = os.path.splitext(filename)[0]
+                if len(digest) == 64:
+                    path = os.path.join(dirpath, filename)
+                    with suppress(FileNotFoundError):
+                        stat = os.stat(path)
+                        found.append((stat.st_mtime, digest, path, stat.st_size))
+        return sorted(found)
+
+    def _scan(self):
+        """Rebuild the index from disk, keeping this worker's references, then enforce the bounds."""
+        found = self._walk()
+        with self._lock, self._disk_lock():
+            entries = OrderedDict()
+            for _, digest, path, size in found:
+                entry = self._entries.get(digest) or _Entry(path, size)
+                entry.path, entry.size = path, size
+                entries[digest] = entry
+            for digest, entry in self._entries.items():
+                if entry.refs and digest not in entries:
+                    entries[digest] = entry
+            self._entries = entries
+            self._bytes = sum(entry.size for entry in entries.values())
+            self._next_scan = time.monotonic() + self.rescan_interval
+            self._evict()
+
+    def _migrate_legacy(self):
+        """Move uuid-named uploads written straight into the root into the content-addressed layout."""
+        for name in os.listdir(self.root):
+            source = os.path.join(self.root, name)
+            if name.startswith(".") or not os.path.isfile(source):
+                continue
+            digest = hashlib.sha256()
+            try:
+                with open(source, "rb") as f:
+                    while chunk := f.read(UPLOAD_CHUNK_SIZE):
+                        digest.update(chunk)
+            except FileNotFoundError:
+                continue   # another worker migrated it first
+            digest = digest.hexdigest()
+            path = self._path(digest, os.path.splitext(name)[1].lower())
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with self._disk_lock():
+                if not os.path.exists(source):
+                    continue
+                if self._find(digest) is None:
+                    os.replace(source, path)
+                else:
+                    os.remove(source)
+            logger.info("upload_migrated", extra={"file": name, "digest": digest})
+
+    def _path(self, digest, extension):
+        return os.path.join(self.root, digest[:2], digest + extension)
+
+    def _find(self, digest):
+        """Path of the stored file for ``digest`` under any extension, or None."""
+        try:
+            names = os.listdir(os.path.join(self.root, digest[:2]))
+        except FileNotFoundError:
+            return None
+        for name in names:
+            if name.startswith(digest):
+                return os.path.join(self.root, digest[:2], name)
+        return None
+
+    # ---------------------------
+    # References shared with the other workers (callers hold both locks)
+    # ---------------------------
+    def _marker(self, digest):
+        return os.path.join(self.root, REFS_DIR, f"{digest}.{os.getpid()}")
+
+    def _hold(self, entry, digest):
+        entry.refs += 1
+        if entry.refs == 1:
+            open(self._marker(digest), "a").close()
+
+    def _held_elsewhere(self, digest) -> bool:
+        for name in os.listdir(os.path.join(self.root, REFS_DIR)):
+            if name.startswith(digest + "."):
+                pid = _owner(name)
+                if pid != os.getpid() and pid is not None and _alive(pid):
+                    return True
+        return False
+
+    # ---------------------------
+    # Storing
+    # ---------------------------
+    async def put(self, upload, extension, chunk_size=UPLOAD_CHUNK_SIZE) -> StoredUpload:
+        """Stream ``upload`` in, hashing as it goes; store it unless the content is already here."""
+        if not self._started:
+            await self.start()
+        elif time.monotonic() >= self._next_scan:
+            await anyio.to_thread.run_sync(self._scan)
+        digest = hashlib.sha256()
+        spool, size, temp_path, out = [], 0, None, None
+        try:
+            while chunk := await upload.read(chunk_size):
+                digest.update(chunk)
+                size += len(chunk)
+                if out is None and size > self.spool_bytes:
+                    temp_path = self._temp_path()
+                    out = await anyio.open_file(temp_path, "wb")
+                    for buffered in spool:
+                        await out.write(buffered)
+                    spool = []
+                if out is not None:
+                    await out.write(chunk)
+                else:
+                    spool.append(chunk)
+            if out is not None:
+                await out.aclose()
+                out = None
+
+            # From here on every step takes the locks or touches the disk: off the event loop
+            stored = await anyio.to_thread.run_sync(self._store, digest.hexdigest(), extension, spool, temp_path, size)
+            temp_path = None   # _store() moved or removed it
+            return stored
+        finally:
+            if out is not None:
+                await out.aclose()
+            if temp_path is not None:
+                # Failed mid-stream; a single unlink is not worth a thread hop on this path
+                with suppress(FileNotFoundError):
+                    os.remove(temp_path)
+
+    def _store(self, digest, extension, spool, temp_path, size) -> StoredUpload:
+        """Worker thread: the stored upload for a hashed one, writing it (or its spool) if new."""
+        try:
+            stored = self._lookup(digest)
+            if stored is not None:
+                return stored
+            path = self._path(digest, extension)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if temp_path is None:
+                temp_path = self._temp_path()
+                with open(temp_path, "wb") as f:
+                    f.write(b"".join(spool))
+            stored = self._add(digest, temp_path, path, size)
+            temp_path = None
+            return stored
+        finally:
+            if temp_path is not None:
+                with suppress(FileNotFoundError):
+                    os.remove(temp_path)
+
+    def _temp_path(self):
+        # Named after the writer, so a restarting worker only clears the partial uploads of dead ones
+        return os.path.join(self.root, TEMP_DIR, f"{os.getpid()}.{uuid4().hex}")
+
+    def _lookup(self, digest):
+        with self._lock, self._disk_lock():
+            entry = self._entries.get(digest)
+            path = entry.path if entry is not None and os.path.exists(entry.path) else self._find(digest)
+            if path is None:
+                return None
+            if entry is None:
+                # Stored by another worker
+                entry = self._entries[digest] = _Entry(path, os.path.getsize(path))
+                self._bytes += entry.size
+            entry.path = path
+            self._entries.move_to_end(digest)
+            self._hold(entry, digest)
+            entry.discarded = False
+            self.hits += 1
+        os.utime(entry.path)   # keeps the LRU order across restarts and workers
+        return StoredUpload(digest, entry.path, entry.size, True)
+
+    def _add(self, digest, temp_path, path, size):
+        """Move a fully written upload into place, unless the same content got there first."""
+        with self._lock, self._disk_lock():
+            self.bytes_written += size
+            existing = self._find(digest)
+            if existing is not None:
+                # The same content finished uploading concurrently (here or in another
+                # worker), possibly under another extension; share the stored file
+                os.remove(temp_path)
+                entry = self._entries.get(digest)
+                if entry is None:
+                    entry = self._entries[digest] = _Entry(existing, size)
+                    self._bytes += size
+                entry.path = existing
+                self._entries.move_to_end(digest)
+                self._hold(entry, digest)
+                self.hits += 1
+                return StoredUpload(digest, entry.path, entry.size, True)
+            # Atomic: readers never see a half-written file under its content address
+            os.replace(temp_path, path)
+            entry = self._entries.get(digest)
+            if entry is None:
+                entry = self._entries[digest] = _Entry(path, size)
+                self._bytes += size
+            else:
+                # Indexed, but its file was removed (by another worker): adopt the new one
+                entry.path = path
+            self._entries.move_to_end(digest)
+            self._hold(entry, digest)
+            self.misses += 1
+            self._evict()
+        return StoredUpload(digest, path, size, False)
+
+    async def release(self, digest):
+        """Drop one reference; deletes the file now if it was discarded or the policy says so."""
+        await anyio.to_thread.run_sync(self._release, digest)
+
+    def _release(self, digest):
+        with self._lock, self._disk_lock():
+            entry = self._entries.get(digest)
+            if entry is None:
+                return
+            entry.refs = max(0, entry.refs - 1)
+            if entry.refs == 0:
+                with suppress(FileNotFoundError):
+                    os.remove(self._marker(digest))
+            if entry.refs == 0 and (entry.discarded or self.delete_after_analysis):
+                self._remove(digest)
+            else:
+                self._evict()
+
+    async def discard(self, digest):
+        """Mark an upload for deletion once released (e.g. it turned out not to be an image)."""
+        # self._lock can be held across disk work by a thread in put() or release()
+        await anyio.to_thread.run_sync(self._discard, digest)
+
+    def _discard(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                entry.discarded = True
+
+    @asynccontextmanager
+    async def store(self, upload, extension):
+        """put() the upload and hold a reference to it for the duration of the block."""
+        stored = await self.put(upload, extension)
+        try:
+            yield stored
+        finally:
+            await self.release(stored.digest)
+
+    # ---------------------------
+    # Eviction (callers hold both locks)
+    # ---------------------------
+    def _evict(self):
+        excess_bytes = self._bytes - self.max_bytes
+        excess_files = len(self._entries) - self.max_files
+        for digest, entry in list(self._entries.items()):
+            if excess_bytes <= 0 and excess_files <= 0:
+                break
+            if entry.refs == 0 and self._remove(digest):
+                excess_bytes -= entry.size
+                excess_files -= 1
+                self.evictions += 1
+
+    def _remove(self, digest) -> bool:
+        """Delete an unreferenced file; False if another worker is still using it."""
+        if self._held_elsewhere(digest):
+            return False
+        entry = self._entries.pop(digest)
+        self._bytes -= entry.size
+        with suppress(FileNotFoundError):
+            os.remove(entry.path)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "files": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "bytes_written": self.bytes_written,
+            }
+
+
+upload_store = UploadStore()
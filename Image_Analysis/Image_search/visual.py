@@ -0,0 +1,315 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+from uuid import uuid4
+
+import numpy as np
+import requests
+from PIL import Image
+
+from Chatbot.Catalog import catalog
+from Observability.log import get_logger
+from Observability.metrics import IMAGE_STAGE_SECONDS, timed
+
+from .color import _load_pixels, foreground_mask, rgb_to_lab
+from .vocabulary import new_session
+
+
+PRODUCT_IMAGE_BASE = os.getenv("PRODUCT_IMAGE_BASE", os.getenv("PRODUCT_API_BASE", "http://10.10.7.77:3000"))
+# Product fields that may hold the image: a URL, a list of URLs, or a list of {"url": ...}
+PRODUCT_IMAGE_FIELDS = os.getenv("PRODUCT_IMAGE_FIELDS", "image,images,thumbnail,image_url,product_image").split(",")
+# Derived data (rebuildable, not committed) lives in a cache directory beside the upload store
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(os.getenv("UPLOAD_DIR", "uploads"))), "cache"))
+# Where the index is saved after each sync, so a restart only fetches what changed ("" to disable)
+VISUAL_INDEX_PATH = os.getenv("VISUAL_INDEX_PATH", os.path.join(CACHE_DIR, "visual_index.npz"))
+VISUAL_INDEX_WORKERS = int(os.getenv("VISUAL_INDEX_WORKERS", "8"))
+VISUAL_FETCH_TIMEOUT = float(os.getenv("VISUAL_FETCH_TIMEOUT", "10"))
+# Images that failed to download are retried after this long
+VISUAL_RETRY_SECONDS = float(os.getenv("VISUAL_RETRY_SECONDS", "600"))
+VISUAL_SEARCH_K = 10
+
+HIST_BINS = (4, 6, 6)   # L, a, b
+LAYOUT_SIZE = 8
+# Share of the similarity from the color layout, the color histogram and the outline's aspect
+# ratio (tuned on benchmarks/bench_visual_search.py)
+FEATURE_WEIGHTS = (0.6, 0.1, 0.3)
+FEATURE_DIM = LAYOUT_SIZE * LAYOUT_SIZE * 3 + int(np.prod(HIST_BINS)) + 2
+# Bump when image_features() changes, so saved vectors are not mixed with new ones
+FEATURE_VERSION = 1
+
+logger = get_logger(__name__)
+
+
+# ---------------------------
+# Features
+# ---------------------------
+def color_histogram(lab, mask):
+    """Square root of the normalized Lab histogram of the masked pixels (unit L2 norm)."""
+    points = lab[mask]
+    scaled = np.clip((points - [0, -80, -80]) / [100, 160, 160], 0, 0.999) * HIST_BINS
+    bins = np.ravel_multi_index(scaled.astype(int).T, HIST_BINS)
+    hist = np.bincount(bins, minlength=int(np.prod(HIST_BINS))).astype(np.float64)
+    return np.sqrt(hist / hist.sum())
+
+
+def color_layout(lab):
+    """LAYOUT_SIZE x LAYOUT_SIZE Lab thumbnail (unit L2 norm): a real-valued perceptual hash."""
+    channels = [
+        np.asarray(Image.fromarray(lab[..., c].astype(np.float32), mode="F").resize((LAYOUT_SIZE, LAYOUT_SIZE), Image.Resampling.BOX))
+        for c in range(3)
+    ]
+    layout = np.stack(channels, axis=-1).ravel()
+    return layout / (np.linalg.norm(layout) or 1.0)
+
+
+# Function to turn an image into its search vector
+def image_features(image, weights=FEATURE_WEIGHTS):
+    """Unit-length float32 vector for a path, raw bytes or PIL image.
+
+    Three unit-length parts, cropped to the product's bounding box so that framing does
+    not matter: the color layout, the foreground color histogram (square-rooted, so
+    the dot product is the Bhattacharyya coefficient) and the aspect ratio as an angle.
+    The dot product of two vectors is the weighted sum of the three similarities, so
+    nearest-neighbour search is one matrix-vector product.
+    """
+    lab = rgb_to_lab(_load_pixels(image))
+    mask = foreground_mask(lab)
+    rows, cols = np.flatnonzero(mask.any(1)), np.flatnonzero(mask.any(0))
+    box = lab[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+    angle = np.clip(np.log(box.shape[0] / box.shape[1]), -1.5, 1.5)
+    parts = (color_layout(box), color_histogram(lab, mask), np.array([np.cos(angle), np.sin(angle)]))
+    return np.concatenate([np.sqrt(w) * part for w, part in zip(weights, parts)]).astype(np.float32)
+
+
+def product_image_url(product):
+    """Absolute URL of a product's first image, or None."""
+    for field in PRODUCT_IMAGE_FIELDS:
+        value = product.get(field.strip())
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if isinstance(value, dict):
+            value = value.get("url")
+        if isinstance(value, str) and value:
+            return urljoin(PRODUCT_IMAGE_BASE.rstrip("/") + "/", value)
+    return None
+
+
+# ---------------------------
+# Index
+# ---------------------------
+class VisualIndex:
+    """Product feature vectors in one float32 matrix; search is a dot product and a partial sort.
+
+    Rows are added in place (the matrix doubles when full) and removed by moving the last
+    row into the gap, so incremental updates never rebuild the matrix.
+    """
+
+    def __init__(self, dim=FEATURE_DIM, capacity=1024):
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._ids = []
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, product_id):
+        return product_id in self._rows
+
+    def add(self, product_id, vector):
+        with self._lock:
+            row = self._rows.get(product_id)
+            if row is None:
+                row = len(self._ids)
+                if row == len(self._vectors):
+                    self._vectors = np.concatenate([self._vectors, np.zeros_like(self._vectors)])
+                self._ids.append(product_id)
+                self._rows[product_id] = row
+            self._vectors[row] = vector
+
+    def remove(self, product_id):
+        with self._lock:
+            row = self._rows.pop(product_id, None)
+            if row is None:
+                return
+            last = len(self._ids) - 1
+            if row != last:
+                moved = self._ids[last]
+                self._vectors[row] = self._vectors[last]
+                self._ids[row] = moved
+                self._rows[moved] = row
+            self._ids.pop()
+
+    def search(self, vector, k=VISUAL_SEARCH_K):
+        """[(product_id, score)] of the k most similar products, best first."""
+        with self._lock:
+            n = len(self._ids)
+            if n == 0 or k <= 0:
+                return []
+            scores = self._vectors[:n] @ vector
+            k = min(k, n)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[i], float(scores[i])) for i in top]
+
+    def export(self):
+        with self._lock:
+            return list(self._ids), self._vectors[:len(self._ids)].copy()
+
+
+class VisualSearch:
+    """Visual product search over the catalog's images, kept in sync incrementally.
+
+    The first search, and every catalog change, starts one background sync. It removes
+    products that are gone or whose image URL changed, and downloads and featurizes only
+    the new ones. Searches never wait for it; they use whatever is indexed so far. After
+    each sync the index is saved to ``path``, so a restarted worker picks it up and only
+    fetches the difference. Downloads that fail are retried after VISUAL_RETRY_SECONDS.
+    """
+
+    def __init__(self, catalog, fetch=None, path=VISUAL_INDEX_PATH, workers=VISUAL_INDEX_WORKERS,
+                 timeout=VISUAL_FETCH_TIMEOUT, retry_after=VISUAL_RETRY_SECONDS):
+        self.catalog = catalog
+        self.fetch = fetch or self._fetch
+        self.path = path
+        self.workers = workers
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.index = VisualIndex()
+        self.session = None
+        self._sources = {}   # product id -> image URL its vector was computed from
+        self._version = None
+        self._failed = 0
+        self._retry_at = 0.0
+        self._restored = False
+        self._lock = threading.Lock()
+        self._syncing = threading.Event()
+        catalog.on_change(lambda old, new: self.sync_in_background())
+
+    # ---------------------------
+    # Search
+    # ---------------------------
+    def search(self, image, k=VISUAL_SEARCH_K):
+        """[{"id", "score"}] of the products that look most like ``image`` (path, bytes or PIL image)."""
+        self._ensure_synced()
+        with timed(IMAGE_STAGE_SECONDS, stage="visual_features"):
+            vector = image_features(image)
+        with timed(IMAGE_STAGE_SECONDS, stage="visual_search"):
+            hits = self.index.search(vector, k)
+        return [{"id": product_id, "score": round(score, 4)} for product_id, score in hits]
+
+    def _needs_sync(self, snapshot):
+        return (snapshot is None or snapshot.version != self._version
+                or (self._failed and time.monotonic() >= self._retry_at))
+
+    def _ensure_synced(self):
+        if self._needs_sync(self.catalog.peek()):
+            self.sync_in_background()
+
+    # ---------------------------
+    # Sync
+    # ---------------------------
+    def sync_in_background(self):
+        """Start a sync thread unless one is already running."""
+        if self._syncing.is_set():
+            return
+        self._syncing.set()
+
+        def run():
+            try:
+                while self._needs_sync(snapshot := self.catalog.get()):
+                    self.sync(snapshot)
+            except Exception as e:
+                logger.warning("visual_index_sync_failed", extra={"error": str(e)})
+            finally:
+                self._syncing.clear()
+
+        threading.Thread(target=run, name="visual-index-sync", daemon=True).start()
+
+    def sync(self, snapshot) -> dict:
+        """Bring the index in line with ``snapshot``; only new or changed images are fetched."""
+        start = time.perf_counter()
+        wanted = {}
+        for product_id, product in snapshot.products.items():
+            url = product_image_url(product)
+            if url:
+                wanted[product_id] = url
+
+        with self._lock:
+            if not self._restored:
+                self._restore()
+            stale = [pid for pid, url in self._sources.items() if wanted.get(pid) != url]
+            for product_id in stale:
+                self.index.remove(product_id)
+                del self._sources[product_id]
+            todo = [(pid, url) for pid, url in wanted.items() if pid not in self._sources]
+            added = 0
+            if todo:
+                with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="visual-index") as executor:
+                    for (product_id, url), vector in zip(todo, executor.map(self._featurize, todo)):
+                        if vector is not None:
+                            self.index.add(product_id, vector)
+                            self._sources[product_id] = url
+                            added += 1
+            self._version = snapshot.version
+            self._failed = len(todo) - added
+            self._retry_at = time.monotonic() + self.retry_after
+            if self.path and (stale or added):
+                self._save()
+
+        stats = {"added": added, "removed": len(stale), "failed": self._failed, "size": len(self.index)}
+        logger.info("visual_index_sync", extra={**stats, "seconds": round(time.perf_counter() - start, 3)})
+        return stats
+
+    def _fetch(self, url):
+        if self.session is None:
+            self.session = new_session(self.workers)
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+    def _featurize(self, item):
+        product_id, url = item
+        try:
+            return image_features(self.fetch(url))
+        except (requests.RequestException, OSError, ValueError) as e:
+            logger.debug("visual_index_fetch_failed", extra={"product_id": product_id, "url": url, "error": str(e)})
+            return None
+
+    # ---------------------------
+    # Persistence
+    # ---------------------------
+    def _save(self):
+        ids, vectors = self.index.export()
+        temp_path = f"{self.path}.{uuid4().hex}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(temp_path, "wb") as f:
+                np.savez(f, ids=np.array(ids, dtype=str), urls=np.array([self._sources[i] for i in ids], dtype=str),
+                         vectors=vectors, feature_version=FEATURE_VERSION)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning("visual_index_save_failed", extra={"path": self.path, "error": str(e)})
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _restore(self):
+        self._restored = True
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as saved:
+                if int(saved["feature_version"]) != FEATURE_VERSION or saved["vectors"].shape[1:] != (FEATURE_DIM,):
+                    return
+                for product_id, url, vector in zip(saved["ids"].tolist(), saved["urls"].tolist(), saved["vectors"]):
+                    self.index.add(product_id, vector)
+                    self._sources[product_id] = url
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("visual_index_restore_failed", extra={"path": self.path, "error": str(e)})
+            return
+        logger.info("visual_index_restored", extra={"size": len(self.index)})
+
+
+visual_search = VisualSearch(catalog)
@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from fuzzywuzzy import fuzz
+from requests.adapters import HTTPAdapter
+
+from Observability.log import get_logger
+from Outbound.singleflight import SingleFlight
+
+from .cache import vocabulary_version
+
+
+VOCAB_TTL_SECONDS = float(os.getenv("VOCAB_TTL_SECONDS", "300"))
+VOCAB_RETRY_SECONDS = float(os.getenv("VOCAB_RETRY_SECONDS", "10"))
+VOCAB_TIMEOUT = float(os.getenv("VOCAB_TIMEOUT", "10"))
+SIMILARITY_THRESHOLD = 80
+MATCH_MEMO_SIZE = 4096
+
+logger = get_logger(__name__)
+
+
+# Function to build a lowercase -> original lookup for exact matching
+def normalized_lookup(values):
+    lookup = {}
+    for value in values or []:
+        lookup.setdefault(str(value).lower().strip(), value)
+    return lookup
+
+
+# Function to find the closest vocabulary entry (exact, then fuzzy)
+def closest_match(target, lookup, threshold=SIMILARITY_THRESHOLD):
+    if not target or not lookup:
+        return None
+
+    target = str(target).lower().strip()
+    if target in lookup:
+        return lookup[target]
+
+    best_match = None
+    best_score = 0
+    for normalized, value in lookup.items():
+        score = fuzz.partial_ratio(target, normalized)
+        if score > best_score and score >= threshold:
+            best_score = score
+            best_match = value
+    return best_match
+
+
+def new_session(pool_size=4):
+    """Keep-alive session shared by every vocabulary fetch."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class Vocabulary:
+    """Category and color lists with their version id and precomputed lookups."""
+
+    def __init__(self, categories, colors, fetched_at=None, ttl=VOCAB_TTL_SECONDS):
+        self.categories = list(categories or [])
+        self.colors = list(colors or [])
+        self.version = vocabulary_version(self.categories, self.colors)
+        self.fetched_at = fetched_at if fetched_at is not None else time.monotonic()
+        # An incomplete vocabulary (a fetch failed) is retried much sooner than the TTL
+        self.ttl = ttl if self.categories and self.colors else min(ttl, VOCAB_RETRY_SECONDS)
+        self.category_lookup = normalized_lookup(self.categories)
+        self.color_lookup = normalized_lookup(self.colors)
+        # The model answers with the same few names over and over; remember fuzzy results
+        self._matches = {}
+
+    @property
+    def stale(self):
+        return time.monotonic() - self.fetched_at > self.ttl
+
+    def match_category(self, name):
+        return self._match("category", name, self.category_lookup)
+
+    def match_color(self, name):
+        return self._match("color", name, self.color_lookup)
+
+    def _match(self, kind, name, lookup):
+        key = (kind, name)
+        if key not in self._matches:
+            if len(self._matches) >= MATCH_MEMO_SIZE:
+                self._matches.clear()
+            self._matches[key] = closest_match(name, lookup)
+        return self._matches[key]
+
+
+class VocabularyService:
+    """TTL cache of the category/color vocabulary with stale-while-revalidate refreshes.
+
+    Only the first call waits for the network. After that, a stale vocabulary is still
+    returned immediately while one background refresh fetches both lists concurrently
+    over a shared keep-alive session. If one list fails to load, the previous copy of it
+    is kept. Concurrent loads and refreshes are coalesced into one fetch of each list.
+    """
+
+    def __init__(self, fetch_categories, fetch_colors, ttl=VOCAB_TTL_SECONDS, timeout=VOCAB_TIMEOUT):
+        self.fetch_categories = fetch_categories
+        self.fetch_colors = fetch_colors
+        self.ttl = ttl
+        self.timeout = timeout
+        self.session = new_session()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="vocabulary")
+        self._current = None
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._refreshing = threading.Event()
+        self._listeners = []
+
+    def get(self):
+        current = self._current
+        if current is None:
+            return self._flight.do("load", self._load)
+        if current.stale:
+            self.refresh_in_background()
+        return current
+
+    @property
+    def version(self):
+        return self.get().version
+
+    def on_change(self, callback):
+        """Register callback(old, new), called when the vocabulary version changes."""
+        self._listeners.append(callback)
+
+    def refresh(self):
+        """Fetch both lists now (joins a refresh already running)."""
+        return self._flight.do("refresh", self._refresh)
+
+    def _load(self):
+        with self._lock:
+            if self._current is None:
+                self._current = self._fetch(None)
+            return self._current
+
+    def _refresh(self):
+        with self._lock:
+            old = self._current
+            new = self._fetch(old)
+            self._current = new
+        if old is not None and old.version != new.version:
+            for callback in self._listeners:
+                try:
+                    callback(old, new)
+                except Exception as e:
+                    logger.error("vocabulary_listener_failed", extra={"error": str(e)})
+        return new
+
+    def refresh_in_background(self):
+        if self._refreshing.is_set():
+            return
+        self._refreshing.set()
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("vocabulary_refresh_failed", extra={"error": str(e)})
+            finally:
+                self._refreshing.clear()
+
+        threading.Thread(target=run, name="vocabulary-refresh", daemon=True).start()
+
+    def _fetch(self, previous):
+        categories = self._executor.submit(self.fetch_categories, self.session, self.timeout)
+        colors = self._executor.submit(self.fetch_colors, self.session, self.timeout)
+        categories, colors = categories.result(), colors.result()
+        if previous is not None:
+            # The fetchers return [] on errors; never replace a good list with that
+            categories = categories or previous.categories
+            colors = colors or previous.colors
+        return Vocabulary(categories, colors, ttl=self.ttl)
@@ -0,0 +1,77 @@
+# ---------------------------
+# Structured logging with per-request trace ids
+# ---------------------------
+import json
+import logging
+import os
+from contextvars import ContextVar
+from uuid import uuid4
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Third-party libraries (httpx, openai, urllib3) log every request at INFO/DEBUG
+LIBRARY_LOG_LEVEL = os.getenv("LIBRARY_LOG_LEVEL", "WARNING").upper()
+APP_LOGGERS = ("Chatbot", "Image_Analysis", "Server", "Outbound", "Observability", "Shared")
+
+# Set by the server middleware for each request; copied into worker threads and tasks
+current_trace_id = ContextVar("trace_id", default=None)
+
+# LogRecord attributes that are not user-supplied ``extra`` fields
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id"}
+
+
+def new_trace_id() -> str:
+    return uuid4().hex
+
+
+class TraceIdFilter(logging.Filter):
+    def filter(self, record):
+        record.trace_id = current_trace_id.get()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event, trace_id and any ``extra`` fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """Install the structured handler on the root logger (idempotent).
+
+    ``level`` applies to this application's loggers. Per-request events (queries,
+    replies, timings) are logged at DEBUG, so the default INFO level keeps them off the
+    hot path; set LOG_LEVEL=DEBUG to see them.
+    """
+    root = logging.getLogger()
+    for name in APP_LOGGERS:
+        logging.getLogger(name).setLevel(level)
+    if any(getattr(h, "_structured", False) for h in root.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler._structured = True
+    handler.addFilter(TraceIdFilter())
+    if fmt == "json":
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(trace_id)s] %(message)s"))
+    root.addHandler(handler)
+    root.setLevel(LIBRARY_LOG_LEVEL)
+
+
+def get_logger(name):
+    return logging.getLogger(name)
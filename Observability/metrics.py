@@ -0,0 +1,75 @@
+# ---------------------------
+# Prometheus metrics
+# ---------------------------
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "HTTP request latency by route", ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+CHAT_NODE_SECONDS = Histogram(
+    "chat_node_seconds", "Time spent in each chat graph node", ["node"], buckets=LATENCY_BUCKETS,
+)
+CHAT_MODEL_SECONDS = Histogram(
+    "chat_model_seconds", "Latency of one chat model call", ["model"], buckets=LATENCY_BUCKETS,
+)
+CHAT_MODEL_TOKENS = Histogram(
+    "chat_model_tokens", "Tokens per chat model call", ["model", "kind"], buckets=TOKEN_BUCKETS,
+)
+CATALOG_FETCH_SECONDS = Histogram(
+    "catalog_fetch_seconds", "Product catalog fetch latency", ["outcome"], buckets=LATENCY_BUCKETS,
+)
+CATALOG_FETCH_BYTES = Histogram(
+    "catalog_fetch_bytes", "Product catalog response size", ["outcome"], buckets=BYTES_BUCKETS,
+)
+CHECKPOINT_SECONDS = Histogram(
+    "checkpoint_seconds", "Checkpointer read/write latency", ["op"], buckets=LATENCY_BUCKETS,
+)
+CHECKPOINT_MAINTENANCE = Counter(
+    "checkpoint_maintenance", "Threads expired and checkpoints/blobs deleted or compressed by retention", ["kind"],
+)
+CHAT_ROUTE_TURNS = Counter(
+    "chat_route_turns", "Finished chat turns by route: agent, or the fast-path intent that answered them", ["route"],
+)
+CHAT_ROUTE_SAVED_SECONDS = Histogram(
+    "chat_route_saved_seconds", "Latency a fast-path turn saved against the average agent turn so far",
+    buckets=LATENCY_BUCKETS,
+)
+CHAT_REPLIES = Counter(
+    "chat_replies", "Final agent replies by outcome: valid, repaired, or fallback message", ["outcome"],
+)
+CHAT_REPLY_PRODUCTS_DROPPED = Counter(
+    "chat_reply_products_dropped", "Product ids in final replies that were not in the catalog",
+)
+IMAGE_STAGE_SECONDS = Histogram(
+    "image_stage_seconds", "Image analysis pipeline stage latency", ["stage"], buckets=LATENCY_BUCKETS,
+)
+OUTBOUND_WAIT_SECONDS = Histogram(
+    "outbound_wait_seconds", "Time a model call queued for rate-limit capacity", ["priority"],
+    buckets=LATENCY_BUCKETS,
+)
+OUTBOUND_REJECTED = Counter(
+    "outbound_rejected", "Model calls turned away for lack of rate-limit capacity", ["priority"],
+)
+
+
+@contextmanager
+def timed(histogram, **labels):
+    """Observe the wall time of the block on ``histogram`` (errors included)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - start)
+
+
+def render():
+    """(body, content_type) for a /metrics response."""
+    return generate_latest(), CONTENT_TYPE_LATEST
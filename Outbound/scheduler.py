@@ -0,0 +1,282 @@
+# ---------------------------
+# Admission control for outbound model calls
+# ---------------------------
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from Observability.log import get_logger
+from Observability.metrics import OUTBOUND_REJECTED, OUTBOUND_WAIT_SECONDS
+
+# Organization limits for the OpenAI models this service calls (gpt-4o chat and vision)
+OPENAI_RPM = float(os.getenv("OPENAI_RPM", "5000"))
+OPENAI_TPM = float(os.getenv("OPENAI_TPM", "450000"))
+# Longest a call may queue for capacity before it is turned away with a Retry-After
+OUTBOUND_MAX_WAIT_SECONDS = float(os.getenv("OUTBOUND_MAX_WAIT_SECONDS", "10"))
+OUTBOUND_MAX_QUEUE = int(os.getenv("OUTBOUND_MAX_QUEUE", "256"))
+
+# Lower runs first
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+# Priority of the outbound calls made from the current request; set around batch work
+current_priority = ContextVar("outbound_priority", default=INTERACTIVE)
+
+logger = get_logger(__name__)
+
+
+@contextmanager
+def priority(level):
+    token = current_priority.set(level)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class Overloaded(Exception):
+    """Not enough outbound capacity to serve the call soon; retry after ``retry_after`` seconds."""
+
+    def __init__(self, retry_after):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"Model capacity exhausted, retry after {self.retry_after}s")
+
+
+class TokenBucket:
+    """Holds up to ``capacity`` units, refilled continuously at ``rate`` units per second."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount, now):
+        """Seconds until ``amount`` units are available (0 if they are now)."""
+        self.refill(now)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount, now):
+        self.refill(now)
+        self.level -= amount
+
+    def give(self, amount, now):
+        self.refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+
+class Ticket:
+    """One admitted call; settle() with its real token usage once the reply is in."""
+
+    def __init__(self, scheduler, tokens):
+        self.scheduler = scheduler
+        self.tokens = tokens
+
+    def settle(self, used_tokens):
+        """True up the estimate: 0 refunds it all (the call never ran), None keeps it."""
+        if used_tokens is not None:
+            self.scheduler._adjust(self.tokens - used_tokens)
+            self.tokens = used_tokens
+
+
+class _Waiter:
+    __slots__ = ("tokens", "level", "grant", "queued_at", "done")
+
+    def __init__(self, tokens, level, grant, queued_at):
+        self.tokens = tokens
+        self.level = level
+        self.grant = grant
+        self.queued_at = queued_at
+        self.done = False
+
+
+class OutboundScheduler:
+    """Token-bucket rate limits on requests and tokens, with a priority queue in front.
+
+    Every call asks for one request plus its estimated tokens. Calls that fit are admitted
+    at once. The rest queue by priority (interactive chat ahead of batch image work, FIFO
+    within a priority) and are admitted as the buckets refill; settling a ticket with the
+    real usage refunds or debits the difference. A call whose expected wait exceeds
+    ``max_wait``, or that finds the queue full, raises Overloaded, which the server answers
+    with 429 and Retry-After instead of letting latency grow without bound. Threads use
+    acquire(), coroutines aacquire().
+    """
+
+    def __init__(self, name, requests_per_minute, tokens_per_minute,
+                 max_wait=OUTBOUND_MAX_WAIT_SECONDS, max_queue=OUTBOUND_MAX_QUEUE):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute / 60, requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self._queue = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._timer = None
+
+    # ---------------------------
+    # Admission
+    # ---------------------------
+    def check(self, level=None, tokens=0):
+        """Raise Overloaded if a call at this priority would be turned away right now."""
+        level = current_priority.get() if level is None else level
+        with self._lock:
+            wait = self._expected_wait(level, tokens, time.monotonic())
+            full = len(self._queue) >= self.max_queue
+        if wait > self.max_wait or full:
+            self._reject(level, wait)
+
+    def acquire(self, tokens, level=None):
+        """Block the calling thread until the call is admitted; returns its Ticket."""
+        event = threading.Event()
+        waiter = self._enqueue(tokens, level, event.set)
+        if waiter is not None and not event.wait(self.max_wait):
+            self._abandon(waiter)
+        return Ticket(self, waiter.tokens if waiter else min(tokens, self.tokens.capacity))
+
+    async def aacquire(self, tokens, level=None):
+        """Wait on the event loop until the call is admitted; returns its Ticket."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def grant():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._enqueue(tokens, level, grant)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+            except asyncio.TimeoutError:
+                self._abandon(waiter)
+            except asyncio.CancelledError:
+                self._abandon(waiter, cancelled=True)
+                raise
+        return Ticket(self, waiter.tokens if waiter else min(tokens, self.tokens.capacity))
+
+    def _enqueue(self, tokens, level, grant):
+        """None if admitted at once, else the queued waiter; raises Overloaded."""
+        level = current_priority.get() if level is None else level
+        # A call bigger than the whole bucket waits for a full bucket instead of forever
+        tokens = min(tokens, self.tokens.capacity)
+        with self._lock:
+            now = time.monotonic()
+            if not self._queue and self._fits(tokens, now):
+                self._take(tokens, now)
+                OUTBOUND_WAIT_SECONDS.labels(priority=PRIORITY_NAMES[level]).observe(0)
+                return None
+            wait = self._expected_wait(level, tokens, now)
+            if wait <= self.max_wait and len(self._queue) < self.max_queue:
+                waiter = _Waiter(tokens, level, grant, now)
+                heapq.heappush(self._queue, (level, next(self._seq), waiter))
+                self._dispatch(now)
+                return waiter
+        self._reject(level, wait)
+
+    def _abandon(self, waiter, cancelled=False):
+        """Give up on a queued call; raises Overloaded unless it was admitted meanwhile."""
+        with self._lock:
+            now = time.monotonic()
+            if waiter.done:
+                if cancelled:
+                    # Admitted but never sent; hand the capacity back
+                    self._give(waiter.tokens, now)
+                return
+            waiter.done = True
+            wait = self._expected_wait(waiter.level, waiter.tokens, now)
+        if not cancelled:
+            self._reject(waiter.level, wait)
+
+    def _reject(self, level, wait):
+        OUTBOUND_REJECTED.labels(priority=PRIORITY_NAMES[level]).inc()
+        logger.info("outbound_rejected", extra={
+            "scheduler": self.name, "priority": PRIORITY_NAMES[level], "expected_wait": round(wait, 2),
+        })
+        raise Overloaded(wait)
+
+    # ---------------------------
+    # Buckets (callers hold self._lock)
+    # ---------------------------
+    def _fits(self, tokens, now):
+        return self.requests.wait_for(1, now) == 0 and self.tokens.wait_for(tokens, now) == 0
+
+    def _take(self, tokens, now):
+        self.requests.take(1, now)
+        self.tokens.take(tokens, now)
+
+    def _give(self, tokens, now):
+        self.requests.give(1, now)
+        self.tokens.give(tokens, now)
+
+    def _expected_wait(self, level, tokens, now):
+        """Seconds for the buckets to cover this call plus everything queued ahead of it."""
+        ahead = [w for lvl, _, w in self._queue if lvl <= level and not w.done]
+        return max(
+            self.requests.wait_for(len(ahead) + 1, now),
+            self.tokens.wait_for(sum(w.tokens for w in ahead) + tokens, now),
+        )
+
+    def _adjust(self, refund):
+        """Correct the token bucket once a call's real usage is known (negative: debit)."""
+        with self._lock:
+            now = time.monotonic()
+            if refund >= 0:
+                self.tokens.give(refund, now)
+            else:
+                self.tokens.take(-refund, now)
+            self._dispatch(now)
+
+    def _dispatch(self, now):
+        """Admit queued calls in priority order while they fit; otherwise re-arm the timer."""
+        while self._queue:
+            _, _, waiter = self._queue[0]
+            if waiter.done:
+                heapq.heappop(self._queue)
+                continue
+            delay = max(self.requests.wait_for(1, now), self.tokens.wait_for(waiter.tokens, now))
+            if delay > 0:
+                self._arm(delay)
+                return
+            heapq.heappop(self._queue)
+            self._take(waiter.tokens, now)
+            waiter.done = True
+            OUTBOUND_WAIT_SECONDS.labels(priority=PRIORITY_NAMES[waiter.level]).observe(now - waiter.queued_at)
+            waiter.grant()
+
+    def _arm(self, delay):
+        if self._timer is not None:
+            return
+
+        def fire():
+            with self._lock:
+                self._timer = None
+                self._dispatch(time.monotonic())
+
+        self._timer = threading.Timer(delay, fire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            return {
+                "queued": sum(1 for _, _, w in self._queue if not w.done),
+                "requests_available": round(self.requests.level, 1),
+                "tokens_available": round(self.tokens.level),
+            }
+
+
+# Chat and vision calls share one OpenAI organization's limits
+openai_scheduler = OutboundScheduler("openai", OPENAI_RPM, OPENAI_TPM)
@@ -0,0 +1,72 @@
+# ---------------------------
+# Coalescing of identical in-flight calls
+# ---------------------------
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its result.
+
+    The first caller for a key (the leader) runs the call; anyone asking for the same key
+    while it is running waits for the leader's result, or exception, instead of making
+    the call again. Threads use do() and coroutines use ado(). The two kinds of caller keep
+    separate flights: a blocking do() follower on the event-loop thread would otherwise wait
+    for an ado() leader that needs that very loop to finish.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def _join(self, key):
+        """(future, is_leader) for key, a (kind, key) pair."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn, *args, **kwargs):
+        key = ("sync", key)
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def ado(self, key, fn, *args, **kwargs):
+        """Like do(), with ``fn`` returning an awaitable."""
+        key = ("async", key)
+        future, leader = self._join(key)
+        if not leader:
+            # shield: a cancelled follower must not cancel the leader's shared future
+            return await asyncio.shield(asyncio.wrap_future(future))
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def in_flight(self):
+        with self._lock:
+            return [key for _, key in self._calls]
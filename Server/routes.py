@@ -1,10 +1,16 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from contextlib import AsyncExitStack
+import asyncio
 import os
-from uuid import uuid4
 import sys
+from typing import List, Optional
 from pydantic import BaseModel
-from Image_Analysis.Image_search.image import image_analysis
-from Chatbot.Main import main
+from Observability.metrics import IMAGE_STAGE_SECONDS, timed
+from Outbound.scheduler import BATCH, Overloaded, openai_scheduler
+# The chat and image stacks are imported on first use (or by warm-up), not with the routes
+from .startup import ImageStack, get_chatbot, get_image_stack
 import json
 
 router = APIRouter()
@@ -18,8 +24,8 @@ class ChatRequest(BaseModel):
 # Add parent directory to path to import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+ALLOWED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff'}
+VISUAL_SEARCH_MAX_K = 50
 
 
 
@@ -27,41 +33,132 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 
 @router.post("/image-analyze")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...), images: ImageStack = Depends(get_image_stack)):
+        # Turn the request away (429) before the upload if the model is saturated
+        openai_scheduler.check()
+
     # Validate file type
-        allowed_extensions = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff'}
         file_extension = os.path.splitext(file.filename)[1].lower()
         
-        if file_extension not in allowed_extensions:
+        if file_extension not in ALLOWED_EXTENSIONS:
             raise HTTPException(
                 status_code=400, 
-                detail=f"File type {file_extension} not supported. Allowed types: {', '.join(allowed_extensions)}"
+                detail=f"File type {file_extension} not supported. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
             )
         
     
-        # Generate unique filename
-        unique_filename = f"{uuid4()}{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, unique_filename)
-
-        file_content = await file.read()
-        
-        # Save file to disk
-        with open(file_path, "wb") as buffer:
-            buffer.write(file_content)
-        
-        # Process the image and get analysis result
-        result = image_analysis(file_path)
+        # Stream the upload into the content-addressed store (identical files are kept once);
+        # it stays referenced until the analysis is done
+        with timed(IMAGE_STAGE_SECONDS, stage="save_upload"):
+            stored = await images.upload_store.put(file, file_extension)
+        file_path = stored.path
+
+        try:
+            # Downscale and re-encode in the process pool before the vision call
+            try:
+                with timed(IMAGE_STAGE_SECONDS, stage="preprocess"):
+                    prepared = await images.prepare_image_async(file_path)
+            except (OSError, ValueError):
+                await images.upload_store.discard(stored.digest)
+                raise HTTPException(status_code=400, detail="Uploaded file is not a readable image")
+
+            # Process the image and get analysis result (blocking HTTP calls, so off the event loop);
+            # rank visually similar catalog products while the vision call is out
+            result, products = await asyncio.gather(
+                run_in_threadpool(images.image_analysis, file_path, prepared),
+                run_in_threadpool(images.visual_search.search, prepared.data),
+            )
+        finally:
+            await images.upload_store.release(stored.digest)
 
         result_json = json.loads(result)
+        result_json["products"] = products
 
         return {"data": result_json}
 
-@router.post("/chat")
-async def chat_with_bot(chat_request: ChatRequest):
-    # Here you would integrate with your chatbot logic
-
-    response = main(chat_request.thread_id, chat_request.user_input)
 
-    response_json = json.loads(response)
+@router.post("/image-search")
+async def image_search(file: UploadFile = File(...), k: int = 10, images: ImageStack = Depends(get_image_stack)):
+    """Catalog products ranked by visual similarity to the upload; no model call."""
+    file_extension = os.path.splitext(file.filename or "")[1].lower()
+    if file_extension not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File type {file_extension} not supported. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
+
+    async with images.upload_store.store(file, file_extension) as stored:
+        try:
+            products = await run_in_threadpool(images.visual_search.search, stored.path, max(1, min(k, VISUAL_SEARCH_MAX_K)))
+        except (OSError, ValueError):
+            await images.upload_store.discard(stored.digest)
+            raise HTTPException(status_code=400, detail="Uploaded file is not a readable image")
+
+    return {"data": {"products": products, "indexed": len(images.visual_search.index)}}
+
+@router.post("/image-analyze/batch")
+async def upload_files(files: List[UploadFile] = File(...), pack_size: Optional[int] = None,
+                       images: ImageStack = Depends(get_image_stack)):
+    """Analyze several images in one request; results come back per file, in upload order."""
+    if len(files) > images.batch_max_files:
+        raise HTTPException(status_code=400, detail=f"At most {images.batch_max_files} files per batch")
+    openai_scheduler.check(BATCH)
+
+    results = [None] * len(files)
+    async with AsyncExitStack() as stack:
+        saved = []
+        for i, file in enumerate(files):
+            file_extension = os.path.splitext(file.filename or "")[1].lower()
+            if file_extension not in ALLOWED_EXTENSIONS:
+                results[i] = {"error": f"File type {file_extension} not supported"}
+                continue
+            with timed(IMAGE_STAGE_SECONDS, stage="save_upload"):
+                saved.append((i, await stack.enter_async_context(images.upload_store.store(file, file_extension))))
+
+        # One vocabulary fetch, parallel preprocessing, bounded concurrent vision calls
+        analyzed = await images.analyze_batch([stored.path for _, stored in saved], pack_size=pack_size)
+        for (i, stored), result in zip(saved, analyzed):
+            if "error" in result:
+                await images.upload_store.discard(stored.digest)
+            results[i] = result
+
+    return {"data": [
+        {"filename": file.filename, **({"error": r["error"]} if "error" in r else {"data": r})}
+        for file, r in zip(files, results)
+    ]}
 
-    return {"data": response_json}
+@router.post("/chat")
+async def chat_with_bot(chat_request: ChatRequest, chatbot=Depends(get_chatbot)):
+    # Here you would integrate with your chatbot logic
+    openai_scheduler.check()
+
+    response = await chatbot.chat(chat_request.thread_id, chat_request.user_input)
+
+    return {"data": response}
+
+
+@router.post("/chat/stream")
+async def chat_with_bot_stream(chat_request: ChatRequest, chatbot=Depends(get_chatbot)):
+    """Same turn as /chat, streamed as server-sent events: progress, token, final (or error).
+
+    token events carry pieces of the reply's message text, not JSON; final carries the reply.
+    """
+    # Once the stream starts the status is already 200, so admission is decided up front
+    openai_scheduler.check()
+
+    async def events():
+        try:
+            async for event, data in chatbot.stream(chat_request.thread_id, chat_request.user_input):
+                if event == "final":
+                    data = {"data": data}
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except Overloaded as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e), 'retry_after': e.retry_after})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
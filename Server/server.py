@@ -1,9 +1,34 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager, suppress
+import asyncio
+import time
+from dotenv import load_dotenv
+load_dotenv()   # before the imports below read their settings
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from .routes import router
+from .startup import WARMUP_ON_STARTUP, shutdown, warmup
 from fastapi.middleware.cors import CORSMiddleware
+from Observability.log import configure_logging, current_trace_id, new_trace_id
+from Observability.metrics import HTTP_REQUEST_SECONDS, render
+from Outbound.scheduler import Overloaded
 
+configure_logging()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Accept connections right away; the graph, checkpointer pool and image stack load in
+    # the background (or on first use), and /ready turns 200 once they have
+    task = asyncio.create_task(warmup.run()) if WARMUP_ON_STARTUP else None
+    yield
+    if task is not None:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 app.add_middleware(
@@ -21,10 +46,61 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Give every request a trace id (X-Request-ID if the caller sent one) and time it."""
+    trace_id = request.headers.get("X-Request-ID") or new_trace_id()
+    token = current_trace_id.set(trace_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Trace-Id"] = trace_id
+        return response
+    finally:
+        # Route template, not the raw path, to keep label cardinality bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUEST_SECONDS.labels(method=request.method, route=route, status=status).observe(time.perf_counter() - start)
+        current_trace_id.reset(token)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded(request: Request, exc: Overloaded):
+    """Out of model capacity: tell the client when to come back instead of queueing it."""
+    return JSONResponse(status_code=429, content={"detail": str(exc)}, headers={"Retry-After": str(exc.retry_after)})
+
+
 @app.get("/")
 async def read_root():
     return {"Hello": "World"}
 
 
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once warm-up has loaded the chat and image stacks, 503 until then."""
+    status = warmup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@app.post("/warmup")
+async def run_warmup():
+    """Run warm-up now (or join the one in progress); steps that failed before are retried."""
+    status = await warmup.run()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
 
 app.include_router(router=router, prefix="/api/v1")
\ No newline at end of file
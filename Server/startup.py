@@ -0,0 +1,161 @@
+# ---------------------------
+# Lazy stacks, warm-up and readiness
+# ---------------------------
+import asyncio
+import importlib
+import os
+import sys
+import time
+from typing import Any, NamedTuple
+
+import anyio
+
+from Observability.log import get_logger
+
+# Start warm-up in the background when the server starts (requests are served meanwhile)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+
+logger = get_logger(__name__)
+
+_loaded = {}
+
+
+async def load(name):
+    """Import module ``name`` in a worker thread the first time, then return it from a dict.
+
+    The chat stack (LangChain, LangGraph, the OpenAI client) takes seconds to import and
+    the image stack pulls in PIL and NumPy. Importing them in a thread keeps the event loop
+    serving other requests meanwhile. A second caller during the import waits on Python's
+    import lock and gets the finished module.
+    """
+    module = _loaded.get(name)
+    if module is None:
+        module = _loaded[name] = await anyio.to_thread.run_sync(importlib.import_module, name)
+    return module
+
+
+async def get_chatbot():
+    return (await load("Chatbot.Main")).chatbot
+
+
+class ImageStack(NamedTuple):
+    image_analysis: Any
+    prepare_image_async: Any
+    analyze_batch: Any
+    batch_max_files: int
+    upload_store: Any
+    visual_search: Any
+
+
+_image_stack = None
+
+
+async def get_image_stack() -> ImageStack:
+    global _image_stack
+    if _image_stack is None:
+        batch = await load("Image_Analysis.Image_search.batch")
+        upload_store = (await load("Image_Analysis.Image_search.uploads")).upload_store
+        # Legacy migration and the first directory scan, kept out of the module import
+        await upload_store.start()
+        _image_stack = ImageStack(
+            image_analysis=(await load("Image_Analysis.Image_search.image")).image_analysis,
+            prepare_image_async=(await load("Image_Analysis.Image_search.preprocess")).prepare_image_async,
+            analyze_batch=batch.analyze_batch,
+            batch_max_files=batch.BATCH_MAX_FILES,
+            upload_store=upload_store,
+            visual_search=(await load("Image_Analysis.Image_search.visual")).visual_search,
+        )
+    return _image_stack
+
+
+# ---------------------------
+# Warm-up steps
+# ---------------------------
+async def warm_chat():
+    """Model client, graph and checkpointer (the Postgres pool is opened here)."""
+    chatbot = await get_chatbot()
+    await anyio.to_thread.run_sync((await load("Chatbot.config")).get_model)
+    await chatbot.start()
+
+
+async def warm_image():
+    """Image modules and the preprocessing worker processes."""
+    await get_image_stack()
+    preprocess = await load("Image_Analysis.Image_search.preprocess")
+    loop = asyncio.get_running_loop()
+    pool = preprocess.process_pool()
+    await asyncio.gather(*(loop.run_in_executor(pool, os.getpid) for _ in range(preprocess.IMAGE_WORKERS)))
+
+
+async def warm_catalog():
+    """Product catalog, and the visual index built from it (the index syncs in the background)."""
+    await (await load("Chatbot.Catalog")).catalog.aget()
+    (await get_image_stack()).visual_search.sync_in_background()
+
+
+async def warm_vocabulary():
+    await anyio.to_thread.run_sync((await load("Image_Analysis.Image_search.image")).vocabulary.get)
+
+
+class Warmup:
+    """Runs the warm-up steps once, in order, and reports readiness.
+
+    Steps marked required must succeed for the server to be ready. The others are
+    prefetches of remote data and only log on failure. Concurrent run() calls share one
+    pass. A later run() retries only the steps that have not succeeded. Nothing depends
+    on warm-up having run: every stack also initializes itself on first use.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps   # [(name, required, async fn)]
+        self.seconds = {}
+        self.errors = {}
+        self._lock = asyncio.Lock()
+
+    @property
+    def ready(self):
+        return all(name in self.seconds for name, required, _ in self.steps if required)
+
+    async def run(self) -> dict:
+        async with self._lock:
+            for name, _, step in self.steps:
+                if name in self.seconds:
+                    continue
+                start = time.perf_counter()
+                try:
+                    await step()
+                except Exception as e:
+                    self.errors[name] = str(e)
+                    logger.warning("warmup_step_failed", extra={"step": name, "error": str(e)})
+                    continue
+                self.seconds[name] = round(time.perf_counter() - start, 3)
+                self.errors.pop(name, None)
+            logger.info("warmup", extra=self.status())
+        return self.status()
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "steps": {
+                name: {"required": required, "seconds": self.seconds.get(name), "error": self.errors.get(name)}
+                for name, required, _ in self.steps
+            },
+        }
+
+
+warmup = Warmup([
+    ("chat", True, warm_chat),
+    ("image", True, warm_image),
+    ("catalog", False, warm_catalog),
+    ("vocabulary", False, warm_vocabulary),
+])
+
+
+async def shutdown():
+    """Stop whatever the server actually started."""
+    main = sys.modules.get("Chatbot.Main")
+    if main is not None:
+        await main.chatbot.stop()
+    preprocess = sys.modules.get("Image_Analysis.Image_search.preprocess")
+    if preprocess is not None:
+        preprocess.shutdown_pool()
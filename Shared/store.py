@@ -0,0 +1,263 @@
+# ---------------------------
+# Host-local shared store: versioned column files mapped by every worker
+# ---------------------------
+import json
+import mmap
+import os
+import tempfile
+import threading
+import time
+from collections.abc import Sequence
+from contextlib import suppress
+
+import numpy as np
+
+from Observability.log import get_logger
+
+try:
+    import fcntl
+except ImportError:   # no flock (Windows): every worker keeps its own copy
+    fcntl = None
+
+logger = get_logger(__name__)
+
+_default_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+SHARED_STORE_DIR = os.getenv("SHARED_STORE_DIR", os.path.join(_default_dir, "amdka-store"))
+# Off unless set: sharing maps files and starts leader threads in every process that imports
+# the caches, which only pays off with several workers per host
+SHARED_STORE_ENABLED = os.getenv("SHARED_STORE_ENABLED", "0") == "1"
+# Published versions kept on disk; readers still holding an older one keep their mapping
+SHARED_STORE_KEEP = int(os.getenv("SHARED_STORE_KEEP", "3"))
+# How often a reader looks for a newer version (one readlink)
+SHARED_STORE_CHECK_SECONDS = float(os.getenv("SHARED_STORE_CHECK_SECONDS", "0.2"))
+
+MAGIC = b"AMDKCOL1"
+ALIGN = 64
+
+
+def _align(n):
+    return -(-n // ALIGN) * ALIGN
+
+
+# ---------------------------
+# Column files
+# ---------------------------
+def write_columns(path, meta: dict, columns: dict):
+    """Write NumPy arrays as one file: magic, JSON header (meta and layout), aligned raw columns."""
+    arrays = {name: np.ascontiguousarray(array) for name, array in columns.items()}
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = [array.dtype.str, list(array.shape), offset]
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({"meta": meta, "columns": layout}).encode()
+    base = _align(len(MAGIC) + 8 + len(header))
+    with open(path, "wb") as f:
+        f.write(MAGIC + len(header).to_bytes(8, "little") + header)
+        for name, array in arrays.items():
+            f.seek(base + layout[name][2])
+            array.tofile(f)
+        f.truncate(base + offset)
+
+
+class ColumnFile:
+    """A column file mapped read-only; columns are zero-copy NumPy views of the mapping.
+
+    The pages live in the OS page cache, so every process mapping the same file shares
+    one copy. The mapping stays valid after the file is unlinked.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"not a column file: {path}")
+        length = int.from_bytes(self._mm[len(MAGIC):len(MAGIC) + 8], "little")
+        start = len(MAGIC) + 8
+        header = json.loads(self._mm[start:start + length])
+        self.path = path
+        self.meta = header["meta"]
+        self._layout = header["columns"]
+        self._base = _align(start + length)
+        self._columns = {}
+
+    def __getitem__(self, name) -> np.ndarray:
+        column = self._columns.get(name)
+        if column is None:
+            dtype, shape, offset = self._layout[name]
+            count = int(np.prod(shape))
+            if count:
+                column = np.frombuffer(self._mm, dtype=dtype, count=count, offset=self._base + offset).reshape(shape)
+            else:
+                column = np.empty(shape, dtype=dtype)
+            self._columns[name] = column
+        return column
+
+    @property
+    def nbytes(self):
+        return len(self._mm)
+
+
+def pack_strings(values) -> tuple:
+    """(offsets, blob) columns for a list of strings: string i is blob[offsets[i]:offsets[i + 1]]."""
+    encoded = [str(value).encode() for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def sorted_keys(values) -> np.ndarray:
+    """Fixed-width bytes column of ``values`` in sorted order, for np.searchsorted lookups."""
+    encoded = sorted(str(value).encode() for value in values)
+    return np.array(encoded, dtype=f"S{max(1, max(map(len, encoded), default=1))}")
+
+
+def find_key(keys: np.ndarray, key: str):
+    """Position of ``key`` in a sorted_keys() column, or None."""
+    raw = key.encode()
+    if len(raw) > keys.dtype.itemsize:
+        return None
+    i = int(np.searchsorted(keys, raw))
+    return i if i < len(keys) and keys[i] == raw else None
+
+
+class Strings(Sequence):
+    """Read-only sequence of the strings in a pack_strings() column pair, decoded on access."""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode()
+
+
+# ---------------------------
+# Named datasets
+# ---------------------------
+class SharedStore:
+    """One dataset in SHARED_STORE_DIR: immutable versions, a pointer to the current one, a leader lock.
+
+    publish() writes a new version next to the old ones and swaps the ``<name>.current``
+    symlink with a rename, so readers see either the old file or the new one, never a
+    partial write. current() returns the mapped current version and notices a swap within
+    SHARED_STORE_CHECK_SECONDS. lead() elects the process that refreshes the dataset: it
+    takes an exclusive flock on ``<name>.lock`` and keeps it until the process exits, when
+    the kernel releases it and another worker's lead() can succeed.
+    """
+
+    def __init__(self, name, root=SHARED_STORE_DIR, keep=SHARED_STORE_KEEP, check_interval=SHARED_STORE_CHECK_SECONDS):
+        os.makedirs(root, exist_ok=True)
+        self.name = name
+        self.root = root
+        self.keep = keep
+        self.check_interval = check_interval
+        self.pointer = os.path.join(root, f"{name}.current")
+        self._file = None
+        self._target = None
+        self._next_check = 0.0
+        self._lock_fd = None
+        self._lock = threading.Lock()
+
+    def path(self, filename):
+        return os.path.join(self.root, filename)
+
+    # ---------------------------
+    # Readers
+    # ---------------------------
+    def current(self):
+        """The current version as a ColumnFile, or None before the first publish."""
+        now = time.monotonic()
+        if now < self._next_check:
+            return self._file
+        self._next_check = now + self.check_interval
+        for _ in range(3):
+            try:
+                target = os.readlink(self.pointer)
+                if target == self._target:
+                    return self._file
+                with self._lock:
+                    if target != self._target:
+                        self._file, self._target = ColumnFile(self.path(target)), target
+                return self._file
+            except FileNotFoundError:
+                # No pointer yet, or the version was pruned between readlink and open
+                if not os.path.lexists(self.pointer):
+                    return None
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("shared_store_read_failed", extra={"store": self.name, "error": str(e)})
+                return self._file
+        return self._file
+
+    # ---------------------------
+    # Writers
+    # ---------------------------
+    def publish(self, meta: dict, columns: dict) -> ColumnFile:
+        """Write a new version, make it current and return it mapped."""
+        target = f"{self.name}.{time.time_ns()}.col"
+        tmp = self.path(f".{target}.{os.getpid()}.tmp")
+        link = self.path(f".{self.name}.{os.getpid()}.link")
+        try:
+            write_columns(tmp, meta, columns)
+            os.replace(tmp, self.path(target))
+            with suppress(FileNotFoundError):
+                os.unlink(link)
+            os.symlink(target, link)
+            os.replace(link, self.pointer)
+        finally:
+            with suppress(FileNotFoundError):
+                os.unlink(tmp)
+        self._prune()
+        with self._lock:
+            self._file, self._target = ColumnFile(self.path(target)), target
+        self._next_check = time.monotonic() + self.check_interval
+        return self._file
+
+    def _prune(self):
+        versions = sorted(f for f in os.listdir(self.root) if f.startswith(self.name + ".") and f.endswith(".col"))
+        for stale in versions[:-self.keep]:
+            with suppress(FileNotFoundError):
+                os.unlink(self.path(stale))
+
+    # ---------------------------
+    # Leader election
+    # ---------------------------
+    @property
+    def leader(self) -> bool:
+        return self._lock_fd is not None
+
+    def lead(self) -> bool:
+        """True if this process refreshes the dataset; tries to take over if nobody does."""
+        with self._lock:
+            if self._lock_fd is not None:
+                return True
+            fd = os.open(self.path(f"{self.name}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+            self._lock_fd = fd
+        logger.info("shared_store_leader", extra={"store": self.name, "pid": os.getpid()})
+        return True
+
+    def resign(self):
+        with self._lock:
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)   # closing the descriptor drops the flock
+                self._lock_fd = None
+
+
+def shared_store(name):
+    """SharedStore for ``name``, or None when sharing is off or unavailable (each worker keeps its own copy)."""
+    if not SHARED_STORE_ENABLED or fcntl is None:
+        return None
+    try:
+        return SharedStore(name)
+    except OSError as e:
+        logger.warning("shared_store_unavailable", extra={"store": name, "error": str(e)})
+        return None
@@ -0,0 +1,89 @@
+"""Per-request overhead of /chat: compile + connect per request vs the long-lived ChatbotApp.
+
+The model and catalog are zero-latency local stubs, so the difference between the two
+rows is the setup work the old per-request path paid. Uses an in-memory saver unless
+--postgres is given (then POSTGRES_URI is used for both paths). Run from the repo root:
+
+    python -m benchmarks.bench_app_overhead --requests 50 [--postgres]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from uuid import uuid4
+
+from benchmarks.stubs import OpenAIStub, ProductAPIStub
+
+
+async def per_request(graph, use_postgres, thread_file):
+    """The pre-ChatbotApp path: new saver connection and graph compile on every call."""
+    from langchain_core.messages import HumanMessage
+    from langgraph.checkpoint.memory import InMemorySaver
+    from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+
+    thread_id = str(uuid4())
+    config = {"configurable": {"thread_id": thread_id}}
+    if use_postgres:
+        async with AsyncPostgresSaver.from_conn_string(os.getenv("POSTGRES_URI")) as checkpointer:
+            app = graph.compile(checkpointer=checkpointer)
+            with open(thread_file, "w") as f:
+                f.write(thread_id)
+            await app.ainvoke({"messages": [HumanMessage(content="red shirt")]}, config=config)
+    else:
+        app = graph.compile(checkpointer=InMemorySaver())
+        with open(thread_file, "w") as f:
+            f.write(thread_id)
+        await app.ainvoke({"messages": [HumanMessage(content="red shirt")]}, config=config)
+
+
+async def run(args):
+    from langgraph.checkpoint.memory import InMemorySaver
+    from Chatbot.Main import ChatbotApp, graph
+    from Chatbot.ResponseCache import response_cache
+
+    response_cache.max_entries = 0  # same first question every time; compare full graph runs
+    long_lived = ChatbotApp(checkpointer=None if args.postgres else InMemorySaver())
+    await long_lived.start()
+    thread_file = os.path.join(tempfile.mkdtemp(), "thread_id.txt")
+
+    async def sample(fn):
+        await fn()  # warm-up
+        timings = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            await fn()
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    before = await sample(lambda: per_request(graph, args.postgres, thread_file))
+    after = await sample(lambda: long_lived.chat(str(uuid4()), "red shirt"))
+    await long_lived.stop()
+    return before, after
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--postgres", action="store_true", help="use POSTGRES_URI instead of an in-memory saver")
+    args = parser.parse_args()
+
+    with OpenAIStub() as model_api, ProductAPIStub(size=200) as product_api:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = model_api.url
+        os.environ["OPENAI_API_BASE"] = model_api.url
+        os.environ["PRODUCT_API_URL"] = product_api.url
+        before, after = asyncio.run(run(args))
+
+    saver = "postgres" if args.postgres else "in-memory"
+    print(f"\n{args.requests} requests, {saver} checkpointer, zero-latency model stub")
+    for name, timings in (("compile per request", before), ("ChatbotApp (compiled once)", after)):
+        ordered = sorted(timings)
+        p95 = ordered[int(len(ordered) * 0.95) - 1]
+        print(f"{name:<28} p50={statistics.median(timings):7.2f} ms  p95={p95:7.2f} ms")
+    print(f"overhead removed per request: {statistics.median(before) - statistics.median(after):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
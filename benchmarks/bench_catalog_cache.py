@@ -0,0 +1,69 @@
+"""Tool-side catalog latency: direct fetch per call vs the background-refreshed CatalogCache.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_catalog_cache --products 5000 --latency 0.05
+"""
+import argparse
+import statistics
+import time
+
+import requests
+
+from Chatbot.Catalog import CatalogCache
+from benchmarks.stubs import ProductAPIStub
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub API latency in seconds")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with ProductAPIStub(size=args.products, latency=args.latency) as api:
+        def direct():
+            requests.get(api.url, params={"limit": 10000}, timeout=15).json()
+
+        cache = CatalogCache(url=api.url, ttl=0.2)
+        start = time.perf_counter()
+        cache.get()
+        print(f"cold load: {(time.perf_counter() - start) * 1000:.1f} ms, {len(cache.get())} products")
+
+        p50, worst = timed(direct, args.repeat)
+        print(f"direct fetch per call   p50={p50:8.2f} ms  max={worst:8.2f} ms")
+        p50, worst = timed(lambda: cache.get().index.search("red shirt size M"), args.repeat)
+        print(f"cache lookup + search   p50={p50:8.2f} ms  max={worst:8.2f} ms")
+
+        before = api.requests
+        cache.refresh()
+        print(f"unchanged refresh -> 304, version kept: {cache.get().version}")
+
+        victim = next(iter(api.products))
+        api.update(victim, product_name="Limited Edition Red Shirt")
+        api.delete(list(api.products)[-1])
+        old_version = cache.get().version
+        snapshot = cache.refresh()
+        print(
+            f"delta refresh -> {len(snapshot)} products, version {old_version} -> {snapshot.version}, "
+            f"updated name: {snapshot.products[victim]['product_name']!r}"
+        )
+        print(f"API requests during refresh checks: {api.requests - before}")
+
+        time.sleep(0.3)
+        start = time.perf_counter()
+        cache.get()
+        print(f"stale read while background refresh runs: {(time.perf_counter() - start) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
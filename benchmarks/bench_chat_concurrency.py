@@ -0,0 +1,69 @@
+"""Throughput of the async /chat graph with many concurrent chats on one event loop.
+
+Model and catalog are local stubs with fixed latency, and the checkpointer is in memory,
+so the numbers isolate how well the graph overlaps I/O. Run from the repository root:
+
+    python -m benchmarks.bench_chat_concurrency --model-latency 0.3 --chats 32
+"""
+import argparse
+import asyncio
+import os
+import time
+from uuid import uuid4
+
+from benchmarks.stubs import OpenAIStub, ProductAPIStub
+
+
+async def run_level(app, concurrency, chats):
+    from langchain_core.messages import HumanMessage
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_chat(i):
+        async with semaphore:
+            config = {"configurable": {"thread_id": str(uuid4())}}
+            await app.ainvoke({"messages": [HumanMessage(content=f"red shirt in size M #{i}")]}, config=config)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_chat(i) for i in range(chats)))
+    return time.perf_counter() - start
+
+
+async def run_levels(app, levels, chats):
+    await run_level(app, 1, 1)  # warm the catalog cache and HTTP connections
+    return [await run_level(app, level, chats) for level in levels]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model-latency", type=float, default=0.3)
+    parser.add_argument("--catalog-latency", type=float, default=0.05)
+    parser.add_argument("--chats", type=int, default=32)
+    parser.add_argument("--levels", default="1,2,4,8,16,32")
+    args = parser.parse_args()
+
+    with OpenAIStub(latency=args.model_latency) as model_api, ProductAPIStub(size=500, latency=args.catalog_latency) as product_api:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = model_api.url
+        os.environ["OPENAI_API_BASE"] = model_api.url
+        os.environ["PRODUCT_API_URL"] = product_api.url
+
+        from langgraph.checkpoint.memory import InMemorySaver
+        from Chatbot.Main import graph
+
+        app = graph.compile(checkpointer=InMemorySaver())
+        levels = [int(x) for x in args.levels.split(",")]
+        # One event loop for every level: the model clients are bound to the loop they first ran on
+        walls = asyncio.run(run_levels(app, levels, args.chats))
+
+        print(f"model latency {args.model_latency}s x2 per chat, {args.chats} chats per level\n")
+        print(f"{'concurrency':>12}{'wall s':>10}{'chats/s':>10}{'speedup':>10}")
+        base = None
+        for level, wall in zip(levels, walls):
+            throughput = args.chats / wall
+            base = base or throughput
+            print(f"{level:>12}{wall:>10.2f}{throughput:>10.2f}{throughput / base:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
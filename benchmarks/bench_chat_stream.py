@@ -0,0 +1,69 @@
+"""Time-to-first-byte of /chat (buffered) vs /chat/stream (SSE) against a streaming model stub.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_chat_stream --model-latency 0.4 --token-latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from uuid import uuid4
+
+from benchmarks.stubs import OpenAIStub, ProductAPIStub
+
+
+async def run(args):
+    from langgraph.checkpoint.memory import InMemorySaver
+    from Chatbot.Main import ChatbotApp
+    from Chatbot.ResponseCache import response_cache
+
+    response_cache.max_entries = 0  # every turn repeats one first question; time the model path
+    chatbot = ChatbotApp(checkpointer=InMemorySaver())
+    await chatbot.start()
+    await chatbot.chat(str(uuid4()), "warm up")
+
+    buffered, first_event, first_token, stream_total = [], [], [], []
+    for _ in range(args.turns):
+        start = time.perf_counter()
+        await chatbot.chat(str(uuid4()), "red shirt in size M")
+        buffered.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        seen_event = seen_token = None
+        async for event, _ in chatbot.stream(str(uuid4()), "red shirt in size M"):
+            now = time.perf_counter() - start
+            seen_event = seen_event if seen_event is not None else now
+            if event == "token" and seen_token is None:
+                seen_token = now
+        stream_total.append(time.perf_counter() - start)
+        first_event.append(seen_event)
+        first_token.append(seen_token)
+    await chatbot.stop()
+    return buffered, first_event, first_token, stream_total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model-latency", type=float, default=0.4, help="stub time to first token, seconds")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="stub delay between streamed chunks")
+    parser.add_argument("--turns", type=int, default=5)
+    args = parser.parse_args()
+
+    with OpenAIStub(latency=args.model_latency, token_latency=args.token_latency) as model_api, ProductAPIStub(size=200) as product_api:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = model_api.url
+        os.environ["OPENAI_API_BASE"] = model_api.url
+        os.environ["PRODUCT_API_URL"] = product_api.url
+        buffered, first_event, first_token, stream_total = asyncio.run(run(args))
+
+    ms = lambda xs: statistics.median(xs) * 1000
+    print(f"\n/chat         first byte = full response  {ms(buffered):8.1f} ms")
+    print(f"/chat/stream  first progress event        {ms(first_event):8.1f} ms")
+    print(f"/chat/stream  first model token           {ms(first_token):8.1f} ms")
+    print(f"/chat/stream  final payload               {ms(stream_total):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
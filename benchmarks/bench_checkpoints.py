@@ -0,0 +1,128 @@
+"""Thread-load latency and checkpoint storage as threads age, before and after retention.
+
+Plays chat turns on a set of threads (model and catalog stubbed, checkpoints in a real
+Postgres at POSTGRES_URI). After each age step it measures checkpoint rows and stored bytes
+and the latency of loading a thread's latest checkpoint, which is what every turn does
+first. Then it runs CheckpointMaintenance (keep the latest N per thread, compress the
+rest) and measures again. It also checks that trimmed threads still continue their
+conversation, and that idle threads expire. The tables are truncated first, so point it
+at a scratch database:
+
+    POSTGRES_URI=postgresql://... python -m benchmarks.bench_checkpoints --threads 10 --ages 2,10,25
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from benchmarks.stubs import OpenAIStub, ProductAPIStub
+
+QUERIES = ["red shirt in size M", "black watch under $100", "grey pants size L", "blue hoodie", "leather shoes"]
+
+STORAGE_SQL = """
+SELECT
+    (SELECT count(*) FROM checkpoints) AS checkpoints,
+    (SELECT count(*) FROM checkpoint_blobs) AS blobs,
+    (SELECT count(*) FROM checkpoint_writes) AS writes,
+    (SELECT coalesce(sum(pg_column_size(checkpoint) + pg_column_size(metadata)), 0) FROM checkpoints)
+    + (SELECT coalesce(sum(octet_length(blob)), 0) FROM checkpoint_blobs)
+    + (SELECT coalesce(sum(octet_length(blob)), 0) FROM checkpoint_writes) AS bytes
+"""
+
+
+async def storage(pool):
+    async with pool.connection() as conn:
+        return await (await conn.execute(STORAGE_SQL)).fetchone()
+
+
+async def load_latency(checkpointer, threads, rounds=20):
+    samples = []
+    for _ in range(rounds):
+        for thread_id in threads:
+            start = time.perf_counter()
+            await checkpointer.aget_tuple({"configurable": {"thread_id": thread_id}})
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95)]
+
+
+def row(label, stats, latency):
+    return (f"{label:<26}{stats['checkpoints']:>12}{stats['blobs']:>8}{stats['writes']:>8}"
+            f"{stats['bytes'] / 1024:>10.0f}{latency[0]:>11.2f}{latency[1]:>11.2f}")
+
+
+async def run(args, chatbot):
+    from Chatbot.Checkpoints import CheckpointMaintenance
+
+    await chatbot.start()
+    await chatbot.maintenance.stop()   # driven by hand below
+    await chatbot.checkpointer.setup()
+    async with chatbot.pool.connection() as conn:
+        # checkpoint_activity is created by chatbot.start()
+        await conn.execute("TRUNCATE checkpoints, checkpoint_blobs, checkpoint_writes, checkpoint_activity")
+
+    threads = [f"bench-{i}" for i in range(args.threads)]
+    ages = [int(a) for a in args.ages.split(",")]
+    print(f"{'':<26}{'checkpoints':>12}{'blobs':>8}{'writes':>8}{'data KB':>10}{'load p50':>11}{'load p95':>11}")
+    played = 0
+    for age in ages:
+        for turn in range(played, age):
+            await asyncio.gather(*(chatbot.chat(t, f"{QUERIES[(i + turn) % len(QUERIES)]} #{turn}")
+                                   for i, t in enumerate(threads)))
+        played = age
+        print(row(f"{age} turns/thread", await storage(chatbot.pool), await load_latency(chatbot.checkpointer, threads)))
+
+    before = {t: len((await chatbot.app.aget_state({"configurable": {"thread_id": t}})).values["messages"]) for t in threads}
+    maintenance = CheckpointMaintenance(chatbot.pool, keep=args.keep, idle_ttl=0, grace=0, batch_size=args.batch)
+    start, passes, totals = time.perf_counter(), 0, {}
+    while True:
+        stats = await maintenance.run_once()
+        passes += 1
+        for kind, n in stats.items():
+            totals[kind] = totals.get(kind, 0) + n
+        if stats["checked_rows"] < args.batch:
+            break
+    elapsed = time.perf_counter() - start
+    print(row(f"after retention (keep {args.keep})", await storage(chatbot.pool), await load_latency(chatbot.checkpointer, threads)))
+    print(f"\nretention: {passes} pass(es) of <= {args.batch} threads in {elapsed * 1000:.0f} ms; deleted "
+          f"{totals['checkpoints']} checkpoints and {totals['blobs']} blobs, compressed {totals['compressed']} blobs")
+
+    after = {t: len((await chatbot.app.aget_state({"configurable": {"thread_id": t}})).values["messages"]) for t in threads}
+    response = await chatbot.chat(threads[0], "does it come in another color")
+    print(f"thread state unchanged by retention: {before == after}; next turn on a trimmed thread: "
+          f"{'ok' if response else 'failed'}")
+
+    await asyncio.sleep(1.5)
+    expired = await CheckpointMaintenance(chatbot.pool, idle_ttl=1, grace=0).run_once()
+    print(f"idle threads expired with a 1 s TTL: {expired['expired_threads']}, "
+          f"checkpoints left: {(await storage(chatbot.pool))['checkpoints']}")
+    await chatbot.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=10)
+    parser.add_argument("--ages", default="2,10,25", help="turns per thread at each measurement")
+    parser.add_argument("--keep", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=100)
+    args = parser.parse_args()
+
+    if not os.getenv("POSTGRES_URI"):
+        sys.exit("Set POSTGRES_URI to a scratch Postgres database")
+
+    with OpenAIStub() as model_api, ProductAPIStub(size=2000) as product_api:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = model_api.url
+        os.environ["OPENAI_API_BASE"] = model_api.url
+        os.environ["PRODUCT_API_URL"] = product_api.url
+        from Chatbot.Main import ChatbotApp
+        from Chatbot.ResponseCache import response_cache
+
+        response_cache.max_entries = 0
+        asyncio.run(run(args, ChatbotApp()))
+
+
+if __name__ == "__main__":
+    main()
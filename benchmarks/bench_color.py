@@ -0,0 +1,46 @@
+"""Accuracy and latency of local dominant-color detection on the labeled sample images.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_color [--threshold 0.45]
+"""
+import argparse
+import json
+import os
+import time
+
+from Image_Analysis.Image_search.color import COLOR_CONFIDENCE_THRESHOLD, dominant_color
+from benchmarks.synthetic import COLORS
+
+IMAGES_DIR = os.path.join("Image_Analysis", "Image_search", "Images")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threshold", type=float, default=COLOR_CONFIDENCE_THRESHOLD)
+    args = parser.parse_args()
+
+    with open(os.path.join(IMAGES_DIR, "labels.json")) as f:
+        labels = json.load(f)
+    vocabulary = [c.lower() for c in COLORS]
+
+    print(f"{'image':<18}{'label':<8}{'local':<8}{'conf':>6}{'ms':>8}  route")
+    correct = local_correct = local_total = 0
+    for name, label in labels.items():
+        start = time.perf_counter()
+        result = dominant_color(os.path.join(IMAGES_DIR, name), vocabulary)
+        ms = (time.perf_counter() - start) * 1000
+        hit = result["color"] == label["color"]
+        local = result["confidence"] >= args.threshold
+        correct += hit
+        local_total += local
+        local_correct += hit and local
+        route = "local color + LLM category" if local else "LLM category + color"
+        print(f"{name:<18}{label['color']:<8}{str(result['color']):<8}{result['confidence']:>6.2f}{ms:>8.1f}  {route}")
+
+    print(f"\ntop-1 accuracy: {correct}/{len(labels)}")
+    print(f"answered locally at threshold {args.threshold}: {local_total}/{len(labels)}, correct {local_correct}/{local_total or 1}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Prompt tokens per turn over a long session, with and without history compaction.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_history --turns 20
+"""
+import argparse
+import asyncio
+import json
+import os
+
+from benchmarks.stubs import OpenAIStub, ProductAPIStub
+
+QUERIES = [
+    "red shirt in size M", "black watch under $100", "grey pants size L", "blue hoodie",
+    "leather shoes for office days", "something for the gym", "denim jacket size XL",
+    "summer dress", "travel bag", "white t-shirt size S",
+]
+
+
+def build_uncompacted_graph():
+    """The graph as it was before the history stage: agent is the entry point."""
+    from langgraph.graph import END, StateGraph
+    from langgraph.prebuilt import ToolNode
+    from Chatbot.Nodes import agent_node, tool_output_node
+    from Chatbot.config import AIState, tools
+
+    graph = StateGraph(AIState)
+    graph.add_node("agent", agent_node)
+    graph.add_node("tools", ToolNode(tools))
+    graph.add_node("tool_output", tool_output_node)
+    graph.add_conditional_edges("agent", lambda s: "tools" if s["messages"][-1].tool_calls else END, {"tools": "tools", END: END})
+    graph.add_edge("tools", "tool_output")
+    graph.add_edge("tool_output", "agent")
+    graph.set_entry_point("agent")
+    return graph
+
+
+async def session(graph, model_api, turns):
+    from langchain_core.messages import HumanMessage
+    from langgraph.checkpoint.memory import InMemorySaver
+    from Chatbot.Tokens import count_tokens
+
+    app = graph.compile(checkpointer=InMemorySaver())
+    config = {"configurable": {"thread_id": "bench"}}
+    per_turn = []
+    for i in range(turns):
+        await app.ainvoke({"messages": [HumanMessage(content=QUERIES[i % len(QUERIES)])]}, config=config)
+        per_turn.append(count_tokens(json.dumps(model_api.prompts[-1])))
+    return per_turn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20)
+    args = parser.parse_args()
+
+    with OpenAIStub() as model_api, ProductAPIStub(size=2000) as product_api:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = model_api.url
+        os.environ["OPENAI_API_BASE"] = model_api.url
+        os.environ["PRODUCT_API_URL"] = product_api.url
+        from Chatbot.Main import graph
+
+        async def run():
+            return (
+                await session(build_uncompacted_graph(), model_api, args.turns),
+                await session(graph, model_api, args.turns),
+            )
+
+        raw, compacted = asyncio.run(run())
+
+    print(f"\n{'turn':>5}{'uncompacted':>14}{'compacted':>12}{'saved':>10}")
+    for i, (a, b) in enumerate(zip(raw, compacted), 1):
+        print(f"{i:>5}{a:>14}{b:>12}{a - b:>10}")
+    print(f"\ntotal prompt tokens: {sum(raw):,} -> {sum(compacted):,} ({1 - sum(compacted) / sum(raw):.0%} saved)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Image analysis throughput: N single /image-analyze calls vs one /image-analyze/batch call.
+
+Runs against local vocabulary and vision stubs with a per-request and per-image latency,
+clearing the result cache between runs so every image reaches the vision stub. Run from
+the repository root:
+
+    python -m benchmarks.bench_image_batch --images 16 --latency 0.3 --image-latency 0.1
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from benchmarks.stubs import OpenAIStub, ProductAPIStub
+from benchmarks.synthetic import synthetic_image
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.3, help="vision stub latency per request (s)")
+    parser.add_argument("--image-latency", type=float, default=0.1, help="extra vision latency per image (s)")
+    parser.add_argument("--vocab-latency", type=float, default=0.05, help="vocabulary API latency (s)")
+    args = parser.parse_args()
+
+    with OpenAIStub(latency=args.latency, image_latency=args.image_latency) as model_api, \
+            ProductAPIStub(size=10, latency=args.vocab_latency) as product_api:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="bench-uploads-")
+        os.environ["OPENAI_BASE_URL"] = model_api.url
+        os.environ["PRODUCT_API_BASE"] = product_api.base_url
+        # Rule out local color detection so every image needs the vision call for both fields
+        os.environ["COLOR_CONFIDENCE_THRESHOLD"] = "2"
+        from fastapi.testclient import TestClient
+        from langgraph.checkpoint.memory import InMemorySaver
+        from Chatbot.Main import chatbot
+        from Image_Analysis.Image_search import batch
+        from Image_Analysis.Image_search.cache import result_cache
+        from Server.server import app
+
+        chatbot.checkpointer = InMemorySaver()  # no Postgres needed for server startup
+        files = [(f"{i}.jpg", synthetic_image(i)) for i in range(args.images)]
+
+        def run(label, fn):
+            result_cache.clear()
+            calls = model_api.requests
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+            print(f"{label:<30}{elapsed:>9.2f}{len(files) / elapsed:>12.1f}{model_api.requests - calls:>14}")
+
+        def singles():
+            with contextlib.redirect_stdout(io.StringIO()):  # image_analysis prints every result
+                for name, data in files:
+                    client.post("/api/v1/image-analyze", files={"file": (name, data)}).raise_for_status()
+
+        def batch_call(pack_size):
+            def call():
+                response = client.post(
+                    "/api/v1/image-analyze/batch",
+                    files=[("files", (name, data)) for name, data in files],
+                    params={"pack_size": pack_size},
+                )
+                response.raise_for_status()
+                assert all("data" in item for item in response.json()["data"])
+            return call
+
+        with TestClient(app) as client:
+            with contextlib.redirect_stdout(io.StringIO()):
+                client.post("/api/v1/image-analyze", files={"file": files[0]})  # warm the process pool
+            print(f"{'mode':<30}{'seconds':>9}{'images/s':>12}{'vision calls':>14}")
+            run("sequential /image-analyze", singles)
+            for concurrency in (1, 4, 8):
+                batch.VISION_CONCURRENCY = concurrency
+                run(f"batch, concurrency {concurrency}", batch_call(1))
+            run("batch, concurrency 8, pack 4", batch_call(4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Vision payload size and /image-analyze handler latency on the sample images.
+
+Compares the original-bytes payload the vision call used to receive with the downscaled,
+re-encoded one, then times the full handler against local vocabulary and vision stubs.
+Run from the repository root:
+
+    python -m benchmarks.bench_image_preprocess --repeat 5
+"""
+import argparse
+import base64
+import glob
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.stubs import OpenAIStub, ProductAPIStub
+
+IMAGES = sorted(
+    path for path in glob.glob(os.path.join("Image_Analysis", "Image_search", "Images", "*"))
+    if path.lower().endswith((".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tiff"))
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with OpenAIStub() as model_api, ProductAPIStub(size=10) as product_api:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="bench-uploads-")
+        os.environ["OPENAI_BASE_URL"] = model_api.url
+        os.environ["PRODUCT_API_BASE"] = product_api.base_url
+        from fastapi.testclient import TestClient
+        from langgraph.checkpoint.memory import InMemorySaver
+        from Chatbot.Main import chatbot
+        from Image_Analysis.Image_search.cache import result_cache
+        from Image_Analysis.Image_search.preprocess import prepare_image
+        from Server.server import app
+
+        chatbot.checkpointer = InMemorySaver()  # no Postgres needed for server startup
+
+        print(f"{'image':<18}{'file KB':>9}{'old b64 KB':>12}{'new b64 KB':>12}{'prep ms':>9}{'handler ms':>12}")
+        totals = [0, 0]
+        with TestClient(app) as client:
+            for path in IMAGES:
+                with open(path, "rb") as f:
+                    raw = f.read()
+                old_payload = len(base64.b64encode(raw))
+
+                start = time.perf_counter()
+                prepared = prepare_image(path)
+                prep_ms = (time.perf_counter() - start) * 1000
+                new_payload = len(prepared.base64)
+
+                timings = []
+                for _ in range(args.repeat):
+                    result_cache.clear()  # measure the full vision path, not cache hits
+                    start = time.perf_counter()
+                    response = client.post("/api/v1/image-analyze", files={"file": (os.path.basename(path), raw)})
+                    timings.append((time.perf_counter() - start) * 1000)
+                    response.raise_for_status()
+
+                totals[0] += old_payload
+                totals[1] += new_payload
+                print(
+                    f"{os.path.basename(path):<18}{len(raw) / 1024:>9.0f}{old_payload / 1024:>12.0f}"
+                    f"{new_payload / 1024:>12.0f}{prep_ms:>9.1f}{statistics.median(timings):>12.1f}"
+                )
+        print(f"\nvision payload: {totals[0] / 1024:,.0f} KB -> {totals[1] / 1024:,.0f} KB ({totals[1] / totals[0]:.0%})")
+        print(f"bytes received by the vision stub per call: {statistics.median(model_api.image_bytes) / 1024:,.0f} KB (median)")
+
+
+if __name__ == "__main__":
+    main()
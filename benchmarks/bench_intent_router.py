@@ -0,0 +1,76 @@
+"""Chat turn latency and model calls with and without the local intent fast path.
+
+Replays a mixed trace (shopping queries plus greetings, thanks and off-topic questions)
+through ChatbotApp.chat against local model/catalog stubs, once with the router disabled
+and once enabled, and prints router_report(). Run from the repository root:
+
+    python -m benchmarks.bench_intent_router --latency 0.4 --rounds 3
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import time
+
+from benchmarks.stubs import OpenAIStub, ProductAPIStub
+
+TRACE = [
+    ("hi", "greeting"), ("red shirt in size M", "shopping"), ("show me something cheaper", "shopping"),
+    ("thanks!", "thanks"), ("what is the capital of france", "off_topic"), ("black watch under $100", "shopping"),
+    ("hello there", "greeting"), ("does it come in blue", "shopping"), ("tell me a joke", "off_topic"),
+    ("thank you so much", "thanks"), ("grey pants size L", "shopping"), ("bye", "goodbye"),
+]
+
+
+async def replay(chatbot, rounds):
+    for r in range(rounds):
+        for text, _ in TRACE:
+            with contextlib.redirect_stdout(io.StringIO()):  # chat() prints every reply
+                await chatbot.chat(f"bench-{r}", text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.4, help="model stub latency per call (s)")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    with OpenAIStub(latency=args.latency) as model_api, ProductAPIStub(size=2000) as product_api:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = model_api.url
+        os.environ["OPENAI_API_BASE"] = model_api.url
+        os.environ["PRODUCT_API_URL"] = product_api.url
+        from langgraph.checkpoint.memory import InMemorySaver
+        from Chatbot import Intent
+        from Chatbot.Main import ChatbotApp
+
+        correct = sum(Intent.classify(text)[0] == label for text, label in TRACE)
+        print(f"classifier: {correct}/{len(TRACE)} trace messages labelled correctly")
+
+        async def run():
+            results = {}
+            for enabled in (False, True):
+                Intent.INTENT_ROUTER_ENABLED = enabled
+                calls = model_api.requests
+                start = time.perf_counter()
+                await replay(ChatbotApp(checkpointer=InMemorySaver()), args.rounds)
+                results[enabled] = (time.perf_counter() - start, model_api.requests - calls)
+            return results
+
+        results = asyncio.run(run())
+
+    turns = len(TRACE) * args.rounds
+    print(f"\n{'router':<10}{'turns':>7}{'model calls':>13}{'total s':>10}{'avg turn ms':>13}")
+    for enabled, (seconds, calls) in results.items():
+        print(f"{'on' if enabled else 'off':<10}{turns:>7}{calls:>13}{seconds:>10.2f}{seconds / turns * 1000:>13.0f}")
+
+    # The stats accumulate over both runs; the fast-path numbers come from the enabled run only
+    report = Intent.router_report()
+    print(f"\nfast path: {report['fast_path']}/{turns} turns ({report['fast_path'] / turns:.0%}), by intent {report['by_intent']}")
+    print(f"avg fast turn {report['avg_fast_ms']:.1f} ms vs avg agent turn {report['avg_agent_ms']:.0f} ms; "
+          f"estimated model time saved {report['saved_seconds']:.1f} s; classify {report['classify_ms_per_turn']:.3f} ms/turn")
+
+
+if __name__ == "__main__":
+    main()
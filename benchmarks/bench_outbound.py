@@ -0,0 +1,123 @@
+"""Request coalescing and priority admission control for outbound calls.
+
+1. Coalescing: many concurrent first loads of the catalog (async and blocking callers
+   mixed) and of the category/color vocabulary, counting the requests that reach the stub.
+2. Scheduling: with the request bucket drained, a burst of batch vision calls (worker
+   threads) is queued while interactive chat calls (coroutines) keep arriving. Reports the
+   interactive wait with priorities against plain FIFO, where everything is one priority.
+3. Backpressure: a burst far beyond what max_wait allows. Counts calls admitted and calls
+   rejected with Overloaded (a 429 with Retry-After at the server).
+
+Run from the repository root:
+
+    python -m benchmarks.bench_outbound --rpm 600 --batch 60 --interactive 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import threading
+import time
+
+from benchmarks.stubs import ProductAPIStub
+
+
+def coalescing(product_api, callers):
+    from Chatbot.Catalog import CatalogCache
+    from Image_Analysis.Image_search.image import fetch_categories, fetch_colors
+    from Image_Analysis.Image_search.vocabulary import VocabularyService
+
+    cache = CatalogCache(url=product_api.url)
+    before = product_api.requests
+
+    async def run():
+        threads = [threading.Thread(target=cache.get) for _ in range(callers // 2)]
+        for t in threads:
+            t.start()
+        await asyncio.gather(*(cache.aget() for _ in range(callers - callers // 2)))
+        for t in threads:
+            t.join()
+
+    asyncio.run(run())
+    catalog_requests = product_api.requests - before
+
+    service = VocabularyService(fetch_categories, fetch_colors)
+    before = product_api.requests
+    threads = [threading.Thread(target=service.get) for _ in range(callers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return catalog_requests, product_api.requests - before
+
+
+def scheduling(rpm, batch, interactive, use_priority, max_wait):
+    """(interactive waits, batch waits, rejected) with the request bucket drained at start."""
+    from Outbound.scheduler import BATCH, INTERACTIVE, OutboundScheduler, Overloaded
+
+    scheduler = OutboundScheduler("bench", rpm, 10_000_000, max_wait=max_wait, max_queue=10_000)
+    scheduler.requests.level = 0
+    chat_level = INTERACTIVE if use_priority else BATCH
+    batch_waits, rejected, lock = [], [0], threading.Lock()
+
+    def batch_call():
+        start = time.perf_counter()
+        try:
+            scheduler.acquire(1000, level=BATCH)
+        except Overloaded:
+            with lock:
+                rejected[0] += 1
+            return
+        with lock:
+            batch_waits.append(time.perf_counter() - start)
+
+    async def run():
+        threads = [threading.Thread(target=batch_call) for _ in range(batch)]
+        for t in threads:
+            t.start()
+            time.sleep(0.001)   # keep the batch queued in submission order
+        waits = []
+        for _ in range(interactive):
+            start = time.perf_counter()
+            try:
+                await scheduler.aacquire(500, level=chat_level)
+                waits.append(time.perf_counter() - start)
+            except Overloaded:
+                rejected[0] += 1
+            await asyncio.sleep(0.5)
+        await asyncio.to_thread(lambda: [t.join() for t in threads])
+        return waits
+
+    interactive_waits = asyncio.run(run())
+    return interactive_waits, batch_waits, rejected[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--callers", type=int, default=50, help="concurrent first loads")
+    parser.add_argument("--rpm", type=float, default=600, help="request bucket refill (requests per minute)")
+    parser.add_argument("--batch", type=int, default=60, help="batch vision calls queued at once")
+    parser.add_argument("--interactive", type=int, default=10, help="chat calls, one every 0.5 s")
+    parser.add_argument("--max-wait", type=float, default=10)
+    args = parser.parse_args()
+
+    with ProductAPIStub(size=2000, latency=0.2) as product_api:
+        os.environ["PRODUCT_API_BASE"] = product_api.base_url
+        catalog_requests, vocabulary_requests = coalescing(product_api, args.callers)
+    print(f"{args.callers} concurrent first loads -> catalog requests: {catalog_requests}, "
+          f"vocabulary requests: {vocabulary_requests} (2 lists)\n")
+
+    print(f"{'queue':<10}{'chat wait p50 ms':>18}{'chat wait max ms':>18}{'batch wait max s':>18}{'rejected':>10}")
+    for use_priority in (False, True):
+        chat, batch, rejected = scheduling(args.rpm, args.batch, args.interactive, use_priority, args.max_wait)
+        print(f"{'priority' if use_priority else 'fifo':<10}{statistics.median(chat) * 1000:>18.0f}"
+              f"{max(chat) * 1000:>18.0f}{max(batch):>18.1f}{rejected:>10}")
+
+    overload = args.batch * 4
+    _, admitted, rejected = scheduling(args.rpm, overload, 0, True, args.max_wait)
+    print(f"\nburst of {overload} batch calls at {args.rpm:.0f} rpm, max wait {args.max_wait:.0f} s: "
+          f"{len(admitted)} admitted (max wait {max(admitted):.1f} s), {rejected} rejected")
+
+
+if __name__ == "__main__":
+    main()
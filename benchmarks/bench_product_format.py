@@ -0,0 +1,68 @@
+"""Tokens per product: the old indent=2 JSON tool output vs the compact product table.
+
+"parity" re-renders the old JSON with the same description truncation, so the compact
+row is compared at equal model-visible information. Also checks that a product_search
+turn leaves exactly one copy of the results in the thread. Run from the repository root:
+
+    python -m benchmarks.bench_product_format --products 8
+"""
+import argparse
+import asyncio
+import os
+
+from Chatbot.Compact import compact_products, product_ids, truncate
+from Chatbot.Tokens import _encoding, count_tokens
+from benchmarks.bench_product_search import format_products
+from benchmarks.synthetic import make_catalog
+from benchmarks.stubs import OpenAIStub, ProductAPIStub
+
+
+def per_product(text, n):
+    return count_tokens(text) / n
+
+
+def copies_in_thread(size):
+    """Run one turn against stubs and count messages that carry the product list."""
+    with OpenAIStub() as model_api, ProductAPIStub(size=size) as product_api:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = model_api.url
+        os.environ["OPENAI_API_BASE"] = model_api.url
+        os.environ["PRODUCT_API_URL"] = product_api.url
+        from langchain_core.messages import HumanMessage
+        from langgraph.checkpoint.memory import InMemorySaver
+        from Chatbot.Main import graph
+
+        app = graph.compile(checkpointer=InMemorySaver())
+        result = asyncio.run(app.ainvoke(
+            {"messages": [HumanMessage(content="red shirt")]},
+            config={"configurable": {"thread_id": "format"}},
+        ))
+    return sum(1 for m in result["messages"] if product_ids(m.content) or '"id"' in str(m.content))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=8)
+    args = parser.parse_args()
+
+    products = make_catalog(args.products, seed=11)
+    truncated = [{**p, "description": truncate(p["description"])} for p in products]
+    tokenizer = "tiktoken gpt-4o" if _encoding() is not None else "chars/4 estimate (tiktoken vocabulary unavailable)"
+
+    rows = [
+        ("old JSON (indent=2)", format_products(products, "Found products:")),
+        ("old JSON, parity", format_products(truncated, "Found products:")),
+        ("compact table", compact_products(products, "Found products:")),
+    ]
+    print(f"tokenizer: {tokenizer}, {len(products)} products\n")
+    for name, text in rows:
+        print(f"{name:<22}{count_tokens(text):>8} tokens {per_product(text, len(products)):>8.1f} / product")
+
+    parity = per_product(rows[1][1], len(products))
+    compact = per_product(rows[2][1], len(products))
+    print(f"\ncompact vs parity: {compact / parity:.0%} of the tokens")
+    print(f"messages carrying the product list after one search turn: {copies_in_thread(200)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Compare the dump-everything product_search path with the local retrieval index.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_product_search --products 10000
+
+Model latency is estimated from prompt tokens with --prefill-tps, since the benchmark
+runs offline; local latency covers fetching-to-prompt work done in this process.
+"""
+import argparse
+import json
+import statistics
+import time
+
+from Chatbot.Search import ProductIndex
+from Chatbot.Tokens import count_tokens
+from benchmarks.synthetic import make_catalog
+
+QUERIES = [
+    "red shirt in size M",
+    "black leather watch under $100",
+    "casual denim jeans size XL",
+    "lightweight jacket for travel",
+    "blue hoodie between 20 and 60",
+    "something formal for office days",
+]
+
+GPT4O_CONTEXT = 128_000
+
+
+def format_products(products, header):
+    """Same layout tool_output_node puts in front of the model."""
+    product_info = []
+    for p in products:
+        price_info = f"${p.get('offer_price', p.get('price', 'N/A'))}"
+        if p.get("offer_price") and p.get("price") and p["offer_price"] != p["price"]:
+            price_info = f"${p['offer_price']} (was ${p['price']})"
+        product_info.append({
+            "id": p.get("id"),
+            "name": p.get("product_name", "Unknown Product"),
+            "price": price_info,
+            "colors": p.get("colors", []),
+            "sizes": p.get("sizes", []),
+            "description": p.get("description", "No description available"),
+        })
+    return f"{header}\n" + json.dumps(product_info, indent=2)
+
+
+def dump_everything(products, query):
+    payload = json.dumps({"success": True, "query": query, "data": products})
+    data = json.loads(payload)
+    return format_products(data["data"], f"Found {len(data['data'])} products. Here are the available products:")
+
+
+def indexed(index, query, top_k):
+    result = index.search(query, top_k=top_k)
+    payload = json.dumps({"success": True, "query": query, **result})
+    data = json.loads(payload)
+    return format_products(data["data"], f"Found {data['total_matches']} matching products, showing the top {len(data['data'])}.")
+
+
+def measure(fn, *args, repeat=3):
+    timings, text = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = fn(*args)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--prefill-tps", type=float, default=4_000, help="assumed model prompt tokens/second")
+    args = parser.parse_args()
+
+    catalog = make_catalog(args.products)
+    start = time.perf_counter()
+    index = ProductIndex(catalog)
+    build_s = time.perf_counter() - start
+    print(f"catalog={len(catalog)} products, index build {build_s * 1000:.1f} ms (once per catalog snapshot)\n")
+
+    header = f"{'query':<38}{'path':<8}{'tokens':>10}{'local ms':>10}{'est e2e s':>11}"
+    print(header)
+    print("-" * len(header))
+    totals = {"dump": [], "index": []}
+    for query in QUERIES:
+        for name, fn, fn_args in (("dump", dump_everything, (catalog, query)), ("index", indexed, (index, query, args.top_k))):
+            local_s, text = measure(fn, *fn_args)
+            tokens = count_tokens(text)
+            e2e = local_s + tokens / args.prefill_tps
+            totals[name].append((tokens, local_s, e2e))
+            flag = "  (exceeds gpt-4o context)" if tokens > GPT4O_CONTEXT else ""
+            print(f"{query[:36]:<38}{name:<8}{tokens:>10}{local_s * 1000:>10.1f}{e2e:>11.2f}{flag}")
+
+    print()
+    for name, rows in totals.items():
+        tokens = statistics.mean(r[0] for r in rows)
+        local = statistics.mean(r[1] for r in rows)
+        e2e = statistics.mean(r[2] for r in rows)
+        print(f"mean {name:<6} tokens={tokens:,.0f} local={local * 1000:.1f} ms est_e2e={e2e:.2f} s")
+    dump_tokens = statistics.mean(r[0] for r in totals["dump"])
+    index_tokens = statistics.mean(r[0] for r in totals["index"])
+    print(f"\nprompt token reduction: {dump_tokens / max(index_tokens, 1):,.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Final replies when the model drifts from the {message, products} format.
+
+Runs chat turns against the model stub with each kind of fault injected into every agent
+answer (see OpenAIStub), plus clean answers, and reports per kind: turns that came back
+with a usable reply, turns whose products are all in the catalog, model calls per turn
+and how the reply was obtained (valid, repaired or the fallback message). Also prints the
+system prompt size. Run from the repository root:
+
+    python -m benchmarks.bench_reply --turns 40
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import time
+from uuid import uuid4
+
+from benchmarks.stubs import OpenAIStub, ProductAPIStub
+
+FAULTS = (None, "fenced", "prose", "truncated", "filtered", "unknown_ids")
+
+
+def outcomes(counter):
+    return {o: counter.labels(outcome=o)._value.get() for o in ("valid", "repaired", "fallback")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.0, help="model stub latency per call (s)")
+    args = parser.parse_args()
+
+    with OpenAIStub(latency=args.latency) as model_api, ProductAPIStub(size=2000) as product_api:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = model_api.url
+        os.environ["OPENAI_API_BASE"] = model_api.url
+        os.environ["PRODUCT_API_URL"] = product_api.url
+        os.environ["RESPONSE_CACHE_SIZE"] = "0"
+        # Every faulty turn logs a warning; the table counts them
+        logging.getLogger("Chatbot.Nodes").setLevel(logging.ERROR)
+        from langgraph.checkpoint.memory import InMemorySaver
+        from Chatbot.Catalog import catalog
+        from Chatbot.Main import ChatbotApp
+        from Chatbot.Nodes import SYSTEM_PROMPT
+        from Chatbot.Reply import FALLBACK_MESSAGE
+        from Chatbot.Tokens import count_tokens
+        from Observability.metrics import CHAT_REPLIES
+
+        async def run():
+            snapshot = await catalog.aget()
+            chatbot = ChatbotApp(checkpointer=InMemorySaver())
+            await chatbot.start()
+            print(f"system prompt: {count_tokens(SYSTEM_PROMPT)} tokens\n")
+            print(f"{'fault':<13}{'usable':>8}{'ids ok':>8}{'calls/turn':>12}{'p50 ms':>9}"
+                  f"{'valid':>7}{'repaired':>10}{'fallback':>10}")
+            for fault in FAULTS:
+                model_api.faults = [fault]
+                before, requests = outcomes(CHAT_REPLIES), model_api.requests
+                usable = ids_ok = 0
+                latency = []
+                for i in range(args.turns):
+                    start = time.perf_counter()
+                    reply = await chatbot.chat(str(uuid4()), f"red shirt in size M #{i}")
+                    latency.append((time.perf_counter() - start) * 1000)
+                    usable += bool(reply and reply["message"] != FALLBACK_MESSAGE)
+                    ids_ok += all(pid in snapshot.products for pid in reply["products"] or [])
+                after = outcomes(CHAT_REPLIES)
+                print(f"{fault or 'none':<13}{usable / args.turns:>8.0%}{ids_ok / args.turns:>8.0%}"
+                      f"{(model_api.requests - requests) / args.turns:>12.2f}{statistics.median(latency):>9.1f}"
+                      + "".join(f"{after[o] - before[o]:>{w}.0f}" for o, w in (("valid", 7), ("repaired", 10), ("fallback", 10))))
+            await chatbot.stop()
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
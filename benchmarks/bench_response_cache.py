@@ -0,0 +1,90 @@
+"""First-turn latency and model calls with and without the normalized-query response cache.
+
+Opens many sessions whose first message is drawn (Zipf-like) from a small set of popular
+questions in varying case and punctuation, each followed by one follow-up turn, against
+local model/catalog stubs. Also checks that a catalog change invalidates the cache. Run
+from the repository root:
+
+    python -m benchmarks.bench_response_cache --sessions 60 --latency 0.3
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import statistics
+import time
+
+from benchmarks.stubs import OpenAIStub, ProductAPIStub
+
+POPULAR = [
+    "show me red shirts in M", "black watch under $100", "grey pants size L", "blue hoodie",
+    "summer dress", "travel bag", "white t-shirt size S", "leather shoes for office",
+]
+VARIANTS = [str, str.lower, str.upper, lambda q: q + "?", lambda q: "  " + q.capitalize() + "!"]
+
+
+async def run_sessions(chatbot, sessions, seed, label):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(POPULAR))]
+    first, follow_up = [], []
+    for i in range(sessions):
+        query = rng.choice(VARIANTS)(rng.choices(POPULAR, weights)[0])
+        with contextlib.redirect_stdout(io.StringIO()):  # chat() prints every reply
+            start = time.perf_counter()
+            await chatbot.chat(f"{label}-{i}", query)
+            first.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            await chatbot.chat(f"{label}-{i}", "does it come in another color")
+            follow_up.append((time.perf_counter() - start) * 1000)
+    return first, follow_up
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.3, help="model stub latency per call (s)")
+    args = parser.parse_args()
+
+    with OpenAIStub(latency=args.latency) as model_api, ProductAPIStub(size=2000) as product_api:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = model_api.url
+        os.environ["OPENAI_API_BASE"] = model_api.url
+        os.environ["PRODUCT_API_URL"] = product_api.url
+        from langgraph.checkpoint.memory import InMemorySaver
+        from Chatbot.Catalog import catalog
+        from Chatbot.Main import ChatbotApp
+        from Chatbot.ResponseCache import response_cache
+
+        async def run():
+            await catalog.aget()
+            results = {}
+            for enabled in (False, True):
+                response_cache.clear()
+                response_cache.max_entries = 512 if enabled else 0
+                calls = model_api.requests
+                chatbot = ChatbotApp(checkpointer=InMemorySaver())
+                first, follow_up = await run_sessions(chatbot, args.sessions, seed=1, label=str(enabled))
+                results[enabled] = (first, follow_up, model_api.requests - calls)
+
+            # A follow-up after a cache hit must see the replayed turn in its checkpoint
+            state = await chatbot.app.aget_state({"configurable": {"thread_id": f"True-{args.sessions - 1}"}})
+            history = [type(m).__name__ for m in state.values["messages"]]
+
+            product_api.update(next(iter(catalog.get().products)), price=1.0)
+            catalog.refresh()
+            return results, history, response_cache.stats()["size"]
+
+        results, history, size_after_change = asyncio.run(run())
+
+    print(f"{'cache':<8}{'sessions':>10}{'model calls':>13}{'first p50 ms':>14}{'first mean ms':>15}{'follow-up p50 ms':>18}")
+    for enabled, (first, follow_up, calls) in results.items():
+        print(f"{'on' if enabled else 'off':<8}{len(first):>10}{calls:>13}{statistics.median(first):>14.1f}"
+              f"{statistics.mean(first):>15.1f}{statistics.median(follow_up):>18.1f}")
+    print(f"\nlast cached thread after its follow-up: {history}")
+    print(f"cache entries after a catalog change: {size_after_change}")
+
+
+if __name__ == "__main__":
+    main()
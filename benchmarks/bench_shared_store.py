@@ -0,0 +1,126 @@
+"""Catalog memory and product API fetches per host as workers are added, with and without the shared store.
+
+Starts 1, 2, 4 and 8 worker processes against the product API stub. Each worker loads
+the catalog and runs searches. While all of them are alive, each one reads its memory
+from /proc/self/smaps_rollup. Reports:
+
+- host catalog memory: the sum of the workers' PSS growth from loading, where pages
+  mapped by several workers count once in total;
+- private memory (USS) per worker;
+- product API requests, and first-load time.
+
+Then two workers share image results. One caches results, the other looks them up after
+the leader has merged the journals. Linux only (smaps_rollup, flock).
+
+    python -m benchmarks.bench_shared_store --products 20000
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.stubs import ProductAPIStub
+
+QUERIES = ["red shirt in size M", "black leather watch under $100", "casual denim jeans size XL",
+           "lightweight jacket for travel", "blue hoodie between 20 and 60", "something formal for office days"]
+
+
+def memory_kb():
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields["Pss"], fields["Private_Clean"] + fields["Private_Dirty"]
+
+
+def catalog_worker(env, barrier, results):
+    os.environ.update(env)
+    from Chatbot.Catalog import catalog
+
+    pss, uss = memory_kb()
+    start = time.perf_counter()
+    snapshot = catalog.get()
+    load = time.perf_counter() - start
+    for query in QUERIES:
+        snapshot.index.search(query, top_k=8)
+    barrier.wait()   # everyone has mapped the catalog before anyone measures
+    after_pss, after_uss = memory_kb()
+    results.put((after_pss - pss, after_uss - uss, load, len(snapshot)))
+    barrier.wait()
+
+
+def image_worker(env, role, hashes, barrier, results):
+    os.environ.update(env)
+    from Image_Analysis.Image_search.cache import IMAGE_CACHE_COMPACT_SECONDS, result_cache
+
+    if role == "writer":
+        for h in hashes:
+            result_cache.put(h, "bench", {"category": "Shirt", "color": "red"})
+    else:
+        result_cache.get(0, "bench")   # start this worker's compactor too
+    barrier.wait()
+    time.sleep(IMAGE_CACHE_COMPACT_SECONDS * 3)
+    if role == "reader":
+        rng = random.Random(1)
+        # Half exact repeats, half re-encodings of the same photo (a couple of bits flipped)
+        lookups = [h if i % 2 else h ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)) for i, h in enumerate(hashes)]
+        start = time.perf_counter()
+        hits = sum(result_cache.get(h, "bench") is not None for h in lookups)
+        seconds = time.perf_counter() - start
+        results.put((hits / len(lookups), seconds / len(lookups) * 1e6, result_cache.stats()["shared_size"]))
+    barrier.wait()
+
+
+def run_catalog(ctx, env, workers):
+    barrier, results = ctx.Barrier(workers), ctx.Queue()
+    procs = [ctx.Process(target=catalog_worker, args=(env, barrier, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    samples = [results.get(timeout=300) for _ in procs]
+    for p in procs:
+        p.join()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--images", type=int, default=2000)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    with ProductAPIStub(size=args.products) as product_api:
+        print(f"{'mode':<8}{'workers':>8}{'host MB':>9}{'USS MB/worker':>15}{'API fetches':>13}{'load p50 s':>12}")
+        for shared in (False, True):
+            for workers in map(int, args.workers.split(",")):
+                env = {"PRODUCT_API_URL": product_api.url, "SHARED_STORE_ENABLED": "1" if shared else "0",
+                       "SHARED_STORE_DIR": tempfile.mkdtemp(prefix="bench-store-"), "PYTHONPATH": os.getcwd()}
+                before = product_api.requests
+                samples = run_catalog(ctx, env, workers)
+                print(f"{'shared' if shared else 'private':<8}{workers:>8}"
+                      f"{sum(s[0] for s in samples) / 1024:>9.1f}{statistics.mean(s[1] for s in samples) / 1024:>15.1f}"
+                      f"{product_api.requests - before:>13}{statistics.median(s[2] for s in samples):>12.2f}")
+
+    env = {"SHARED_STORE_ENABLED": "1", "SHARED_STORE_DIR": tempfile.mkdtemp(prefix="bench-store-"), "IMAGE_CACHE_COMPACT_SECONDS": "0.5",
+           "PYTHONPATH": os.getcwd()}
+    rng = random.Random(7)
+    hashes = [rng.getrandbits(64) for _ in range(args.images)]
+    barrier, results = ctx.Barrier(2), ctx.Queue()
+    procs = [ctx.Process(target=image_worker, args=(env, role, hashes, barrier, results)) for role in ("writer", "reader")]
+    for p in procs:
+        p.start()
+    hit_rate, lookup_us, shared_size = results.get(timeout=300)
+    for p in procs:
+        p.join()
+    print(f"\nimage results cached by one worker, looked up by another: hit rate {hit_rate:.0%} "
+          f"({shared_size} shared entries, {lookup_us:.0f} us per lookup)")
+
+
+if __name__ == "__main__":
+    main()
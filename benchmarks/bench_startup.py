@@ -0,0 +1,132 @@
+"""Server cold start: import time per module, and time to live, ready and first answer under uvicorn.
+
+1. Imports: runs ``python -X importtime -c "import Server.server"`` in fresh processes.
+   Reports the total, the cumulative time of each first-party module, and the
+   third-party packages with the most self time. ``--also`` adds other modules, e.g. the
+   stacks that warm-up loads later.
+2. Uvicorn: starts ``python -m uvicorn Server.server:app`` with the OpenAI and product
+   APIs stubbed. Measures the time from spawn until /healthz answers (accepting
+   requests), until /ready is 200 (warm-up done), and until the first /chat reply.
+   Readiness opens the checkpointer pool, so the uvicorn part needs POSTGRES_URI.
+
+    python -m benchmarks.bench_startup --runs 5
+    POSTGRES_URI=postgresql://... python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import requests
+
+from benchmarks.stubs import OpenAIStub, ProductAPIStub
+
+FIRST_PARTY = ("Server", "Chatbot", "Image_Analysis", "Outbound", "Observability", "Shared")
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_profile(module, env):
+    """({module: cumulative_us} for first-party modules, {package: self_us} for the rest, total_us)."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            env=env, capture_output=True, text=True, check=True)
+    first_party, packages, total = {}, defaultdict(int), 0
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, name = int(match[1]), int(match[2]), match[4]
+        if name == module:
+            total = cumulative_us
+        if name.split(".")[0] in FIRST_PARTY:
+            first_party[name] = cumulative_us
+        else:
+            packages[name.split(".")[0]] += self_us
+    return first_party, packages, total
+
+
+def report_imports(module, runs, env, top):
+    profiles = [import_profile(module, env) for _ in range(runs)]
+    total = statistics.median(p[2] for p in profiles) / 1000
+    print(f"import {module}: {total:.0f} ms (median of {runs})")
+    first_party = {name: statistics.median(p[0].get(name, 0) for p in profiles) / 1000 for name in profiles[0][0]}
+    for name, ms in sorted(first_party.items(), key=lambda item: -item[1]):
+        if ms >= 1:
+            print(f"  {name:<44}{ms:>8.0f} ms")
+    packages = {name: statistics.median(p[1].get(name, 0) for p in profiles) / 1000 for name in profiles[0][1]}
+    print(f"  third-party, self time (top {top}):")
+    for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"    {name:<42}{ms:>8.0f} ms")
+    print()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, deadline, status=200, method="get", **kwargs):
+    while time.perf_counter() < deadline:
+        try:
+            response = requests.request(method, url, timeout=30, **kwargs)
+            if response.status_code == status:
+                return response
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(url)
+
+
+def cold_start(env, timeout=60):
+    """Seconds from spawn to live, ready and first chat reply."""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "Server.server:app", "--port", str(port),
+                               "--log-level", "warning"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        deadline = start + timeout
+        wait_for(f"{base}/healthz", deadline)
+        live = time.perf_counter() - start
+        wait_for(f"{base}/ready", deadline)
+        ready = time.perf_counter() - start
+        wait_for(f"{base}/api/v1/chat", deadline, method="post",
+                 json={"thread_id": f"startup-{port}", "user_input": "red shirt in size M"})
+        first_reply = time.perf_counter() - start
+        return live, ready, first_reply
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="third-party packages to list")
+    parser.add_argument("--also", default="Chatbot.Main,Image_Analysis.Image_search.batch",
+                        help="comma-separated modules to profile after Server.server")
+    args = parser.parse_args()
+
+    with OpenAIStub() as model_api, ProductAPIStub(size=2000) as product_api:
+        env = dict(os.environ, OPENAI_API_KEY="stub", OPENAI_BASE_URL=model_api.url, OPENAI_API_BASE=model_api.url,
+                   PRODUCT_API_URL=product_api.url, PRODUCT_API_BASE=product_api.base_url, VISUAL_INDEX_PATH="",
+                   PYTHONPATH=os.getcwd())
+        for module in ["Server.server", *filter(None, args.also.split(","))]:
+            report_imports(module, args.runs, env, args.top)
+
+        if not os.getenv("POSTGRES_URI"):
+            print("uvicorn cold start: skipped (set POSTGRES_URI; readiness opens the checkpointer pool)")
+            return
+        samples = [cold_start(env) for _ in range(args.runs)]
+        print(f"uvicorn cold start (median of {args.runs}):")
+        for label, values in zip(("live (/healthz)", "ready (/ready)", "first /chat reply"), zip(*samples)):
+            print(f"  {label:<22}{statistics.median(values) * 1000:>8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
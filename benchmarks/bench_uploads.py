@@ -0,0 +1,111 @@
+"""Disk growth and write volume under sustained uploads: one file per upload vs the content-addressed store.
+
+Replays a stream of uploads in which a share of the files are byte-identical repeats of
+earlier ones (the same product photo uploaded again). The naive path writes every upload
+to a fresh uuid file and never deletes it. UploadStore hashes while streaming, stores each
+distinct file once, and evicts unused files LRU beyond its size cap. With
+--delete-after-analysis, it removes every file as soon as its analysis releases it.
+Reports files and inodes left on disk, bytes on disk, bytes written and uploads per second:
+
+    python -m benchmarks.bench_uploads --uploads 2000 --distinct 300 --cap-mb 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+from uuid import uuid4
+
+import anyio
+
+from Image_Analysis.Image_search.uploads import UPLOAD_CHUNK_SIZE, UploadStore
+
+
+class FakeUpload:
+    """The read() half of Starlette's UploadFile, over bytes."""
+
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    async def read(self, size=-1):
+        end = len(self.data) if size < 0 else self.offset + size
+        chunk = self.data[self.offset:end]
+        self.offset += len(chunk)
+        return chunk
+
+
+def disk_usage(root):
+    files = inodes = size = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        inodes += len(dirnames) + len(filenames)
+        files += len(filenames)
+        size += sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+    return files, inodes, size
+
+
+async def naive(root, stream):
+    written = 0
+    for data in stream:
+        upload = FakeUpload(data)
+        async with await anyio.open_file(os.path.join(root, f"{uuid4()}.jpg"), "wb") as out:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                await out.write(chunk)
+                written += len(chunk)
+    return written
+
+
+async def stored(store, stream):
+    for data in stream:
+        async with store.store(FakeUpload(data), ".jpg"):
+            pass   # the analysis would run here
+    return store.stats()["bytes_written"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=2000)
+    parser.add_argument("--distinct", type=int, default=300, help="distinct files the uploads are drawn from")
+    parser.add_argument("--size-kb", type=int, default=200, help="mean upload size")
+    parser.add_argument("--cap-mb", type=float, default=20, help="UploadStore size cap")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    files = [rng.randbytes(int(args.size_kb * 1024 * rng.uniform(0.5, 1.5))) for _ in range(args.distinct)]
+    # Popular photos come back often: Zipf-like draw over the distinct files
+    weights = [1 / (i + 1) for i in range(args.distinct)]
+    stream = rng.choices(files, weights=weights, k=args.uploads)
+    total_mb = sum(map(len, stream)) / 2 ** 20
+    print(f"{args.uploads} uploads ({total_mb:.0f} MB) drawn from {args.distinct} distinct files\n")
+
+    print(f"{'storage':<30}{'files':>8}{'inodes':>8}{'disk MB':>9}{'written MB':>12}{'uploads/s':>11}")
+    variants = [
+        ("uuid file per upload", None),
+        (f"content-addressed, cap {args.cap_mb:g} MB", False),
+        ("content-addressed, delete after", True),
+    ]
+    for label, delete_after in variants:
+        root = tempfile.mkdtemp(prefix="bench-uploads-")
+        try:
+            start = time.perf_counter()
+            if delete_after is None:
+                written = asyncio.run(naive(root, stream))
+            else:
+                store = UploadStore(root, max_bytes=int(args.cap_mb * 2 ** 20), delete_after_analysis=delete_after)
+                written = asyncio.run(stored(store, stream))
+            elapsed = time.perf_counter() - start
+            files_left, inodes, size = disk_usage(root)
+            print(f"{label:<30}{files_left:>8}{inodes:>8}{size / 2 ** 20:>9.1f}{written / 2 ** 20:>12.1f}"
+                  f"{args.uploads / elapsed:>11.0f}")
+            if delete_after is False:
+                stats = store.stats()
+                print(f"{'':<30}hits {stats['hits']}, misses {stats['misses']}, evictions {stats['evictions']}")
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
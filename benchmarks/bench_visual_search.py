@@ -0,0 +1,162 @@
+"""Recall and latency of the visual product index on a synthetic catalog.
+
+Every product gets a generated photo: its color and a shape for its kind on a light
+background, with random proportions and stripes. Products of the same kind and color look
+alike on purpose. Queries are "customer photos" of random products: the product photo
+cropped, resized, tilted, brightened or darkened, and re-encoded as a low-quality JPEG. Reports:
+
+- recall@1 and recall@10 of the true product;
+- query latency: feature extraction, then search with the NumPy index against a plain
+  Python loop over the same vectors;
+- incremental sync after 1% of products change their image, 1% are added and 1% deleted,
+  against a full rebuild, and a restart from the saved index.
+
+    python -m benchmarks.bench_visual_search --products 2000 --queries 200
+"""
+import argparse
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance
+
+from benchmarks.synthetic import make_catalog
+
+RGB = {
+    "Red": (200, 30, 30), "Blue": (30, 90, 200), "Black": (25, 25, 25), "White": (235, 235, 235),
+    "Grey": (128, 128, 128), "Green": (40, 150, 60), "Navy": (20, 30, 80), "Brown": (120, 75, 40),
+    "Pink": (240, 140, 170), "Yellow": (245, 215, 40), "Beige": (220, 200, 160), "Maroon": (128, 0, 0),
+}
+
+
+def product_photo(product, size=320):
+    rng = random.Random(product["id"])
+    img = Image.new("RGB", (size, size), tuple(rng.randrange(225, 256) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    color = RGB[product["colors"][0]]
+    kind = product["product_name"].split()[-1]
+    w, h = size * rng.uniform(0.35, 0.7), size * rng.uniform(0.35, 0.8)
+    box = [(size - w) / 2, (size - h) / 2, (size + w) / 2, (size + h) / 2]
+    if kind in ("Watch", "Cap", "Bag"):
+        draw.ellipse(box, fill=color)
+    elif kind in ("Dress", "Jacket", "Hoodie"):
+        draw.polygon([(box[0], box[3]), ((box[0] + box[2]) / 2, box[1]), (box[2], box[3])], fill=color)
+    else:
+        draw.rectangle(box, fill=color)
+    # Stripes in a second color make products of the same kind and color differ
+    accent = RGB[product["colors"][-1]]
+    for _ in range(rng.randint(0, 4)):
+        y = rng.uniform(box[1], box[3])
+        draw.rectangle([box[0], y, box[2], y + rng.uniform(4, 16)], fill=accent)
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def customer_photo(data, rng):
+    with Image.open(io.BytesIO(data)) as img:
+        w, h = img.size
+        crop = rng.uniform(0.85, 0.97)
+        dx, dy = rng.uniform(0, 1 - crop) * w, rng.uniform(0, 1 - crop) * h
+        img = img.crop((dx, dy, dx + crop * w, dy + crop * h)).resize((600, 600))
+        img = img.rotate(rng.uniform(-8, 8), resample=Image.Resampling.BILINEAR, fillcolor=img.getpixel((0, 0)))
+        img = ImageEnhance.Brightness(img).enhance(rng.uniform(0.85, 1.15))
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=60)
+        return buffer.getvalue()
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    from Chatbot.Catalog import CatalogCache, CatalogSnapshot
+    from Image_Analysis.Image_search.visual import VisualSearch, image_features
+
+    rng = random.Random(args.seed)
+    products = make_catalog(args.products, seed=args.seed)
+    photos = {}
+    for p in products:
+        p["images"] = [f"/uploads/products/{p['id']}.jpg"]
+        photos[p["images"][0]] = product_photo(p)
+
+    fetches = [0]
+
+    def fetch(url):
+        fetches[0] += 1
+        return photos[urlparse(url).path]
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-visual-"), "visual_index.npz")
+    search = VisualSearch(CatalogCache(url="http://unused"), fetch=fetch, path=path)
+
+    start = time.perf_counter()
+    stats = search.sync(CatalogSnapshot({p["id"]: p for p in products}))
+    build = time.perf_counter() - start
+    print(f"indexed {stats['size']} products in {build:.1f} s ({build / stats['size'] * 1000:.1f} ms per image, "
+          f"{search.index.export()[1].nbytes / 1024:.0f} KB of vectors)\n")
+
+    queries = rng.sample(products, min(args.queries, len(products)))
+    ids, vectors = search.index.export()
+    at1 = at10 = 0
+    feature_ms, numpy_ms, loop_ms = [], [], []
+    for product in queries:
+        photo = customer_photo(photos[product["images"][0]], rng)
+        t0 = time.perf_counter()
+        vector = image_features(photo)
+        t1 = time.perf_counter()
+        hits = [pid for pid, _ in search.index.search(vector, 10)]
+        t2 = time.perf_counter()
+        # The same search as a per-product Python loop
+        sorted(((float(np.dot(v, vector)), pid) for pid, v in zip(ids, vectors)), reverse=True)[:10]
+        t3 = time.perf_counter()
+        feature_ms.append((t1 - t0) * 1000)
+        numpy_ms.append((t2 - t1) * 1000)
+        loop_ms.append((t3 - t2) * 1000)
+        at1 += hits[0] == product["id"]
+        at10 += product["id"] in hits
+
+    print(f"recall@1: {at1 / len(queries):.3f}   recall@10: {at10 / len(queries):.3f}   ({len(queries)} queries)\n")
+    print(f"{'query step':<28}{'p50 ms':>9}{'p95 ms':>9}")
+    for label, samples in (("features", feature_ms), ("search, NumPy index", numpy_ms), ("search, Python loop", loop_ms)):
+        print(f"{label:<28}{statistics.median(samples):>9.3f}{percentile(samples, 0.95):>9.3f}")
+
+    # Catalog change: 1% new images, 1% new products, 1% deleted
+    changed = {p["id"]: dict(p) for p in products}
+    step = max(1, len(products) // 100)
+    for p in rng.sample(products, step):
+        changed[p["id"]]["images"] = [f"/uploads/products/{p['id']}-v2.jpg"]
+        photos[changed[p["id"]]["images"][0]] = product_photo({**p, "id": p["id"] + "-v2"})
+    for p in make_catalog(step, seed=args.seed + 1):
+        p["id"] += "-new"
+        p["images"] = [f"/uploads/products/{p['id']}.jpg"]
+        photos[p["images"][0]] = product_photo(p)
+        changed[p["id"]] = p
+    for pid in rng.sample(sorted(p["id"] for p in products), step):
+        changed.pop(pid)
+    snapshot = CatalogSnapshot(changed)
+
+    print(f"\n{'sync':<34}{'fetches':>9}{'seconds':>9}{'indexed':>9}")
+    for label, target in (("incremental, after catalog change", search),
+                          ("restart from saved index", VisualSearch(CatalogCache(url="http://unused"), fetch=fetch, path=path)),
+                          ("full rebuild", VisualSearch(CatalogCache(url="http://unused"), fetch=fetch, path=""))):
+        fetches[0] = 0
+        start = time.perf_counter()
+        stats = target.sync(snapshot)
+        print(f"{label:<34}{fetches[0]:>9}{time.perf_counter() - start:>9.2f}{stats['size']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Category/color vocabulary cost per image request: fetch-every-time vs VocabularyService.
+
+Times the two sequential bare requests.get calls each /image-analyze request used to make
+against the cached service (cold load, warm hits, and a stale hit that refreshes in the
+background), plus the exact/fuzzy matchers. Run from the repository root:
+
+    python -m benchmarks.bench_vocabulary --latency 0.05 --requests 50
+"""
+import argparse
+import os
+import statistics
+import time
+
+import requests
+
+from benchmarks.stubs import ProductAPIStub
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label, timings):
+    print(f"{label:<34}{statistics.median(timings):>10.2f}{max(timings):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="stub API latency per call (s)")
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    with ProductAPIStub(size=10, latency=args.latency) as product_api:
+        os.environ["PRODUCT_API_BASE"] = product_api.base_url
+        from Image_Analysis.Image_search import image
+        from Image_Analysis.Image_search.vocabulary import VocabularyService
+
+        print(f"{'':<34}{'p50 ms':>10}{'max ms':>10}")
+        report("fetch both lists (before)", timed(
+            lambda: (image.fetch_categories(requests), image.fetch_colors(requests)), args.requests))
+
+        service = VocabularyService(image.fetch_categories, image.fetch_colors, ttl=0.2)
+        report("service cold load", timed(service.get, 1))
+        report("service warm get", timed(service.get, args.requests))
+        time.sleep(0.25)
+        report("service stale get (revalidates)", timed(service.get, 1))
+        while service._refreshing.is_set():
+            time.sleep(0.01)
+
+        vocab = service.get()
+        names = ["Shirt", "shirts", "t shirt", "pants", "unknown thing"] * 200
+        start = time.perf_counter()
+        for name in names:
+            image.find_closest_category(name, vocab.categories)
+        legacy_us = (time.perf_counter() - start) / len(names) * 1e6
+        start = time.perf_counter()
+        for name in names:
+            vocab.match_category(name)
+        cached_us = (time.perf_counter() - start) / len(names) * 1e6
+        print(f"\ncategory match: {legacy_us:.1f} us (list scan per call) -> {cached_us:.1f} us (precomputed + memoized)")
+        print(f"vocabulary version: {vocab.version}")
+
+
+if __name__ == "__main__":
+    main()
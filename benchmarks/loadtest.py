@@ -0,0 +1,270 @@
+"""Replay a chat/image trace against the FastAPI app with every external service stubbed.
+
+Starts the fake OpenAI server (chat, tool calls and vision), the fake product/category/
+color API with a synthetic catalog, and serves Server.server:app with uvicorn on a local
+port, using an in-memory checkpointer unless --postgres is given (POSTGRES_URI). The
+trace is replayed endpoint by endpoint; for each endpoint it reports p50/p95/p99 latency,
+throughput, errors and memory (RSS growth and peak while that endpoint ran).
+
+Trace format: one JSON object per line.
+
+    {"endpoint": "chat", "thread_id": "t1", "user_input": "red shirt in size M"}
+    {"endpoint": "chat/stream", "thread_id": "t2", "user_input": "blue hoodie"}
+    {"endpoint": "image", "image": "Image_Analysis/Image_search/Images/red_shirt.jpg"}
+    {"endpoint": "image/batch", "images": ["synthetic:1", "synthetic:2"], "pack_size": 2}
+
+Turns of one thread are sent in order; threads and image requests run concurrently up
+to --concurrency. Image paths are relative to the repository root, and "synthetic:<n>"
+generates a distinct JPEG. Lines without "endpoint" but with "title"/"body" (the backlog
+requests.jsonl format) are replayed as first chat turns. Run from the repository root:
+
+    python -m benchmarks.loadtest --trace benchmarks/traces/mixed.jsonl --repeat 5 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from benchmarks.stubs import OpenAIStub, ProductAPIStub
+from benchmarks.synthetic import synthetic_image
+
+ROUTES = {
+    "chat": "/api/v1/chat",
+    "chat/stream": "/api/v1/chat/stream",
+    "image": "/api/v1/image-analyze",
+    "image/batch": "/api/v1/image-analyze/batch",
+}
+
+
+# ---------------------------
+# Trace
+# ---------------------------
+def load_trace(path, repeat=1):
+    """Trace entries, repeated with per-round thread ids so rounds don't share history."""
+    with open(path) as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    entries = []
+    for r in range(repeat):
+        for i, line in enumerate(lines):
+            if "endpoint" not in line:
+                line = {"endpoint": "chat", "thread_id": line.get("request_id") or f"line-{i}",
+                        "user_input": line.get("title") or line.get("body", "")}
+            entry = dict(line)
+            if entry["endpoint"] not in ROUTES:
+                raise ValueError(f"line {i + 1}: unknown endpoint {entry['endpoint']!r}")
+            if entry["endpoint"].startswith("chat"):
+                entry["thread_id"] = f"{entry.get('thread_id') or f'line-{i}'}-r{r}"
+            entries.append(entry)
+    return entries
+
+
+def image_bytes(ref, cache={}):
+    if ref not in cache:
+        if ref.startswith("synthetic:"):
+            cache[ref] = synthetic_image(int(ref.split(":", 1)[1]))
+        else:
+            with open(ref, "rb") as f:
+                cache[ref] = f.read()
+    return cache[ref]
+
+
+# ---------------------------
+# Memory
+# ---------------------------
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemorySampler:
+    """Peak RSS of this process (app, stubs and client) sampled while a phase runs."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.start = self.peak = self.end = 0
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        self.start = self.peak = rss_bytes()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.end = rss_bytes()
+        self.peak = max(self.peak, self.end)
+
+
+# ---------------------------
+# Replay
+# ---------------------------
+async def send(client, entry):
+    """Issue one trace entry; returns (seconds, first_byte_seconds, ok)."""
+    endpoint = entry["endpoint"]
+    start = time.perf_counter()
+    first_byte = None
+    if endpoint == "chat":
+        response = await client.post(ROUTES[endpoint], json={"thread_id": entry["thread_id"], "user_input": entry["user_input"]})
+        ok = response.status_code == 200
+    elif endpoint == "chat/stream":
+        body = {"thread_id": entry["thread_id"], "user_input": entry["user_input"]}
+        ok = False
+        async with client.stream("POST", ROUTES[endpoint], json=body) as response:
+            async for line in response.aiter_lines():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - start
+                if line.startswith("event: "):
+                    ok = line == "event: final"
+    elif endpoint == "image":
+        name = os.path.basename(entry["image"]).replace("synthetic:", "synthetic-") + ("" if "." in entry["image"] else ".jpg")
+        response = await client.post(ROUTES[endpoint], files={"file": (name, image_bytes(entry["image"]))})
+        ok = response.status_code == 200
+    else:
+        files = [("files", (f"{i}.jpg", image_bytes(ref))) for i, ref in enumerate(entry["images"])]
+        params = {"pack_size": entry["pack_size"]} if entry.get("pack_size") else None
+        response = await client.post(ROUTES[endpoint], files=files, params=params)
+        ok = response.status_code == 200 and all("data" in item for item in response.json()["data"])
+    return time.perf_counter() - start, first_byte, ok
+
+
+async def replay(base_url, entries, concurrency):
+    """Run one endpoint's entries: threads in order, everything else concurrently."""
+    import httpx
+
+    streams = defaultdict(list)
+    for i, entry in enumerate(entries):
+        streams[entry.get("thread_id") or f"request-{i}"].append(entry)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        async def run_stream(stream):
+            async with semaphore:
+                for entry in stream:
+                    try:
+                        samples.append(await send(client, entry))
+                    except httpx.HTTPError:
+                        samples.append((None, None, False))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(run_stream(s) for s in streams.values()))
+        return samples, time.perf_counter() - start
+
+
+def percentiles(values):
+    if len(values) < 2:
+        return (values[0],) * 3 if values else (float("nan"),) * 3
+    q = statistics.quantiles(values, n=100, method="inclusive")
+    return q[49], q[94], q[98]
+
+
+# ---------------------------
+# Server
+# ---------------------------
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app, port):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("server failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trace", default=os.path.join("benchmarks", "traces", "mixed.jsonl"))
+    parser.add_argument("--repeat", type=int, default=3, help="replay the trace this many times")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--model-latency", type=float, default=0.3, help="fake OpenAI latency per call (s)")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="fake OpenAI delay per streamed chunk (s)")
+    parser.add_argument("--image-latency", type=float, default=0.1, help="fake vision latency per image (s)")
+    parser.add_argument("--product-latency", type=float, default=0.02, help="fake product API latency (s)")
+    parser.add_argument("--catalog-size", type=int, default=2000)
+    parser.add_argument("--script", default="product_search", help="comma-separated tool calls per chat turn")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response and image result caches")
+    parser.add_argument("--postgres", action="store_true", help="use POSTGRES_URI instead of an in-memory checkpointer")
+    args = parser.parse_args()
+
+    script = [name for name in args.script.split(",") if name]
+    with OpenAIStub(latency=args.model_latency, token_latency=args.token_latency,
+                    image_latency=args.image_latency, script=script) as model_api, \
+            ProductAPIStub(size=args.catalog_size, latency=args.product_latency) as product_api:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="loadtest-uploads-")
+        os.environ["OPENAI_BASE_URL"] = model_api.url
+        os.environ["OPENAI_API_BASE"] = model_api.url
+        os.environ["PRODUCT_API_URL"] = product_api.url
+        os.environ["PRODUCT_API_BASE"] = product_api.base_url
+        from langgraph.checkpoint.memory import InMemorySaver
+        from Chatbot.Main import chatbot
+        from Chatbot.ResponseCache import response_cache
+        from Image_Analysis.Image_search.cache import result_cache
+        from Server.server import app
+
+        if not args.postgres:
+            chatbot.checkpointer = InMemorySaver()
+        if args.no_cache:
+            response_cache.max_entries = result_cache.max_entries = 0
+
+        entries = load_trace(args.trace, args.repeat)
+        phases = defaultdict(list)
+        for entry in entries:
+            phases[entry["endpoint"]].append(entry)
+
+        port = free_port()
+        server, thread = start_server(app, port)
+        rows = []
+        try:
+            for endpoint, phase in phases.items():
+                calls = model_api.requests
+                with MemorySampler() as memory:
+                    samples, elapsed = asyncio.run(replay(f"http://127.0.0.1:{port}", phase, args.concurrency))
+                rows.append((endpoint, samples, elapsed, memory, model_api.requests - calls))
+        finally:
+            server.should_exit = True
+            thread.join(timeout=10)
+
+    mb = 1024 * 1024
+    print(f"\n{len(entries)} requests from {args.trace} (x{args.repeat}), concurrency {args.concurrency}, "
+          f"model latency {args.model_latency * 1000:.0f} ms, catalog {args.catalog_size} products\n")
+    print(f"{'endpoint':<13}{'reqs':>6}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>8}"
+          f"{'ttfb p50':>10}{'model calls':>13}{'rss +MB':>9}{'peak MB':>9}")
+    for endpoint, samples, elapsed, memory, calls in rows:
+        latencies = [s[0] * 1000 for s in samples if s[0] is not None and s[2]]
+        first_bytes = [s[1] * 1000 for s in samples if s[1] is not None]
+        errors = sum(1 for s in samples if not s[2])
+        p50, p95, p99 = percentiles(latencies)
+        ttfb = f"{statistics.median(first_bytes):.0f}" if first_bytes else "-"
+        print(f"{endpoint:<13}{len(samples):>6}{errors:>8}{p50:>9.0f}{p95:>9.0f}{p99:>9.0f}{len(samples) / elapsed:>8.1f}"
+              f"{ttfb:>10}{calls:>13}{(memory.end - memory.start) / mb:>9.1f}{memory.peak / mb:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+# ---------------------------
+# Local stand-ins for external services used by the benchmarks
+# ---------------------------
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.synthetic import COLORS, TYPES, make_catalog
+
+ROW_ID_RE = re.compile(r"^([^|\s]+)\|", re.MULTILINE)
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+class StubServer:
+    """Run a BaseHTTPRequestHandler subclass on a free localhost port in a daemon thread."""
+
+    handler_class = None
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+        stub = self
+
+        class Handler(self.handler_class):
+            server_stub = stub
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Buffer headers and body into one write; unbuffered writes hit Nagle/delayed-ACK stalls
+    wbufsize = -1
+
+    def send_json(self, status, body, headers=None):
+        raw = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def send_empty(self, status, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+
+
+# ---------------------------
+# Product API
+# ---------------------------
+class ProductAPIHandler(JSONHandler):
+    def do_GET(self):
+        stub = self.server_stub
+        stub.requests += 1
+        if stub.latency:
+            time.sleep(stub.latency)
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/api/category/ai":
+            return self.send_json(200, {"success": True, "data": [{"category_name": c} for c in stub.categories]})
+        if url.path == "/api/product/ai-colors":
+            return self.send_json(200, {"success": True, "data": stub.colors})
+        if url.path != "/api/product/all":
+            return self.send_json(404, {"success": False, "error": "not found"})
+
+        with stub.lock:
+            etag = f'"{stub.revision}"'
+            if self.headers.get("If-None-Match") == etag:
+                return self.send_empty(304, {"ETag": etag})
+            since = query.get("updated_since", [None])[0]
+            if since:
+                changed = [p for p in stub.products.values() if p["updated_at"] > since]
+                deleted = [pid for pid, ts in stub.deleted.items() if ts > since]
+                body = {"success": True, "delta": True, "data": changed, "deleted": deleted}
+                if not stub.deltas:   # filters on updated_since without saying so
+                    body = {"success": True, "data": changed}
+            else:
+                body = {"success": True, "data": list(stub.products.values())}
+                if stub.deltas:
+                    body["delta"] = False
+        self.send_json(200, body, {"ETag": etag})
+
+
+class ProductAPIStub(StubServer):
+    """Fake product API: /api/product/all with ETag, updated_since deltas and in-place
+    catalog edits, plus the /api/category/ai and /api/product/ai-colors vocabularies.
+
+    With ``deltas=False`` responses carry no ``delta`` flag, and updated_since still
+    filters them: an API whose filtered responses look like the full catalog."""
+
+    handler_class = ProductAPIHandler
+
+    def __init__(self, size: int = 1000, latency: float = 0.0, seed: int = 7, deltas: bool = True):
+        super().__init__(latency)
+        self.lock = threading.Lock()
+        self.deltas = deltas
+        self.revision = 1
+        stamp = _now_iso()
+        self.products = {p["id"]: {**p, "updated_at": stamp} for p in make_catalog(size, seed)}
+        self.deleted = {}
+        self.categories = list(TYPES)
+        self.colors = [c.lower() for c in COLORS]
+
+    @property
+    def url(self):
+        return f"{self.base_url}/api/product/all"
+
+    def update(self, product_id, **fields):
+        with self.lock:
+            self.products[product_id] = {**self.products[product_id], **fields, "updated_at": _now_iso()}
+            self.revision += 1
+
+    def delete(self, product_id):
+        with self.lock:
+            self.products.pop(product_id)
+            self.deleted[product_id] = _now_iso()
+            self.revision += 1
+
+
+# ---------------------------
+# OpenAI chat completions
+# ---------------------------
+class OpenAIHandler(JSONHandler):
+    def do_POST(self):
+        stub = self.server_stub
+        stub.requests += 1
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if stub.latency:
+            time.sleep(stub.latency)
+        if not self.path.endswith("/chat/completions"):
+            return self.send_json(404, {"error": {"message": "not found"}})
+        completion = stub.completion(body)
+        if not body.get("stream"):
+            if stub.token_latency:
+                # Generation time is the same whether or not the client streams
+                time.sleep(stub.token_latency * sum(1 for _ in stub.chunks(completion)))
+            return self.send_json(200, completion)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for chunk in stub.chunks(completion, include_usage=(body.get("stream_options") or {}).get("include_usage")):
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            if stub.token_latency:
+                time.sleep(stub.token_latency)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+class OpenAIStub(StubServer):
+    """Fake /v1/chat/completions that scripts tool calls, then a JSON answer.
+
+    ``script`` lists the tools to call in order during each turn: with k tool results
+    since the last user message, the stub calls ``script[k]`` (with the user's text as
+    the query), or answers with the ids it saw once the script is used up. The default
+    is one product_search call; an empty script answers straight away.
+    Requests carrying images get a vision answer (a "results" list when several are packed),
+    after an extra ``image_latency`` seconds per image.
+
+    ``faults`` breaks agent answers the way models do when they drift from the format,
+    cycling through the list one answer at a time: "fenced" (```json block), "prose" (text
+    around the object), "truncated" (cut off mid-object, finish_reason "length"), "filtered"
+    (no content, finish_reason "content_filter"), "unknown_ids" (made-up product ids added)
+    or None (a clean answer). ``response_format`` is not enforced, and calls without tools
+    (such as a reply repair) always get a clean answer.
+    """
+
+    handler_class = OpenAIHandler
+
+    def __init__(self, latency: float = 0.0, token_latency: float = 0.0, image_latency: float = 0.0,
+                 script=("product_search",), faults=(None,)):
+        super().__init__(latency)
+        self.token_latency = token_latency
+        self.image_latency = image_latency
+        self.script = list(script)
+        self.faults = list(faults)
+        self.answers = 0
+        self.prompts = []
+        self.image_bytes = []
+
+    @property
+    def url(self):
+        return f"{self.base_url}/v1"
+
+    def chunks(self, completion, include_usage=False, piece=4):
+        """Split a completion into chat.completion.chunk deltas, ~one token per content chunk."""
+        base = {k: completion[k] for k in ("id", "created", "model")}
+        base["object"] = "chat.completion.chunk"
+        choice = completion["choices"][0]
+        message = choice["message"]
+
+        yield {**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]}
+        for i, call in enumerate(message.get("tool_calls") or []):
+            delta = {"tool_calls": [{"index": i, "id": call["id"], "type": "function", "function": call["function"]}]}
+            yield {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+        content = message.get("content") or ""
+        for start in range(0, len(content), piece):
+            delta = {"content": content[start:start + piece]}
+            yield {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+        yield {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": choice["finish_reason"]}]}
+        if include_usage:
+            yield {**base, "choices": [], "usage": completion["usage"]}
+
+    @staticmethod
+    def break_answer(answer, fault):
+        if fault == "unknown_ids":
+            answer = {**answer, "products": [*(answer["products"] or []), "made-up-id-1", "made-up-id-2"]}
+        content = json.dumps(answer)
+        if fault == "fenced":
+            return f"```json\n{content}\n```"
+        if fault == "prose":
+            return f"Sure! Here you go:\n{content}\nLet me know if you need anything else."
+        if fault == "truncated":
+            return content[:len(content) // 2]
+        if fault == "filtered":
+            return ""
+        return content
+
+    def completion(self, body):
+        messages = body.get("messages", [])
+        last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+        tool_results = [m for m in messages[last_user + 1:] if m.get("role") == "tool"]
+        user_text = messages[last_user].get("content", "") if last_user >= 0 else ""
+        if isinstance(user_text, list):
+            user_text = " ".join(part.get("text", "") for part in user_text if isinstance(part, dict))
+
+        images = [
+            part for m in messages if isinstance(m.get("content"), list)
+            for part in m["content"] if isinstance(part, dict) and part.get("type") == "image_url"
+        ]
+        if images:
+            self.image_bytes.append(sum(len(part["image_url"]["url"]) for part in images))
+            if self.image_latency:
+                time.sleep(self.image_latency * len(images))
+            answer = {"category": TYPES[0], "color": COLORS[0].lower()}
+            if len(images) > 1:
+                answer = {"results": [answer] * len(images)}
+            message = {"role": "assistant", "content": json.dumps(answer)}
+            finish = "stop"
+        elif body.get("tools") and len(tool_results) < len(self.script):
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{
+                    "id": f"call_{self.requests}",
+                    "type": "function",
+                    "function": {"name": self.script[len(tool_results)], "arguments": json.dumps({"query": user_text})},
+                }],
+            }
+            finish = "tool_calls"
+        else:
+            ids = []
+            for result in tool_results:
+                content = result.get("content") or ""
+                try:
+                    ids = [p["id"] for p in json.loads(content).get("data", [])][:3]
+                except (TypeError, ValueError, KeyError, AttributeError):
+                    # Compacted search results: one "id|name|..." row per product
+                    ids = ROW_ID_RE.findall(content)[:3]
+            answer = {"message": f"Here is what I found for: {user_text}", "products": ids or None}
+            fault = self.faults[self.answers % len(self.faults)] if body.get("tools") else None
+            self.answers += 1
+            message = {"role": "assistant", "content": self.break_answer(answer, fault)}
+            # What the API reports when it stops an answer early; the SDK raises on both
+            finish = {"truncated": "length", "filtered": "content_filter"}.get(fault, "stop")
+
+        prompt_chars = sum(len(json.dumps(m)) for m in messages)
+        self.prompts.append(messages)
+        return {
+            "id": f"chatcmpl-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish}],
+            "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": 20, "total_tokens": prompt_chars // 4 + 20},
+        }
@@ -0,0 +1,54 @@
+# ---------------------------
+# Synthetic catalog generator for benchmarks
+# ---------------------------
+import io
+import random
+
+COLORS = ["Red", "Blue", "Black", "White", "Grey", "Green", "Navy", "Brown", "Pink", "Yellow", "Beige", "Maroon"]
+SIZES = ["XS", "S", "M", "L", "XL", "XXL"]
+TYPES = ["Shirt", "T-Shirt", "Pant", "Jeans", "Watch", "Shoes", "Jacket", "Hoodie", "Dress", "Cap", "Bag", "Phone"]
+ADJECTIVES = ["Premium", "Casual", "Classic", "Slim Fit", "Vintage", "Sport", "Formal", "Oversized", "Lightweight", "Luxury"]
+MATERIALS = ["cotton", "linen", "denim", "leather", "wool", "polyester", "silk", "canvas", "stainless steel", "nylon"]
+OCCASIONS = ["everyday wear", "office days", "weekend outings", "parties", "travel", "the gym", "summer evenings"]
+
+
+def make_product(i: int, rng: random.Random) -> dict:
+    kind = rng.choice(TYPES)
+    colors = rng.sample(COLORS, rng.randint(1, 3))
+    price = round(rng.uniform(5, 300), 2)
+    offer = round(price * rng.uniform(0.6, 1.0), 2) if rng.random() < 0.4 else price
+    return {
+        "id": f"cm{i:08d}synthetic{rng.randrange(16 ** 6):06x}",
+        "product_name": f"{rng.choice(ADJECTIVES)} {colors[0]} {kind}",
+        "description": (
+            f"A {rng.choice(ADJECTIVES).lower()} {kind.lower()} made from {rng.choice(MATERIALS)}, "
+            f"designed for {rng.choice(OCCASIONS)}. Comfortable, durable and easy to style with "
+            f"{rng.choice(COLORS).lower()} or {rng.choice(COLORS).lower()} pieces."
+        ),
+        "colors": colors,
+        "sizes": sorted(rng.sample(SIZES, rng.randint(1, 4)), key=SIZES.index),
+        "price": price,
+        "offer_price": offer,
+    }
+
+
+def make_catalog(size: int, seed: int = 7) -> list:
+    """Deterministic list of product dicts shaped like /api/product/all rows."""
+    rng = random.Random(seed)
+    return [make_product(i, rng) for i in range(size)]
+
+
+def synthetic_image(seed: int, size: int = 800) -> bytes:
+    """A distinct JPEG per seed, so no image is served from the perceptual result cache."""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    img = Image.new("RGB", (size, size), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x, y = rng.randrange(size), rng.randrange(size)
+        draw.rectangle([x, y, x + rng.randrange(50, 300), y + rng.randrange(50, 300)],
+                       fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
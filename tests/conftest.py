@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+# The application modules are namespace packages imported from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Every test process keeps its own copies instead of the host's shared store
+os.environ.setdefault("SHARED_STORE_ENABLED", "0")
+
+from benchmarks.stubs import OpenAIStub, ProductAPIStub  # noqa: E402
+from benchmarks.synthetic import make_catalog  # noqa: E402
+
+# Chatbot.Catalog reads PRODUCT_API_URL on import and the chat models read OPENAI_BASE_URL
+# when first built, so the process-wide clients point at stubs before any test module loads
+_product_api = ProductAPIStub(size=200).__enter__()
+_model_api = OpenAIStub().__enter__()
+os.environ["PRODUCT_API_URL"] = _product_api.url
+os.environ["OPENAI_API_KEY"] = "stub"
+os.environ["OPENAI_BASE_URL"] = os.environ["OPENAI_API_BASE"] = _model_api.url
+
+
+def pytest_unconfigure(config):
+    _product_api.__exit__(None, None, None)
+    _model_api.__exit__(None, None, None)
+
+
+@pytest.fixture(scope="session")
+def run():
+    """Run a coroutine on one event loop shared by the session: the chat models keep their
+    async HTTP clients, which must not outlive the loop they were opened on."""
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+@pytest.fixture
+def product_api():
+    """The product API stub behind the process-wide catalog."""
+    return _product_api
+
+
+@pytest.fixture
+def model_api():
+    """The OpenAI-compatible stub the chat models talk to; faults reset after each test."""
+    yield _model_api
+    _model_api.faults = [None]
+
+
+@pytest.fixture
+def product_api_stub():
+    """ProductAPIStub, for tests that need an API of their own."""
+    return ProductAPIStub
+
+
+@pytest.fixture
+def products():
+    """Synthetic catalog rows shaped like /api/product/all, deterministic per (size, seed)."""
+    return make_catalog
+
+
+class FakeUpload:
+    """The read() half of Starlette's UploadFile, over bytes."""
+
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    async def read(self, size=-1):
+        end = len(self.data) if size < 0 else self.offset + size
+        chunk = self.data[self.offset:end]
+        self.offset += len(chunk)
+        return chunk
+
+
+@pytest.fixture
+def fake_upload():
+    return FakeUpload
+
+
+def legacy_format(products, header):
+    """The indent=2 JSON tool_output_node used to put in front of the model."""
+    product_info = []
+    for p in products:
+        price_info = f"${p.get('offer_price', p.get('price', 'N/A'))}"
+        if p.get("offer_price") and p.get("price") and p["offer_price"] != p["price"]:
+            price_info = f"${p['offer_price']} (was ${p['price']})"
+        product_info.append({
+            "id": p.get("id"),
+            "name": p.get("product_name", "Unknown Product"),
+            "price": price_info,
+            "colors": p.get("colors", []),
+            "sizes": p.get("sizes", []),
+            "description": p.get("description", "No description available"),
+        })
+    return f"{header}\n" + json.dumps(product_info, indent=2)
+
+
+@pytest.fixture
+def old_product_format():
+    return legacy_format
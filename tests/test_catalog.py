@@ -0,0 +1,45 @@
+import threading
+import time
+
+from Chatbot.Catalog import CatalogCache
+
+
+def test_delta_refresh_merges_changes(product_api_stub):
+    with product_api_stub(size=50) as api:
+        cache = CatalogCache(url=api.url, ttl=60)
+        first = cache.get()
+        assert first.deltas
+        victim, gone = list(api.products)[0], list(api.products)[-1]
+        api.update(victim, product_name="Limited Edition Red Shirt")
+        api.delete(gone)
+        snapshot = cache.refresh()
+        assert len(snapshot) == 49
+        assert snapshot.products[victim]["product_name"] == "Limited Edition Red Shirt"
+        assert gone not in snapshot.products
+
+
+def test_unmarked_api_never_gets_updated_since(product_api_stub):
+    # Filtered responses without a delta flag would otherwise replace the catalog with the changes alone
+    with product_api_stub(size=50, deltas=False) as api:
+        cache = CatalogCache(url=api.url, ttl=60)
+        assert not cache.get().deltas
+        victim = next(iter(api.products))
+        api.update(victim, product_name="Limited Edition Red Shirt")
+        snapshot = cache.refresh()
+        assert len(snapshot) == 50
+        assert snapshot.products[victim]["product_name"] == "Limited Edition Red Shirt"
+
+
+def test_slow_refresh_does_not_hold_the_lock(product_api_stub):
+    with product_api_stub(size=50) as api:
+        cache = CatalogCache(url=api.url, ttl=60)
+        cache.get()
+        api.latency = 0.5
+        refresh = threading.Thread(target=cache.refresh)
+        refresh.start()
+        time.sleep(0.2)   # the refresh is waiting on the API
+        try:
+            assert cache._lock.acquire(timeout=0.1)
+            cache._lock.release()
+        finally:
+            refresh.join()
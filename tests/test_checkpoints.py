@@ -0,0 +1,75 @@
+import asyncio
+import zlib
+
+import pytest
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from Chatbot.Checkpoints import COMPRESSED_SUFFIX, CheckpointMaintenance, CompressedSerializer
+
+THREAD = {"configurable": {"thread_id": "pg-thread"}}
+
+
+def test_compressed_blobs_load_like_the_originals():
+    serde = CompressedSerializer(JsonPlusSerializer())
+    value = {"messages": [HumanMessage(content="red shirt " * 100)]}
+    typ, blob = serde.dumps_typed(value)
+
+    compressed = (typ + COMPRESSED_SUFFIX, zlib.compress(blob))
+    assert serde.loads_typed(compressed) == serde.loads_typed((typ, blob)) == value
+
+
+@pytest.fixture(scope="module")
+def postgres(tmp_path_factory):
+    pgserver = pytest.importorskip("pgserver")
+    server = pgserver.get_server(tmp_path_factory.mktemp("pg"), cleanup_mode="stop")
+    yield server.get_uri()
+    server.cleanup()
+
+
+@pytest.fixture
+def chatbot(postgres, run):
+    from Chatbot.Main import ChatbotApp
+
+    app = ChatbotApp(conninfo=postgres)
+    run(app.start())
+    run(app.maintenance.stop())   # driven by hand in the tests
+    run(app.checkpointer.setup())
+    yield app
+    run(app.stop())
+
+
+async def query(pool, sql, *params):
+    async with pool.connection() as conn:
+        return await (await conn.execute(sql, params)).fetchall()
+
+
+def test_retention_trims_threads_and_keeps_their_state(chatbot, run):
+    for turn in range(4):
+        run(chatbot.chat("pg-thread", f"red shirt in size M #{turn}"))
+    written = run(query(chatbot.pool, "SELECT count(*) AS n FROM checkpoints WHERE thread_id = 'pg-thread'"))[0]["n"]
+    activity = run(query(chatbot.pool, "SELECT checkpoints, dirty FROM checkpoint_activity WHERE thread_id = 'pg-thread'"))
+    assert activity == [{"checkpoints": written, "dirty": True}]
+    before = run(chatbot.app.aget_state(THREAD)).values["messages"]
+
+    stats = run(CheckpointMaintenance(chatbot.pool, keep=2, idle_ttl=0, grace=0).run_once())
+
+    assert stats["trimmed_threads"] == 1 and stats["checkpoints"] == written - 2
+    assert stats["blobs"] > 0 and stats["compressed"] > 0
+    orphans = run(query(chatbot.pool, """
+        SELECT count(*) AS n FROM checkpoint_blobs b WHERE NOT EXISTS (
+            SELECT 1 FROM checkpoints c WHERE c.thread_id = b.thread_id AND c.checkpoint_ns = b.checkpoint_ns
+              AND c.checkpoint -> 'channel_versions' ->> b.channel = b.version)"""))
+    assert orphans[0]["n"] == 0
+    assert run(chatbot.app.aget_state(THREAD)).values["messages"] == before
+    assert run(chatbot.chat("pg-thread", "does it come in blue"))["message"]
+
+
+def test_idle_threads_expire_only_with_a_ttl(chatbot, run):
+    run(chatbot.chat("idle-thread", "black watch under $100"))
+    run(asyncio.sleep(1.2))
+
+    assert run(CheckpointMaintenance(chatbot.pool, grace=0).run_once())["expired_threads"] == 0
+    assert run(CheckpointMaintenance(chatbot.pool, idle_ttl=1, grace=0).run_once())["expired_threads"] >= 1
+    left = run(query(chatbot.pool, "SELECT count(*) AS n FROM checkpoints WHERE thread_id = 'idle-thread'"))
+    assert left[0]["n"] == 0
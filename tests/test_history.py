@@ -0,0 +1,42 @@
+import json
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from Chatbot.Compact import compact_products
+from Chatbot.History import REFERENCE_PREFIX, history_node
+
+
+def search_turn(question, products, content):
+    call = {"id": f"call_{question}", "name": "product_search", "args": {"query": question}}
+    return [
+        HumanMessage(content=question, id=f"h-{question}"),
+        AIMessage(content="", tool_calls=[call], id=f"c-{question}"),
+        ToolMessage(content=content, tool_call_id=call["id"], id=f"t-{question}"),
+    ]
+
+
+def test_prior_final_reply_survives(products):
+    products = products(4, seed=3)
+    reply = json.dumps({"message": "Here are some red shirts.", "products": [p["id"] for p in products[:2]]})
+    messages = search_turn("red shirt", products, compact_products(products, 'Search "red shirt":'))
+    messages += [AIMessage(content=reply, id="final"), HumanMessage(content="cheaper ones?", id="next")]
+
+    updates = {m.id: m for m in history_node({"messages": messages, "summary": ""})["messages"]}
+
+    assert "final" not in updates
+    assert updates["t-red shirt"].content.startswith(REFERENCE_PREFIX)
+    assert products[0]["id"] in updates["t-red shirt"].content
+
+
+def test_legacy_redump_is_compacted(products):
+    products = products(3, seed=5)
+    dump = f"Found {len(products)} products. Here are the available products:\n" + json.dumps(
+        [{"id": p["id"], "name": p["product_name"]} for p in products], indent=2)
+    messages = search_turn("watch", products, json.dumps({"success": True, "data": products}))
+    messages += [AIMessage(content=dump, id="dump"), AIMessage(content='{"message": "Two watches.", "products": null}', id="final"),
+                 HumanMessage(content="thanks", id="next")]
+
+    updates = {m.id: m for m in history_node({"messages": messages, "summary": ""})["messages"]}
+
+    assert updates["dump"].content.startswith(REFERENCE_PREFIX)
+    assert "final" not in updates
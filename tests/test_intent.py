@@ -0,0 +1,20 @@
+from prometheus_client import REGISTRY
+
+from Chatbot.Intent import record_turn
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_turns_and_saved_time_are_exported():
+    agent, greeting = sample("chat_route_turns_total", route="agent"), sample("chat_route_turns_total", route="greeting")
+    saved, observed = sample("chat_route_saved_seconds_sum"), sample("chat_route_saved_seconds_count")
+
+    record_turn(None, 2.0)
+    record_turn("greeting", 0.01)
+
+    assert sample("chat_route_turns_total", route="agent") == agent + 1
+    assert sample("chat_route_turns_total", route="greeting") == greeting + 1
+    assert sample("chat_route_saved_seconds_count") == observed + 1
+    assert sample("chat_route_saved_seconds_sum") > saved
@@ -0,0 +1,29 @@
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from Chatbot.Compact import compact_products, product_ids, truncate
+from Chatbot.Tokens import count_tokens
+
+
+def per_product(text, n):
+    return count_tokens(text) / n
+
+
+def test_compact_table_costs_fewer_tokens_per_product(products, old_product_format, run):
+    rows = products(8, seed=11)
+    parity = [{**p, "description": truncate(p["description"])} for p in rows]
+    compact = per_product(compact_products(rows, "Found products:"), len(rows))
+    assert compact < per_product(old_product_format(rows, "Found products:"), len(rows))
+    assert compact < per_product(old_product_format(parity, "Found products:"), len(rows))
+
+
+def test_search_turn_keeps_one_copy_of_the_products(model_api, run):
+    from Chatbot.Main import graph
+
+    app = graph.compile(checkpointer=InMemorySaver())
+    result = run(app.ainvoke(
+        {"messages": [HumanMessage(content="red shirt")]},
+        config={"configurable": {"thread_id": "format"}},
+    ))
+    copies = [m for m in result["messages"] if product_ids(m.content) or '"id"' in str(m.content)]
+    assert len(copies) == 1
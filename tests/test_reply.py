@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import json
+
+import pytest
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from Chatbot.Reply import FALLBACK_MESSAGE, MessageStream, parse_reply, validate_products
+
+REPLY = '{"message": "Two red shirts you will like.", "products": ["p1", "p2"]}'
+
+
+@pytest.mark.parametrize("content", [
+    REPLY,
+    f"```json\n{REPLY}\n```",
+    f"Sure! Here you go:\n{REPLY}\nAnything else?",
+    [{"type": "text", "text": REPLY}],
+])
+def test_reply_is_read_through_common_drift(content):
+    reply = parse_reply(content)
+    assert reply.message == "Two red shirts you will like."
+    assert reply.products == ["p1", "p2"]
+
+
+def test_plain_prose_is_the_message():
+    reply = parse_reply("We have no red shirts right now.")
+    assert reply.message == "We have no red shirts right now." and reply.products is None
+
+
+@pytest.mark.parametrize("content", [
+    "",
+    REPLY[:len(REPLY) // 2],                                        # cut off mid-object
+    '{"message": "Red shirts", "products": ["p1"], "price": 20}',   # not in the schema
+    '{"products": ["p1"]}',
+])
+def test_invalid_replies_need_repair(content):
+    assert parse_reply(content) is None
+
+
+def test_unknown_and_duplicate_products_are_dropped():
+    snapshot = SimpleNamespace(products={"p1": {}, "p2": {}})
+    assert validate_products(["p2", "made-up", "p1", "p2"], snapshot) == (["p2", "p1"], ["made-up"])
+    assert validate_products(["made-up"], snapshot) == (None, ["made-up"])
+    assert validate_products(None, snapshot) == (None, [])
+    assert validate_products(["p9"], None) == (["p9"], [])   # catalog not loaded: nothing to check against
+
+
+@pytest.mark.parametrize("fault, usable", [("truncated", True), ("filtered", False)])
+def test_answer_stopped_early_is_repaired_or_falls_back(model_api, run, fault, usable):
+    from Chatbot.Main import graph, parse_response
+
+    model_api.faults = [fault]
+    app = graph.compile(checkpointer=InMemorySaver())
+    result = run(app.ainvoke(
+        {"messages": [HumanMessage(content="red shirt")]},
+        config={"configurable": {"thread_id": f"cut-{fault}"}},
+    ))
+    assert (parse_response(result)["message"] != FALLBACK_MESSAGE) == usable
+
+
+@pytest.mark.parametrize("size", [1, 3, 7])
+def test_streamed_reply_yields_only_the_message_text(size):
+    message = 'Try the "Crimson" tee \\ polo\nor the 😀 one, caf\u00e9 style.'
+    raw = json.dumps({"message": message, "products": ["p1"]})
+    decoder = MessageStream()
+    pieces = [decoder.feed(raw[i:i + size]) for i in range(0, len(raw), size)]
+    assert "".join(pieces) == message
+
+
+def test_stream_tokens_add_up_to_the_final_message(model_api, run):
+    from Chatbot.Main import ChatbotApp
+
+    async def turn():
+        chatbot = ChatbotApp(checkpointer=InMemorySaver())
+        return [event async for event in chatbot.stream("stream-thread", "blue hoodie")]
+
+    events = run(turn())
+    tokens = "".join(data["content"] for event, data in events if event == "token")
+    final = next(data for event, data in events if event == "final")
+    assert tokens == final["message"]
@@ -0,0 +1,61 @@
+import asyncio
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from Chatbot.Catalog import catalog
+from Chatbot.Main import ChatbotApp
+from Chatbot.ResponseCache import response_cache
+
+
+async def thread_messages(chatbot, thread_id):
+    return (await chatbot.app.aget_state({"configurable": {"thread_id": thread_id}})).values["messages"]
+
+
+def test_first_turn_answer_is_replayed_into_a_new_thread(model_api, run):
+    async def scenario():
+        await catalog.aget()
+        chatbot = ChatbotApp(checkpointer=InMemorySaver())
+        first = await chatbot.chat("cache-a", "navy shoes for office days")
+        calls = model_api.requests
+        second = await chatbot.chat("cache-b", "Navy shoes, for office days!")
+        assert model_api.requests == calls   # answered without the model
+        assert second == first
+        a, b = await thread_messages(chatbot, "cache-a"), await thread_messages(chatbot, "cache-b")
+        assert b[0].content == "Navy shoes, for office days!"
+        assert [m.content for m in b[1:]] == [m.content for m in a[1:]]
+        assert not {m.id for m in a} & {m.id for m in b}
+        # A follow-up in the replayed thread continues from the cached context
+        await chatbot.chat("cache-b", "any in size L?")
+        assert len(await thread_messages(chatbot, "cache-b")) > len(b)
+
+    run(scenario())
+
+
+def test_later_turns_are_never_served_from_the_cache(model_api, run):
+    async def scenario():
+        await catalog.aget()
+        chatbot = ChatbotApp(checkpointer=InMemorySaver())
+        await chatbot.chat("cache-c", "grey pants size l")
+        await chatbot.chat("cache-d", "a travel bag")
+        calls = model_api.requests
+        await chatbot.chat("cache-d", "grey pants size l")
+        assert model_api.requests > calls
+
+    run(scenario())
+
+
+def test_catalog_change_clears_the_cache(model_api, product_api, run):
+    async def scenario():
+        await catalog.aget()
+        chatbot = ChatbotApp(checkpointer=InMemorySaver())
+        await chatbot.chat("cache-e", "summer dress in white")
+        assert response_cache.stats()["size"] > 0
+
+        product_api.update(next(iter(product_api.products)), product_name="Limited Edition Summer Dress")
+        await asyncio.to_thread(catalog.refresh)
+        assert response_cache.stats()["size"] == 0
+        calls = model_api.requests
+        await chatbot.chat("cache-f", "summer dress in white")
+        assert model_api.requests > calls
+
+    run(scenario())
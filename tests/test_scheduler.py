@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import openai
+import pytest
+
+from Chatbot import Nodes
+from Outbound.scheduler import BATCH, INTERACTIVE, OutboundScheduler, Overloaded, TokenBucket
+from Outbound.singleflight import SingleFlight
+
+
+class Unreachable:
+    async def ainvoke(self, messages, config=None):
+        raise openai.APIConnectionError(request=httpx.Request("POST", "http://127.0.0.1:9"))
+
+
+class Failing:
+    async def ainvoke(self, messages, config=None):
+        raise RuntimeError("bad reply")
+
+
+def test_chat_call_that_never_ran_refunds_its_tokens(monkeypatch, run):
+    scheduler = OutboundScheduler("chat-test", requests_per_minute=600, tokens_per_minute=10000)
+    monkeypatch.setattr(Nodes, "openai_scheduler", scheduler)
+
+    with pytest.raises(openai.APIConnectionError):
+        run(Nodes.call_model(Unreachable(), [Nodes.HumanMessage(content="red shirt")]))
+    assert scheduler.tokens.level > scheduler.tokens.capacity - 50
+
+
+def test_failed_chat_call_keeps_its_estimate(monkeypatch, run):
+    scheduler = OutboundScheduler("chat-test", requests_per_minute=600, tokens_per_minute=10000)
+    monkeypatch.setattr(Nodes, "openai_scheduler", scheduler)
+
+    with pytest.raises(RuntimeError):
+        run(Nodes.call_model(Failing(), [Nodes.HumanMessage(content="red shirt")]))
+    assert scheduler.tokens.level < scheduler.tokens.capacity - Nodes.COMPLETION_TOKEN_ESTIMATE + 50
+
+
+def test_token_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(rate=10, capacity=50)
+    now = bucket.updated
+    bucket.take(50, now)
+    assert bucket.wait_for(20, now) == pytest.approx(2.0)
+    assert bucket.wait_for(20, now + 2) == 0
+    bucket.refill(now + 60)
+    assert bucket.level == 50
+
+
+def test_queued_calls_are_admitted_by_priority():
+    scheduler = OutboundScheduler("priority-test", requests_per_minute=600, tokens_per_minute=10000)
+    scheduler.requests.level = 0
+    granted = []
+    done = threading.Event()
+
+    def grant(name):
+        granted.append(name)
+        if len(granted) == 3:
+            done.set()
+
+    scheduler._enqueue(10, BATCH, lambda: grant("batch"))
+    scheduler._enqueue(10, INTERACTIVE, lambda: grant("chat-1"))
+    scheduler._enqueue(10, INTERACTIVE, lambda: grant("chat-2"))
+    assert done.wait(5)
+    assert granted == ["chat-1", "chat-2", "batch"]
+
+
+def test_overloaded_when_the_wait_is_too_long():
+    scheduler = OutboundScheduler("overload-test", requests_per_minute=60, tokens_per_minute=10000, max_wait=0.5)
+    scheduler.requests.level = 0
+
+    with pytest.raises(Overloaded) as error:
+        scheduler.acquire(10)
+    assert error.value.retry_after == 1
+    with pytest.raises(Overloaded):
+        scheduler.check(INTERACTIVE)
+    assert Overloaded(2.3).retry_after == 3
+
+
+def test_singleflight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return "catalog"
+
+    with ThreadPoolExecutor(4) as pool:
+        results = [pool.submit(flight.do, "load", load) for _ in range(4)]
+        while flight.coalesced < 3:
+            time.sleep(0.01)
+        release.set()
+        assert [r.result() for r in results] == ["catalog"] * 4
+    assert len(calls) == 1
+    assert flight.in_flight() == []
+
+
+def test_singleflight_shares_the_leaders_error(run):
+    flight = SingleFlight()
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise ValueError("api down")
+
+    async def both():
+        return await asyncio.gather(flight.ado("load", load), flight.ado("load", load), return_exceptions=True)
+
+    assert [type(r) for r in run(both())] == [ValueError, ValueError]
+    assert len(calls) == 1
+
+
+def test_blocking_follower_does_not_wait_on_an_async_leader(run):
+    flight = SingleFlight()
+
+    async def aload():
+        await asyncio.sleep(0.05)
+        return "async"
+
+    async def mixed():
+        leader = asyncio.ensure_future(flight.ado("load", aload))
+        await asyncio.sleep(0)
+        # Called on the event-loop thread while the async leader is in flight
+        blocking = flight.do("load", lambda: "sync")
+        return blocking, await leader
+
+    assert run(mixed()) == ("sync", "async")
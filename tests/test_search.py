@@ -0,0 +1,46 @@
+import pytest
+
+from Chatbot.Search import ColumnIndex, ProductIndex, index_columns
+from Shared.store import ColumnFile, write_columns
+
+
+def column_index(rows, path):
+    meta, columns = index_columns(ProductIndex(rows))
+    write_columns(path, meta, columns)
+    return ColumnIndex(ColumnFile(path))
+
+
+@pytest.fixture(params=["dict", "columns"])
+def make_index(request, tmp_path):
+    if request.param == "dict":
+        return ProductIndex
+    return lambda rows: column_index(rows, str(tmp_path / "index.col"))
+
+
+def test_no_matching_term_returns_nothing(make_index, products):
+    result = make_index(products(300)).search("zzyzx quux")
+    assert result["total_matches"] == 0
+    assert result["data"] == []
+
+
+def test_filter_only_query_still_lists_filtered_products(make_index, products):
+    rows = products(300)
+    result = make_index(rows).search("zzyzx", colors=["Navy"])
+    assert result["total_matches"] == sum("Navy" in p["colors"] for p in rows) > 0
+    assert all("Navy" in p["colors"] for p in result["data"])
+
+
+@pytest.mark.parametrize("query, filters", [
+    ("red shirt", {}),
+    ("cotton hoodie", {"sizes": ["M"]}),
+    ("shoes", {"colors": ["Black"], "max_price": 80}),
+    ("watch", {"min_price": 50, "max_price": 150}),
+    ("leather jacket", {"colors": ["zzyzx"]}),   # no exact match: relaxed
+])
+def test_column_index_ranks_like_the_dict_index(products, tmp_path, query, filters):
+    rows = products(300)
+    expected = ProductIndex(rows).search(query, top_k=8, **filters)
+    result = column_index(rows, str(tmp_path / "index.col")).search(query, top_k=8, **filters)
+
+    assert [p["id"] for p in result["data"]] == [p["id"] for p in expected["data"]]
+    assert (result["total_matches"], result["relaxed"]) == (expected["total_matches"], expected["relaxed"])
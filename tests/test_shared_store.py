@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from Shared.store import (ColumnFile, SharedStore, Strings, fcntl, find_key, pack_strings, sorted_keys,
+                          write_columns)
+
+
+def test_columns_read_back_as_written(tmp_path):
+    columns = {
+        "price": np.array([9.5, 20.0, 14.25]),
+        "counts": np.arange(12, dtype=np.int32).reshape(3, 4),
+        "empty": np.zeros(0, dtype=np.int64),
+    }
+    write_columns(str(tmp_path / "data.col"), {"version": 3}, columns)
+
+    file = ColumnFile(str(tmp_path / "data.col"))
+    assert file.meta == {"version": 3}
+    for name, array in columns.items():
+        assert file[name].dtype == array.dtype
+        assert np.array_equal(file[name], array)
+
+
+def test_string_and_key_columns(tmp_path):
+    names = ["Navy shirt", "", "Café hoodie"]
+    offsets, blob = pack_strings(names)
+    keys = sorted_keys(["p10", "p2", "p1"])
+    write_columns(str(tmp_path / "data.col"), {}, {"offsets": offsets, "blob": blob, "keys": keys})
+
+    file = ColumnFile(str(tmp_path / "data.col"))
+    assert list(Strings(file["offsets"], file["blob"])) == names
+    assert [find_key(file["keys"], k) for k in ("p1", "p10", "p2", "p3", "p100")] == [0, 1, 2, None, None]
+
+
+@pytest.mark.skipif(fcntl is None, reason="needs flock")
+def test_workers_see_the_latest_published_version(tmp_path):
+    writer = SharedStore("catalog", root=str(tmp_path), keep=2, check_interval=0)
+    reader = SharedStore("catalog", root=str(tmp_path), keep=2, check_interval=0)
+    assert reader.current() is None
+
+    first = writer.publish({"version": 1}, {"ids": np.arange(3)})
+    assert reader.current().meta == {"version": 1}
+    for version in (2, 3):
+        writer.publish({"version": version}, {"ids": np.arange(3)})
+    assert reader.current().meta == {"version": 3}
+
+    # Only ``keep`` versions stay on disk, but a reader's old mapping still works
+    assert len([f for f in tmp_path.iterdir() if f.suffix == ".col"]) == 2
+    assert np.array_equal(first["ids"], np.arange(3))
+
+
+@pytest.mark.skipif(fcntl is None, reason="needs flock")
+def test_one_leader_at_a_time(tmp_path):
+    a = SharedStore("catalog", root=str(tmp_path))
+    b = SharedStore("catalog", root=str(tmp_path))
+
+    assert a.lead() and a.leader
+    assert not b.lead() and not b.leader
+    a.resign()
+    assert b.lead()
+    b.resign()
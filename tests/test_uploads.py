@@ -0,0 +1,83 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+
+from Image_Analysis.Image_search.uploads import UploadStore
+
+DATA = b"\xff\xd8 product photo " * 64
+
+
+def put(store, upload, extension=".jpg"):
+    return asyncio.run(store.put(upload, extension))
+
+
+def hold(root, upload, held, done):
+    store = UploadStore(root)
+    put(store, upload)
+    held.set()
+    done.wait(30)
+
+
+def test_file_held_by_another_worker_is_not_evicted(tmp_path, fake_upload):
+    ctx = multiprocessing.get_context("spawn")
+    held, done = ctx.Event(), ctx.Event()
+    worker = ctx.Process(target=hold, args=(str(tmp_path), fake_upload(DATA), held, done))
+    worker.start()
+    try:
+        assert held.wait(30)
+        store = UploadStore(str(tmp_path), max_files=0)   # wants every unused file gone
+        stored = put(store, fake_upload(DATA))
+        assert stored.duplicate   # found on disk, stored by the other worker
+        asyncio.run(store.release(stored.digest))
+        assert os.path.exists(stored.path)
+    finally:
+        done.set()
+        worker.join()
+    store._scan()   # the worker exited without releasing; its marker no longer counts
+    assert not os.path.exists(stored.path)
+
+
+def test_indexed_file_gone_adopts_the_new_one(tmp_path, fake_upload):
+    store = UploadStore(str(tmp_path))
+    first = put(store, fake_upload(DATA), ".jpg")
+    asyncio.run(store.release(first.digest))
+    os.remove(first.path)   # e.g. removed by another worker
+
+    second = put(store, fake_upload(DATA), ".png")
+    assert not second.duplicate
+    assert os.path.exists(second.path)
+
+
+def test_legacy_uploads_are_moved_into_the_store(tmp_path, fake_upload):
+    (tmp_path / "02227ae1-9f21-45ef-accb-c61b5bbb96eb.jpg").write_bytes(DATA)
+    store = UploadStore(str(tmp_path))
+    assert (tmp_path / "02227ae1-9f21-45ef-accb-c61b5bbb96eb.jpg").exists()   # nothing moves on construction
+    asyncio.run(store.start())
+    digest = hashlib.sha256(DATA).hexdigest()
+
+    assert not any(p.is_file() for p in tmp_path.iterdir() if not p.name.startswith("."))
+    assert put(store, fake_upload(DATA)).duplicate
+    assert (tmp_path / digest[:2] / f"{digest}.jpg").exists()
+
+
+def test_put_waits_for_the_store_lock_off_the_event_loop(tmp_path, fake_upload):
+    store = UploadStore(str(tmp_path))
+    asyncio.run(store.start())
+
+    async def busy_store():
+        store._lock.acquire()   # e.g. another request's thread evicting files
+        try:
+            task = asyncio.ensure_future(store.put(fake_upload(DATA), ".jpg"))
+            for _ in range(5):
+                await asyncio.sleep(0.01)   # the loop keeps running meanwhile
+            assert not task.done()
+        finally:
+            store._lock.release()
+        stored = await task
+        await store.discard(stored.digest)
+        await store.release(stored.digest)
+        return stored
+
+    stored = asyncio.run(busy_store())
+    assert not os.path.exists(stored.path)
@@ -0,0 +1,12 @@
+from Image_Analysis.Image_search import image
+from Outbound.scheduler import OutboundScheduler
+
+
+def test_failed_vision_call_refunds_its_tokens(monkeypatch):
+    scheduler = OutboundScheduler("vision-test", requests_per_minute=600, tokens_per_minute=10000)
+    monkeypatch.setattr(image, "openai_scheduler", scheduler)
+    monkeypatch.setattr(image, "OPENAI_BASE_URL", "http://127.0.0.1:9")   # nothing listens there
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    assert image.call_gpt_vision("Which category?", ["data:image/jpeg;base64,AAAA"]) is None
+    assert scheduler.tokens.level > scheduler.tokens.capacity - 50